@@ -0,0 +1,350 @@
+"""Benchmark of loading and discovery of datasets
+
+Each measurement runs in a freshly spawned process, so cold caches of one
+case do not leak into another. Peak RSS is reported as the growth over the
+resident size at the start of the measurement. Results are written as JSON,
+along with the commit and environment, and can be compared with results
+of another commit:
+
+    python -m benchmarks.run --sizes small medium --output new.json
+    python -m benchmarks.run --compare old.json --output new.json
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import time
+
+from typing import Dict, List
+
+import numpy as np
+
+from spdata.common import Name, Path
+from . import synthetic
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Generator and options of load_dataset, by name of the case
+LOAD_CASES = {
+    'txt': ('data.txt', synthetic.write_txt, {}),
+    'txt_lazy': ('data.txt', synthetic.write_txt, {'lazy': True}),
+    'txt_parallel': ('data.txt', synthetic.write_txt,
+                     {'workers': os.cpu_count() or 1}),
+    'imzml': ('data.imzML', synthetic.write_imzml, {}),
+    'imzml_processed': ('data.imzML', synthetic.write_imzml, {}),
+}
+
+
+def _status(field: str) -> int:
+    """Field of /proc/self/status in bytes, None if not available."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _maxrss(who) -> int:
+    if resource is None:
+        return 0
+    peak = resource.getrusage(who).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _reset_peak_rss() -> int:
+    """Reset peak resident set size of the process, where possible.
+
+    Peak RSS of a spawned process carries over the peak of its parent, so
+    it is reset, or measured relative to the resident size at start.
+
+    Returns:
+        Resident set size at start, in bytes.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    current = _status('VmRSS')
+    return current if current is not None \
+        else _maxrss(getattr(resource, 'RUSAGE_SELF', None))
+
+
+def _peak_rss(start: int) -> int:
+    """Growth of peak RSS over the RSS at start, in bytes, including the
+    largest child process, e.g. of a pool parsing in parallel."""
+    peak = _status('VmHWM')
+    if peak is None:
+        peak = _maxrss(getattr(resource, 'RUSAGE_SELF', None))
+    children = _maxrss(getattr(resource, 'RUSAGE_CHILDREN', None))
+    # forked children start with the pages of the parent
+    return max(0, peak - start) + max(0, children - start)
+
+
+def _in_store(root: Path):
+    import spdata.discover as disc
+    disc.DATA_ROOT = root
+
+
+def _measure_load(root: Path, name: Name, options: Dict) -> Dict:
+    import spdata.reader as rd
+    _in_store(root)
+    start_rss = _reset_peak_rss()
+    start = time.perf_counter()
+    dataset = rd.load_dataset(name, **options)
+    if dataset.is_sparse:
+        checksum = float(np.sum(dataset.spectra.intensities))
+    else:
+        # lazy and memory-mapped spectra are read completely
+        checksum = float(np.sum(np.asarray(dataset.spectra)))
+    return {'seconds': time.perf_counter() - start,
+            'spectra': len(dataset.coordinates),
+            'checksum': checksum, 'peak_rss': _peak_rss(start_rss)}
+
+
+def _timed(f, *args, repeat: int=1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def _measure_discovery(root: Path, names: List[Name]) -> Dict:
+    import spdata.discover as disc
+    _in_store(root)
+    start_rss = _reset_peak_rss()
+    sample = names[::max(1, len(names) // 100)]
+    ids = [disc.name_to_id(name) for name in sample]
+    return {
+        'list_cold': _timed(disc.get_datasets),
+        'list_warm': _timed(disc.get_datasets, repeat=10),
+        'exists': _timed(lambda: [disc.dataset_exists(name)
+                                  for name in sample]) / len(sample),
+        'path': _timed(lambda: [disc.dataset_path(name)
+                                for name in sample]) / len(sample),
+        'names_to_ids': _timed(disc.names_to_ids, names),
+        'id_to_name': _timed(lambda: [disc.id_to_name(element_id)
+                                      for element_id in ids]) / len(ids),
+        'peak_rss': _peak_rss(start_rss),
+    }
+
+
+def _put_result(results, f, *args):
+    try:
+        results.put((True, f(*args)))
+    except Exception as error:
+        results.put((False, error))
+
+
+def _in_fresh_process(f, *args) -> Dict:
+    """Result of f called in a spawned process.
+
+    The process is not daemonic, so measured loading may start its own pool
+    of workers.
+
+    Raises:
+        Exception raised by f, or RuntimeError if the process died
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_put_result, args=(results, f) + args)
+    process.start()
+    try:
+        while True:
+            try:
+                succeeded, result = results.get(timeout=1.)
+                break
+            except queue.Empty:
+                # result may be put just before exit
+                if not process.is_alive() and results.empty():
+                    raise RuntimeError("Measuring process died with exit "
+                                       "code %s." % process.exitcode)
+    finally:
+        process.join()
+    if not succeeded:
+        raise result
+    return result
+
+
+def _prepare(work_dir: Path, case: str, size: str, channels: int,
+             seed: int) -> Name:
+    """Generate dataset of the case, unless generated already."""
+    file_name, generate, _ = LOAD_CASES[case]
+    kind = case if case.startswith('imzml') else 'txt'
+    name = '%s_%s_%i_%i' % (kind, size, channels, seed)
+    if os.path.isdir(os.path.join(work_dir, name)):
+        return name
+    # generated aside and moved in place, so interrupted runs leave no trace
+    temporary = os.path.join(work_dir, '.generated')
+    shutil.rmtree(temporary, ignore_errors=True)
+    spectra = synthetic.spectra_for_size(synthetic.SIZES[size], channels)
+    options = {'processed': True} if case == 'imzml_processed' else {}
+    generate(synthetic.data_file(temporary, name, file_name), spectra,
+             channels, seed, **options)
+    os.replace(os.path.join(temporary, name), os.path.join(work_dir, name))
+    return name
+
+
+def _data_size(root: Path, name: Name) -> int:
+    directory = os.path.join(root, name, name + '_data')
+    return sum(entry.stat().st_size for entry in os.scandir(directory)
+               if entry.is_file())
+
+
+def run(work_dir: Path, sizes: List[str], cases: List[str], repeat: int,
+        store_size: int, channels: int, seed: int) -> List[Dict]:
+    """Measure loading and discovery.
+
+    Args:
+        work_dir: Directory for generated datasets, reused between runs.
+        sizes: Names of sizes of datasets, from synthetic.SIZES.
+        cases: Names of load cases, from LOAD_CASES.
+        repeat: Number of measurements of each case.
+        store_size: Number of datasets in the store measured for discovery,
+        none if 0.
+        channels: Number of mass channels of generated datasets.
+        seed: Seed of the generators.
+
+    Returns:
+        Results of all cases.
+    """
+    results = []
+    for size in sizes:
+        for case in cases:
+            name = _prepare(work_dir, case, size, channels, seed)
+            options = LOAD_CASES[case][2]
+            runs = [_in_fresh_process(_measure_load, work_dir, name, options)
+                    for _ in range(repeat)]
+            seconds = min(run['seconds'] for run in runs)
+            size_bytes = _data_size(work_dir, name)
+            results.append({
+                'benchmark': 'load', 'case': case, 'size': size,
+                'bytes': size_bytes, 'spectra': runs[0]['spectra'],
+                'seconds': seconds,
+                'seconds_all': [run['seconds'] for run in runs],
+                'spectra_per_s': runs[0]['spectra'] / seconds,
+                'mb_per_s': size_bytes / 2 ** 20 / seconds,
+                'peak_rss': max(run['peak_rss'] for run in runs),
+            })
+            _report(results[-1])
+    if store_size:
+        store = os.path.join(work_dir, '.store_%i_%i' % (store_size, seed))
+        if not os.path.isdir(store):
+            shutil.rmtree(store + '.tmp', ignore_errors=True)
+            synthetic.make_store(store + '.tmp', store_size, seed)
+            os.replace(store + '.tmp', store)
+        names = sorted(entry.name for entry in os.scandir(store)
+                       if entry.is_dir())
+        for _ in range(repeat):
+            measured = _in_fresh_process(_measure_discovery, store, names)
+            results.append(dict(benchmark='discovery', case='store',
+                                size=store_size, **measured))
+            _report(results[-1])
+    return results
+
+
+def _report(result: Dict):
+    if result['benchmark'] == 'load':
+        print('%-16s %-7s %9.3fs %10.1f spectra/s %8.1f MB/s %8.1f MB RSS'
+              % (result['case'], result['size'], result['seconds'],
+                 result['spectra_per_s'], result['mb_per_s'],
+                 result['peak_rss'] / 2 ** 20))
+    else:
+        print('discovery of %i datasets: listing %.3fs cold, %.3fs warm, '
+              'resolving ids %.3fs'
+              % (result['size'], result['list_cold'], result['list_warm'],
+                 result['names_to_ids']))
+
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment() -> Dict:
+    return {
+        'commit': _commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(previous: Dict, current: Dict):
+    """Print ratio of times of load cases measured in both results."""
+    key = lambda result: (result['case'], result['size'])
+    known = {key(result): result for result in previous['results']
+             if result['benchmark'] == 'load'}
+    for result in current['results']:
+        if result['benchmark'] != 'load' or key(result) not in known:
+            continue
+        before = known[key(result)]
+        print('%-16s %-7s %6.2fx time %6.2fx peak RSS'
+              % (result['case'], result['size'],
+                 result['seconds'] / before['seconds'],
+                 result['peak_rss'] / max(before['peak_rss'], 1)))
+
+
+def main(argv: List[str]=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', nargs='+', default=['small'],
+                        choices=sorted(synthetic.SIZES))
+    parser.add_argument('--cases', nargs='+', default=sorted(LOAD_CASES),
+                        choices=sorted(LOAD_CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--store-size', type=int, default=2000,
+                        help='datasets in the store for discovery, 0 to skip')
+    parser.add_argument('--channels', type=int,
+                        default=synthetic.DEFAULT_CHANNELS)
+    parser.add_argument('--seed', type=int, default=synthetic.DEFAULT_SEED)
+    parser.add_argument('--work-dir', default='bench_data',
+                        help='directory for generated datasets, reused')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='results of previous run')
+    args = parser.parse_args(argv)
+    os.makedirs(args.work_dir, exist_ok=True)
+    work_dir = os.path.abspath(args.work_dir)
+    results = run(work_dir, args.sizes, args.cases, args.repeat,
+                  args.store_size, args.channels, args.seed)
+    current = dict(_environment(), results=results)
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), current)
+
+
+if __name__ == '__main__':
+    main()
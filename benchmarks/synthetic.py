@@ -0,0 +1,163 @@
+"""Deterministic generators of synthetic datasets
+
+The same seed always gives the same spectra, so timings of different
+commits are measured on identical inputs.
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from pyimzml.ImzMLWriter import ImzMLWriter
+
+from spdata.common import Name, Path
+
+# Approximate size of generated text file, in bytes
+SIZES = {
+    'small': 4 * 2 ** 20,
+    'medium': 256 * 2 ** 20,
+    'large': 4 * 2 ** 30,
+}
+DEFAULT_CHANNELS = 4096
+DEFAULT_SEED = 0
+# Characters of single intensity written to text file, with separator
+_VALUE_WIDTH = len('%.4f ' % 1000.)
+_BLOCK_SPECTRA = 256
+_PEAKS = 64
+
+
+def spectra_for_size(size: int, channels: int=DEFAULT_CHANNELS) -> int:
+    """Number of spectra making text dataset of approximately given size."""
+    return max(1, size // (channels * _VALUE_WIDTH))
+
+
+def mz_axis(channels: int=DEFAULT_CHANNELS) -> np.ndarray:
+    return np.linspace(800., 4000., channels)
+
+
+def spectra_blocks(spectra: int, channels: int=DEFAULT_CHANNELS,
+                   seed: int=DEFAULT_SEED) -> Iterator[np.ndarray]:
+    """Spectra with common peaks over noisy baseline, block by block.
+
+    Args:
+        spectra: Number of spectra.
+        channels: Number of mass channels.
+        seed: Seed of the generator.
+
+    Yields:
+        Consecutive blocks of spectra, in rows.
+    """
+    random = np.random.RandomState(seed)
+    centers = random.uniform(0, channels, _PEAKS)
+    widths = random.uniform(2., 10., _PEAKS)
+    positions = np.arange(channels)
+    shapes = np.exp(-0.5 * ((positions[None, :] - centers[:, None])
+                            / widths[:, None]) ** 2)
+    for start in range(0, spectra, _BLOCK_SPECTRA):
+        count = min(_BLOCK_SPECTRA, spectra - start)
+        heights = random.gamma(2., 100., (count, _PEAKS))
+        noise = random.exponential(5., (count, channels))
+        yield heights.dot(shapes) + noise
+
+
+def grid(spectra: int) -> Tuple[np.ndarray, np.ndarray]:
+    """X and Y coordinates of spectra laid out on square-ish grid."""
+    width = int(np.ceil(np.sqrt(spectra)))
+    indices = np.arange(spectra)
+    return indices % width + 1, indices // width + 1
+
+
+def write_txt(path: Path, spectra: int, channels: int=DEFAULT_CHANNELS,
+              seed: int=DEFAULT_SEED):
+    """Write synthetic dataset in text format.
+
+    Args:
+        path: Path of the created file.
+        spectra: Number of spectra.
+        channels: Number of mass channels.
+        seed: Seed of the generator.
+    """
+    x, y = grid(spectra)
+    row_format = ' '.join(['%.4f'] * channels) + '\n'
+    with open(path, 'w') as f:
+        f.write('synthetic dataset, seed %i\n' % seed)
+        f.write(' '.join('%.6f' % mz for mz in mz_axis(channels)) + '\n')
+        row = 0
+        for block in spectra_blocks(spectra, channels, seed):
+            for spectrum in block:
+                f.write('%i %i 1 %i\n' % (x[row], y[row], row % 3))
+                f.write(row_format % tuple(spectrum))
+                row += 1
+
+
+def write_imzml(path: Path, spectra: int, channels: int=DEFAULT_CHANNELS,
+                seed: int=DEFAULT_SEED, processed: bool=False):
+    """Write synthetic dataset in imzML format.
+
+    Args:
+        path: Path of the created .imzML file, .ibd is placed next to it.
+        spectra: Number of spectra.
+        channels: Number of mass channels.
+        seed: Seed of the generator.
+        processed: If True, only channels above the noise level are stored
+        for each spectrum.
+    """
+    x, y = grid(spectra)
+    mzs = mz_axis(channels)
+    mode = 'processed' if processed else 'continuous'
+    row = 0
+    with ImzMLWriter(path, mode=mode, intensity_dtype=np.float32) as writer:
+        for block in spectra_blocks(spectra, channels, seed):
+            for spectrum in block:
+                if processed:
+                    peaks = spectrum > 20.
+                    writer.addSpectrum(mzs[peaks], spectrum[peaks],
+                                       (int(x[row]), int(y[row]), 1))
+                else:
+                    writer.addSpectrum(mzs, spectrum,
+                                       (int(x[row]), int(y[row]), 1))
+                row += 1
+
+
+def data_file(root: Path, name: Name, file_name: str) -> Path:
+    """Path of data file of dataset in the store, creating its directory."""
+    directory = os.path.join(root, name, name + '_data')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, file_name)
+
+
+def make_store(root: Path, count: int, seed: int=DEFAULT_SEED) -> List[Name]:
+    """Fill DATA_ROOT-like directory with many tiny datasets.
+
+    Args:
+        root: Directory of the store.
+        count: Number of datasets.
+        seed: Seed of the generator.
+
+    Returns:
+        Names of created datasets.
+    """
+    names = ['synthetic_%06i' % idx for idx in range(count)]
+    os.makedirs(root, exist_ok=True)
+    template = os.path.join(root, '.template.txt')
+    write_txt(template, 4, channels=8, seed=seed)
+    for name in names:
+        shutil.copyfile(template, data_file(root, name, 'data.txt'))
+    os.remove(template)
+    return names
@@ -0,0 +1,236 @@
+"""Counterparts of loading and discovery for asyncio applications
+
+Blocking work runs in a bounded pool of threads, so the event loop stays
+responsive. Concurrent requests for the same dataset with the same options
+share one load and receive the same Dataset instance, which therefore
+should not be modified in place. Requires Python 3.5.
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Hashable, Iterator, List
+
+import numpy as np
+
+from . import discover as disc
+from . import reader as rd
+from . import types as ty
+from .common import Name
+
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_executor = None
+_executor_lock = threading.Lock()
+# Loads in progress, by event loop and key of the request
+_in_flight = weakref.WeakKeyDictionary()
+_END = object()
+
+
+def configure(max_workers: int=DEFAULT_MAX_WORKERS):
+    """Replace the pool of threads running blocking work.
+
+    Work already submitted finishes in the previous pool.
+    """
+    global _executor
+    with _executor_lock:
+        previous = _executor
+        _executor = ThreadPoolExecutor(max_workers=max_workers)
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS)
+        return _executor
+
+
+def _run(function: Callable, *args) -> asyncio.Future:
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(_get_executor(), partial(function, *args))
+
+
+class _Shared:
+    """Load awaited by many requests"""
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.waiters = 0
+
+
+def _forget(requests: Dict, key: Hashable, shared: _Shared, _):
+    if requests.get(key) is shared:
+        del requests[key]
+
+
+async def _deduplicated(key: Hashable, function: Callable, *args):
+    """Run function in the pool, unless the same request is in flight.
+
+    Cancelling a request does not affect the others. The work is cancelled
+    only when every request waiting for it was cancelled and it has not
+    started yet; running work finishes, but its result is dropped.
+    """
+    requests = _in_flight.setdefault(asyncio.get_event_loop(), {})
+    shared = requests.get(key)
+    if shared is None:
+        shared = _Shared(_run(function, *args))
+        requests[key] = shared
+        shared.future.add_done_callback(partial(_forget, requests, key,
+                                                shared))
+    shared.waiters += 1
+    try:
+        return await asyncio.shield(shared.future)
+    finally:
+        shared.waiters -= 1
+        if shared.waiters == 0 and not shared.future.done():
+            shared.future.cancel()
+            _forget(requests, key, shared, None)
+
+
+def _hashable(value) -> Hashable:
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, np.dtype) or isinstance(value, type):
+        return np.dtype(value).str
+    try:
+        hash(value)
+    except TypeError:
+        return id(value)
+    return value
+
+
+async def load_dataset(name: Name, **options) -> ty.Dataset:
+    """Load dataset as reader.load_dataset, in the pool of threads.
+
+    Args:
+        name: Name of desired dataset.
+        options: Options of reader.load_dataset.
+
+    Returns:
+        The dataset, shared with concurrent requests of the same options.
+    """
+    key = ('load', name) + tuple(sorted(
+        (option, _hashable(value)) for option, value in options.items()))
+    return await _deduplicated(key, partial(rd.load_dataset, **options),
+                               name)
+
+
+async def get_datasets() -> List[Dict[Name, str]]:
+    """Datasets available in the store, as discover.get_datasets."""
+    return await _deduplicated(('get_datasets',), disc.get_datasets)
+
+
+async def dataset_exists(name: Name) -> bool:
+    return await _deduplicated(('exists', name), disc.dataset_exists, name)
+
+
+async def id_to_name(element_id: int) -> Name:
+    return await _deduplicated(('id_to_name', element_id), disc.id_to_name,
+                               element_id)
+
+
+async def names_to_ids(names: List[Name]) -> List[int]:
+    return await _run(disc.names_to_ids, list(names))
+
+
+class DatasetBatches:
+    """Asynchronous iterator over batches of dataset
+
+    Next batch is read in the pool of threads while the current one is
+    processed. Batch being read when the wait for it is cancelled is
+    returned by the next call, so no spectra are skipped. Batches should be
+    requested by a single task at a time.
+    """
+    def __init__(self, name: Name, batch_size: int=rd.DEFAULT_BATCH_SIZE,
+                 prefetch: bool=True):
+        """
+        Args:
+            name: Name of desired dataset.
+            batch_size: Maximal number of spectra in a single batch.
+            prefetch: If False, batch is read only when requested.
+        """
+        self._name = name
+        self._batch_size = batch_size
+        self._prefetch = prefetch
+        self._batches = None  # type: Iterator[ty.Dataset]
+        self._opening = None  # type: asyncio.Future
+        self._pending = None  # type: asyncio.Future
+
+    def __aiter__(self) -> 'DatasetBatches':
+        return self
+
+    async def __anext__(self) -> ty.Dataset:
+        if self._batches is None:
+            if self._opening is None:
+                self._opening = _run(rd.iter_dataset, self._name,
+                                     self._batch_size)
+            # shielded, so cancelled wait is resumed by the next call
+            self._batches = await asyncio.shield(self._opening)
+        if self._pending is None:
+            self._pending = _run(next, self._batches, _END)
+        pending = self._pending
+        try:
+            batch = await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if self._pending is pending:
+                self._pending = None
+            raise
+        if self._pending is pending:
+            self._pending = None
+            if self._prefetch and batch is not _END:
+                self._pending = _run(next, self._batches, _END)
+        if batch is _END:
+            raise StopAsyncIteration
+        return batch
+
+    async def aclose(self):
+        """Stop reading and release the source."""
+        if self._batches is None and self._opening is not None:
+            self._batches = await self._opening
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            try:
+                await pending
+            except Exception:
+                pass
+        if self._batches is not None and hasattr(self._batches, 'close'):
+            await _run(self._batches.close)
+
+    async def __aenter__(self) -> 'DatasetBatches':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+def iter_dataset(name: Name, batch_size: int=rd.DEFAULT_BATCH_SIZE,
+                 prefetch: bool=True) -> DatasetBatches:
+    """Stream dataset in batches, as reader.iter_dataset.
+
+        async with iter_dataset('dataset') as batches:
+            async for batch in batches:
+                ...
+    """
+    return DatasetBatches(name, batch_size, prefetch)
@@ -0,0 +1,133 @@
+"""In-memory cache of loaded datasets
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import threading
+
+from collections import namedtuple, OrderedDict
+from typing import Hashable, Optional
+
+import numpy as np
+
+from . import types as ty
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'count',
+                                     'nbytes', 'max_bytes'])
+
+
+def _freeze(dataset: ty.Dataset):
+    """Make arrays of the dataset read-only."""
+    spectra = dataset.spectra
+    if dataset.is_sparse:
+        arrays = [spectra.mz, spectra.intensities, spectra.offsets]
+    elif dataset.is_lazy:
+        spectra.freeze()
+        arrays = []
+    else:
+        arrays = [spectra]
+    arrays += [dataset.mz, dataset.labels, dataset.coordinates.x,
+               dataset.coordinates.y, dataset.coordinates.z]
+    for array in arrays:
+        if isinstance(array, np.ndarray):
+            array.setflags(write=False)
+
+
+class DatasetCache:
+    """Least recently used datasets, kept within a budget of bytes
+
+    Size of a dataset is the size of its spectra. Cached datasets are made
+    read-only, as the same instance is handed to every caller.
+    """
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes: total size of spectra kept in the cache
+
+        Raises:
+            ValueError
+        """
+        if max_bytes < 0:
+            raise ValueError("Budget of the cache should be non-negative. "
+                             "Was: %i" % max_bytes)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable) -> Optional[ty.Dataset]:
+        """Get cached dataset, counting hit or miss.
+
+        Args:
+            key: Identity of the dataset.
+
+        Returns:
+            The dataset, or None if it is not cached.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, dataset: ty.Dataset) -> ty.Dataset:
+        """Cache dataset, evicting least recently used ones to fit budget.
+
+        Dataset larger than the whole budget is not cached.
+
+        Args:
+            key: Identity of the dataset.
+            dataset: The dataset to cache.
+
+        Returns:
+            The dataset, made read-only.
+        """
+        _freeze(dataset)
+        size = dataset.spectra.nbytes
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key).spectra.nbytes
+            if size > self.max_bytes:
+                return dataset
+            while self.nbytes + size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.spectra.nbytes
+                self.evictions += 1
+            self._entries[key] = dataset
+            self.nbytes += size
+        return dataset
+
+    def clear(self):
+        """Remove all cached datasets, keeping counters."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def info(self) -> CacheInfo:
+        """Counters and usage of the cache."""
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             len(self._entries), self.nbytes, self.max_bytes)
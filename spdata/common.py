@@ -16,9 +16,33 @@ limitations under the License.
 """
 
 import os
+import tempfile
+
+from typing import Optional
 
 _FILESYSTEM_ROOT = os.path.abspath(os.sep)
 DATA_ROOT = os.path.join(_FILESYSTEM_ROOT, 'data')
+# RAM-backed filesystem, if available, for sharing data between processes
+SHARED_ROOT = '/dev/shm' if os.path.isdir('/dev/shm') \
+    else tempfile.gettempdir()
 
 Name = str
 Path = str
+
+
+def registered_extension(path: Path, registered) -> Optional[str]:
+    """Longest registered extension the path ends with, ignoring case.
+
+    Compound extensions, like '.txt.gz', take precedence over '.gz'.
+
+    Args:
+        path: Path to the file.
+        registered: Extensions to choose from, lowercase.
+
+    Returns:
+        The extension, or None if none matches.
+    """
+    name = os.path.basename(path).lower()
+    matching = [extension for extension in registered
+                if name.endswith(extension) and len(name) > len(extension)]
+    return max(matching, key=len) if matching else None
@@ -0,0 +1,134 @@
+"""Reading of compressed files, decompressed ahead in background thread
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import importlib
+import io
+import queue
+import threading
+
+from functools import partial
+from typing import Callable, Dict, TextIO
+
+from .common import Path
+
+# Modules opening compressed files, by extension of compression. Imported
+# only when a compressed file is opened.
+DECOMPRESSORS = {
+    '.gz': 'gzip',
+    '.xz': 'lzma',
+    '.bz2': 'bz2',
+}  # type: Dict[str, str]
+
+# Number of decompressed bytes passed to the reader at once
+_BLOCK_SIZE = 2 ** 20
+# Number of blocks decompressed ahead of the reader
+_PREFETCH_BLOCKS = 8
+_POLL_INTERVAL = 0.1
+
+
+def opener(extension: str) -> Callable:
+    """Function opening files of given extension of compression."""
+    return importlib.import_module(DECOMPRESSORS[extension]).open
+
+
+def is_compressed(path: Path) -> bool:
+    return any(path.lower().endswith(extension)
+               for extension in DECOMPRESSORS)
+
+
+class BackgroundReader(io.RawIOBase):
+    """Binary stream of decompressed file
+
+    The file is decompressed in background thread, a few blocks ahead of
+    the reader. Decompressors release the GIL, so decompression overlaps
+    with processing of the data read.
+    """
+    def __init__(self, path: Path, prefetch: int=_PREFETCH_BLOCKS):
+        """
+        Args:
+            path: Path to compressed file, with extension of compression.
+            prefetch: Maximal number of blocks decompressed ahead.
+
+        Raises:
+            ValueError, if compression is not supported
+        """
+        super().__init__()
+        extension = next((extension for extension in DECOMPRESSORS
+                          if path.lower().endswith(extension)), None)
+        if extension is None:
+            raise ValueError("Unsupported compression of file: " + path)
+        self._blocks = queue.Queue(maxsize=prefetch)
+        self._pending = memoryview(b'')
+        self._finished = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._decompress, args=(opener(extension), path),
+            daemon=True)
+        self._thread.start()
+
+    def _decompress(self, open_compressed: Callable, path: Path):
+        try:
+            with open_compressed(path, 'rb') as f:
+                for block in iter(partial(f.read, _BLOCK_SIZE), b''):
+                    if not self._put(block):
+                        return
+            self._put(b'')
+        except Exception as ex:
+            self._put(ex)
+
+    def _put(self, item) -> bool:
+        while not self._stopped.is_set():
+            try:
+                self._blocks.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._pending:
+            if self._finished:
+                return 0
+            block = self._blocks.get()
+            if isinstance(block, Exception):
+                self._finished = True
+                raise block
+            if not block:
+                self._finished = True
+                return 0
+            self._pending = memoryview(block)
+        count = min(len(buffer), len(self._pending))
+        buffer[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        super().close()
+
+
+def open_text(path: Path) -> TextIO:
+    """Open file for reading as text, decompressing it in background if
+    compressed."""
+    if not is_compressed(path):
+        return open(path)
+    return io.TextIOWrapper(io.BufferedReader(BackgroundReader(path),
+                                              buffer_size=_BLOCK_SIZE))
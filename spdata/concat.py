@@ -0,0 +1,231 @@
+"""Concatenation of many datasets onto common m/z axis
+
+Spectra of each dataset are resampled batch by batch, with interpolation
+weights computed once per dataset, straight into the preallocated output.
+The output may be memory-mapped, so cohorts larger than memory can be
+stacked.
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from collections import namedtuple
+from typing import Callable, List
+
+import numpy as np
+
+from . import instrument
+from . import reader as rd
+from . import types as ty
+from .common import Name, Path
+
+# Dataset of spectra of all sources, with index of the source of each
+# spectrum in names
+Concatenation = namedtuple('Concatenation', ['dataset', 'source', 'names'])
+
+
+def _axis_of(dataset: ty.Dataset) -> np.ndarray:
+    if dataset.is_sparse:
+        # only the extent of peaks, spanned by regular grid
+        mz = dataset.spectra.mz
+        return np.array([mz.min(), mz.max()]) if mz.size else np.empty(0)
+    return np.asarray(dataset.mz)
+
+
+def common_axis(datasets: List[ty.Dataset], step: float=None) -> np.ndarray:
+    """Common m/z axis of datasets.
+
+    Args:
+        datasets: Datasets to put on the axis. Sparse ones contribute the
+        range of m/z-s of their peaks.
+        step: Spacing of regular grid spanning m/z-s of all datasets. If
+        None, union of m/z-s of all datasets is used, which is possible
+        only for dense datasets.
+
+    Returns:
+        Sorted values of m/z.
+
+    Raises:
+        ValueError, if step is not positive, or if it is None while some
+        dataset is sparse, as union of m/z-s of peaks would be as large as
+        all of the peaks
+    """
+    if step is None and any(dataset.is_sparse for dataset in datasets):
+        raise ValueError("Step of the axis is required for sparse spectra.")
+    axes = [_axis_of(dataset) for dataset in datasets]
+    if step is None:
+        return np.unique(np.concatenate(axes)) if axes else np.empty(0)
+    if step <= 0:
+        raise ValueError("Step should be positive. Was: %s" % step)
+    axes = [axis for axis in axes if axis.size]
+    if not axes:
+        return np.empty(0)
+    low = min(axis[0] for axis in axes)
+    high = max(axis[-1] for axis in axes)
+    return low + step * np.arange(int(np.ceil((high - low) / step)) + 1)
+
+
+def _interpolation(source: np.ndarray, target: np.ndarray) -> Callable[
+        [np.ndarray, np.ndarray], None]:
+    """Linear interpolation of spectra from source onto target m/z axis.
+
+    Channels of target outside of source get zero intensity, as nothing was
+    measured there.
+
+    Returns:
+        Function interpolating matrix of spectra into given output matrix.
+    """
+    if source.shape == target.shape and np.array_equal(source, target):
+        return lambda spectra, out: np.copyto(out, spectra,
+                                              casting='unsafe')
+    if source.size == 0:
+        return lambda spectra, out: out.fill(0)
+    right = np.clip(np.searchsorted(source, target), 1, max(source.size - 1,
+                                                             1))
+    left = right - 1
+    if source.size == 1:
+        left = right = np.zeros(target.size, dtype=int)
+        weight = np.zeros(target.shape)
+        inside = target == source[0]
+    else:
+        span = source[right] - source[left]
+        weight = np.divide(target - source[left], span,
+                           out=np.zeros(target.shape), where=span > 0)
+        inside = (target >= source[0]) & (target <= source[-1])
+    weight[~inside] = 0.
+    outside = np.flatnonzero(~inside)
+
+    def interpolate(spectra: np.ndarray, out: np.ndarray):
+        np.multiply(spectra[:, left], 1. - weight, out=out, casting='unsafe')
+        out += spectra[:, right] * weight
+        out[:, outside] = 0
+    return interpolate
+
+
+def _allocate(shape, dtype, out: Path=None) -> np.ndarray:
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    return np.lib.format.open_memmap(out, mode='w+', dtype=dtype,
+                                     shape=shape)
+
+
+def concatenate(datasets: List[ty.Dataset], mz=None, step: float=None,
+                batch_size: int=rd.DEFAULT_BATCH_SIZE, dtype=None,
+                out: Path=None, names: List[Name]=None) -> Concatenation:
+    """Stack spectra of datasets resampled onto common m/z axis.
+
+    Dense spectra are linearly interpolated, peaks of sparse spectra are
+    binned to the closest channel, as in Dataset.to_dense. Lazy spectra are
+    read batch by batch.
+
+    Args:
+        datasets: Datasets to concatenate.
+        mz: Sorted values of m/z of the common axis. If None, the axis is
+        derived from datasets as in common_axis.
+        step: Spacing of derived regular axis, union of m/z-s if None.
+        Either mz or step is required for sparse datasets.
+        batch_size: Maximal number of spectra resampled at once.
+        dtype: Type of intensities, at least float32 by default.
+        out: Path of .npy file the spectra are written into and
+        memory-mapped from. Spectra are kept in memory if None.
+        names: Names of datasets, their positions by default.
+
+    Returns:
+        Concatenated dataset, with source of each spectrum. Labels are kept
+        only if all datasets have them.
+
+    Raises:
+        ValueError
+    """
+    if not datasets:
+        raise ValueError("No datasets to concatenate.")
+    if batch_size < 1:
+        raise ValueError("Batch size should be positive. Was: %i"
+                         % batch_size)
+    if names is None:
+        names = list(range(len(datasets)))
+    if len(names) != len(datasets):
+        raise ValueError("Expected %i names. Were: %i"
+                         % (len(datasets), len(names)))
+    if mz is None:
+        mz = common_axis(datasets, step)
+    mz = np.asarray(mz, dtype=float)
+    if np.any(np.diff(mz) < 0):
+        raise ValueError("Common m/z axis should be sorted.")
+    if dtype is None:
+        dtype = np.result_type(np.float32, *[
+            dataset.spectra.intensities.dtype if dataset.is_sparse
+            else dataset.spectra.dtype for dataset in datasets])
+    counts = [len(dataset.coordinates) for dataset in datasets]
+    offsets = np.zeros(len(datasets) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    spectra = _allocate((int(offsets[-1]), mz.size), dtype, out)
+    with instrument.stage('concat.resample') as resampled, \
+            instrument.progress(int(offsets[-1]), 'Resampling') as bar:
+        for dataset, start in zip(datasets, offsets):
+            _resample_into(dataset, mz, spectra[start:start + len(
+                dataset.coordinates)], batch_size, bar)
+        resampled.count(spectra=int(offsets[-1]), bytes=spectra.nbytes)
+    coordinates = ty.Coordinates(
+        *[np.concatenate([getattr(dataset.coordinates, axis)
+                          for dataset in datasets]) for axis in 'xyz'],
+        copy=False)
+    labels = None
+    if all(dataset.labels is not None for dataset in datasets):
+        labels = np.concatenate([dataset.labels for dataset in datasets])
+    source = np.repeat(np.arange(len(datasets)), counts)
+    dataset = ty.Dataset(spectra, coordinates, mz, labels, copy=False)
+    return Concatenation(dataset, source, list(names))
+
+
+def _resample_into(dataset: ty.Dataset, mz: np.ndarray, out: np.ndarray,
+                   batch_size: int, bar):
+    count = len(dataset.coordinates)
+    if dataset.is_sparse:
+        for start in range(0, count, batch_size):
+            stop = min(start + batch_size, count)
+            dataset.spectra.take(slice(start, stop)).to_dense(
+                mz, out[start:stop])
+            bar.update(stop - start)
+        return
+    interpolate = _interpolation(np.asarray(dataset.mz, dtype=float), mz)
+    for start in range(0, count, batch_size):
+        stop = min(start + batch_size, count)
+        interpolate(dataset.spectra[start:stop], out[start:stop])
+        bar.update(stop - start)
+
+
+def load_concatenated(names: List[Name], mz=None, step: float=None,
+                      batch_size: int=rd.DEFAULT_BATCH_SIZE, dtype=None,
+                      out: Path=None) -> Concatenation:
+    """Load datasets of arbitrary registered formats onto common m/z axis.
+
+    Datasets are opened lazily, so spectra of each are read batch by batch
+    directly into the concatenated ones, as in concatenate.
+
+    Args:
+        names: Names of desired datasets.
+        mz: Sorted values of m/z of the common axis, derived if None.
+        step: Spacing of derived regular axis, union of m/z-s if None.
+        batch_size: Maximal number of spectra resampled at once.
+        dtype: Type of intensities, at least float32 by default.
+        out: Path of .npy file the spectra are written into and
+        memory-mapped from. Spectra are kept in memory if None.
+
+    Returns:
+        Concatenated dataset, with index of the source of each spectrum in
+        names.
+    """
+    datasets = [rd.load_dataset(name, lazy=True) for name in names]
+    return concatenate(datasets, mz, step, batch_size, dtype, out, names)
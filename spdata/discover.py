@@ -16,14 +16,17 @@ limitations under the License.
 """
 
 import os
+import threading
+import time
 
-from typing import Callable, Dict, List, Optional
-from functools import partial, lru_cache
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+from functools import lru_cache
 from hashlib import sha256
-from glob import glob
 
+from . import instrument
 from .utility import as_readable, UnknownIdError
-from .common import DATA_ROOT, Name, Path
+from .common import DATA_ROOT, Name, Path, registered_extension
 
 MAX_JAVASCRIPT_SAFE_INT = 2 ** 53 - 1
 
@@ -38,9 +41,49 @@ def name_to_id(entity_name: str) -> int:
     Returns:
         Unique identifier.
     """
+    return _hash_name(entity_name)
+
+def _hash_name(entity_name: str) -> int:
     hex_hash = sha256(entity_name.encode()).hexdigest()
     return int(hex_hash, 16) % MAX_JAVASCRIPT_SAFE_INT
 
+# Names of datasets by their ids, along with state of DATA_ROOT they describe
+_index_state = None
+_ids_index = {}  # type: Dict[int, Name]
+_names_index = {}  # type: Dict[Name, int]
+
+def _state(path: Path) -> Optional[Tuple[int, int, int]]:
+    """Identity and modification time of a file or directory, if exists."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino, stat.st_mtime_ns
+
+def _root_state() -> Optional[Tuple[int, int, int]]:
+    return _state(DATA_ROOT)
+
+def _index() -> Tuple[Dict[int, Name], Dict[Name, int]]:
+    """Get indices between ids and names of datasets in the store.
+
+    Indices are rebuilt only when DATA_ROOT directory is modified, what
+    happens whenever dataset is added, removed or renamed.
+    """
+    global _index_state, _ids_index, _names_index
+    state = _root_state()
+    if state is not None and state == _index_state:
+        return _ids_index, _names_index
+    ids, names = {}, {}
+    with instrument.stage('discover.index') as indexed:
+        for _name in (_name for d in get_datasets() for _name in d.values()):
+            if _name not in names:
+                names[_name] = _hash_name(_name)
+                ids.setdefault(names[_name], _name)
+        indexed.count(names=len(names))
+    if state is not None:
+        _index_state, _ids_index, _names_index = state, ids, names
+    return ids, names
+
 def id_to_name(element_id: int) -> Name:
     """Resolve element name by its id.
     Args:
@@ -49,11 +92,164 @@ def id_to_name(element_id: int) -> Name:
     Returns:
         Name of the element under given id.
     """
-    matching = [_name for d in get_datasets() for _name in d.values()
-                if name_to_id(_name) == element_id]
-    if not matching:
+    ids, _ = _index()
+    if element_id not in ids:
         raise UnknownIdError(element_id)
-    return matching[0]
+    return ids[element_id]
+
+def names_to_ids(names: Iterable[Name]) -> List[int]:
+    """Get IDs for many names at once.
+    Names of datasets in the store are resolved from the index, others are
+    hashed.
+
+    Args:
+        names: Names of objects.
+
+    Returns:
+        Unique identifiers, in order of names.
+    """
+    _, known = _index()
+    return [known[_name] if _name in known else name_to_id(_name)
+            for _name in names]
+
+DatasetEntry = namedtuple('DatasetEntry',
+                          ['name', 'path', 'format', 'size', 'mtime'])
+DatasetEntry.__doc__ = """Dataset found in the store, with its data file"""
+
+# Files accompanying data files, never data files themselves
+_COMPANION_EXTENSIONS = ('.ibd',)
+
+def _is_data_file(entry: os.DirEntry) -> bool:
+    return not entry.name.startswith('.') and '.' in entry.name \
+           and not entry.name.lower().endswith(_COMPANION_EXTENSIONS) \
+           and entry.is_file()
+
+def _format(file_name: str) -> str:
+    """Registered extension of data file, e.g. '.txt.gz', or its last
+    extension if no loader is registered for it."""
+    from .reader import loaders  # reader depends on this module
+    extension = registered_extension(file_name, loaders)
+    if extension is None:
+        extension = os.path.splitext(file_name)[1]
+    return extension
+
+class Catalog:
+    """Cache of datasets available in the store
+
+    The store is listed with a single pass over DATA_ROOT. Listing is
+    repeated only if DATA_ROOT was modified, and data file of a dataset is
+    searched again only if its directories were modified.
+    """
+    def __init__(self, root: Path=None, max_age: float=0.):
+        """
+        Args:
+            root: directory of the store, DATA_ROOT by default
+            max_age: time in seconds for which the catalog is trusted without
+            checking the filesystem for modifications
+        """
+        self._root = root
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._checked = None
+        self._state = None
+        self._names = []  # type: List[Name]
+        self._known = set()
+        self._readable = {}  # type: Dict[Name, Name]
+        self._entries = {}  # type: Dict[Name, Tuple[tuple, DatasetEntry]]
+
+    @property
+    def root(self) -> Path:
+        return self._root if self._root is not None else DATA_ROOT
+
+    def refresh(self, force: bool=True):
+        """Update list of datasets, if the store was modified.
+
+        Args:
+            force: if True, forget everything known about the store
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked is not None \
+                    and now - self._checked < self.max_age:
+                return
+            state = _state(self.root)
+            if not force and state is not None and state == self._state:
+                self._checked = now
+                return
+            with instrument.stage('discover.list', root=self.root) as listed:
+                names = [entry.name for entry in os.scandir(self.root)
+                         if entry.is_dir()]
+                listed.count(datasets=len(names))
+            self._names = names
+            self._known = set(names)
+            self._readable = {as_readable(name): name for name in names}
+            self._entries = {} if force else {
+                name: entry for name, entry in self._entries.items()
+                if name in self._known}
+            self._state, self._checked = state, now
+
+    def names(self) -> List[Name]:
+        """Names of datasets in the store, as on the disk."""
+        self.refresh(force=False)
+        return list(self._names)
+
+    def resolve(self, name: Name) -> Optional[Name]:
+        """Name of dataset on the disk for its name or readable name."""
+        self.refresh(force=False)
+        if name in self._known:
+            return name
+        return self._readable.get(name)
+
+    def __contains__(self, name: Name) -> bool:
+        return self.resolve(name) is not None
+
+    def entry(self, name: Name) -> Optional[DatasetEntry]:
+        """Details of the dataset data file, None if dataset has no data.
+
+        Args:
+            name: Name or readable name of the dataset.
+
+        Raises:
+            IOError, if dataset does not exist
+        """
+        with self._lock:
+            dir_name = self.resolve(name)
+            if dir_name is None:
+                raise IOError('Dataset ' + name + ' could not be found.')
+            known = self._entries.get(dir_name)
+            if known is not None and self._is_recent(*known):
+                return known[1]
+            with instrument.stage('discover.scan', dataset=dir_name):
+                state, entry = self._scan(dir_name)
+            self._entries[dir_name] = state, entry
+            return entry
+
+    def _is_recent(self, state: tuple, entry: DatasetEntry) -> bool:
+        if time.monotonic() - self._checked < self.max_age:
+            return True
+        directories, file_state = state
+        return all(_state(path) == known for path, known in directories) \
+            and (entry is None or _state(entry.path) == file_state)
+
+    def _scan(self, dir_name: Name) -> Tuple[tuple, Optional[DatasetEntry]]:
+        name_root = os.path.join(self.root, dir_name)
+        directories = [(name_root, _state(name_root))]
+        data_dirs = sorted(entry.path for entry in os.scandir(name_root)
+                           if entry.name.endswith('_data') and entry.is_dir())
+        for data_dir in data_dirs:
+            directories.append((data_dir, _state(data_dir)))
+            files = sorted((entry for entry in os.scandir(data_dir)
+                            if _is_data_file(entry)),
+                           key=lambda entry: entry.name)
+            if files:
+                stat = files[0].stat()
+                entry = DatasetEntry(dir_name, files[0].path,
+                                     _format(files[0].name),
+                                     stat.st_size, stat.st_mtime_ns)
+                return (directories, _state(entry.path)), entry
+        return (directories, None), None
+
+catalog = Catalog()
 
 def dataset_path(dataset_name: Name) -> Path:
     """Discover path to dataset.
@@ -63,20 +259,18 @@ def dataset_path(dataset_name: Name) -> Path:
     Returns:
         Path to the dataset file.
     """
-    name_root = os.path.join(DATA_ROOT, dataset_name)
-    file_list = glob(os.path.join(name_root, '*_data', '*.*'))
-    return file_list[0]
+    entry = catalog.entry(dataset_name)
+    if entry is None:
+        raise IOError('Dataset ' + dataset_name + ' has no data file.')
+    return entry.path
 
 def get_datasets() -> List[Dict[Name, str]]:
     """"Get datasets available in the store.
     Returns:
         List of dataset entries.
     """
-    def is_dir(root: Path, name: Name) -> bool:
-        return os.path.isdir(os.path.join(root, name))
-    is_dataset_name = partial(is_dir, DATA_ROOT)
-    datasets = filter(is_dataset_name, os.listdir(DATA_ROOT))
-    return [{"name": as_readable(name), "value": name} for name in datasets]
+    return [{"name": as_readable(name), "value": name}
+            for name in catalog.names()]
 
 def dataset_exists(name: Name) -> bool:
     """Checks if dataset with given name exists.
@@ -86,4 +280,10 @@ def dataset_exists(name: Name) -> bool:
     Returns:
         True if dataset is in the filesystem, False otherwise.
     """
-    return any(name in d.values() for d in get_datasets())
+    return name in catalog
+
+def refresh():
+    """Forget cached state of the store, forcing it to be listed again."""
+    global _index_state
+    _index_state = None
+    catalog.refresh(force=True)
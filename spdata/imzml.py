@@ -0,0 +1,223 @@
+"""Reading of imzML datasets
+
+Imported on first load of .imzML file, along with pyimzml.
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from functools import partial
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pyimzml.ImzMLParser as imzparse
+
+from . import instrument
+from . import types as ty
+from .common import Path
+from .reader import _channel_selection, loader, streamer
+
+
+def _map_intensities(input_handle: imzparse.ImzMLParser) -> Optional[
+        np.ndarray]:
+    """Expose intensities of continuous imzML as read-only memory-mapped array.
+
+    Mapping is possible only if all intensity arrays have the same length and
+    are laid out in the .ibd file with a constant stride.
+
+    Args:
+        input_handle: Opened parser of imzml file.
+
+    Returns:
+        Matrix with spectra in rows backed by the .ibd file, or None if the
+        layout of the file does not allow mapping.
+    """
+    offsets = np.asarray(input_handle.intensityOffsets, dtype=np.int64)
+    lengths = np.asarray(input_handle.intensityLengths, dtype=np.int64)
+    if np.min(lengths) != np.max(lengths):
+        return None
+    dtype = np.dtype(input_handle.intensityPrecision).newbyteorder('<')
+    count, length = offsets.size, int(lengths[0])
+    stride = length * dtype.itemsize
+    if count > 1:
+        stride = int(offsets[1] - offsets[0])
+    if np.any(np.diff(offsets) != stride) or stride < length * dtype.itemsize \
+            or stride % dtype.itemsize:
+        return None
+    if stride == length * dtype.itemsize:
+        return np.memmap(input_handle.m.name, dtype=dtype, mode='r',
+                         offset=int(offsets[0]), shape=(count, length))
+    row_size = stride // dtype.itemsize
+    flat = np.memmap(input_handle.m.name, dtype=dtype, mode='r',
+                     offset=int(offsets[0]),
+                     shape=((count - 1) * row_size + length,))
+    return np.lib.stride_tricks.as_strided(
+        flat, shape=(count, length), strides=(stride, dtype.itemsize),
+        writeable=False)
+
+
+def _read_intensities(input_handle: imzparse.ImzMLParser, start: int,
+                      stop: int, dtype, selection=None) -> np.ndarray:
+    channels = np.arange(input_handle.intensityLengths[0])
+    if selection is not None:
+        channels = channels[selection]
+    spectra = np.empty((stop - start, channels.size), dtype=dtype)
+    for row, idx in enumerate(range(start, stop)):
+        spectra[row] = np.asarray(input_handle.getspectrum(idx)[1])[channels]
+    return spectra
+
+
+def _is_processed(input_handle: imzparse.ImzMLParser) -> bool:
+    """Spectra of continuous data share a single m/z array in the .ibd file,
+    while each spectrum of processed data has its own, even if of the same
+    length."""
+    return len(set(input_handle.mzOffsets)) > 1
+
+
+def _read_sparse(input_handle: imzparse.ImzMLParser, start: int,
+                 stop: int) -> ty.SparseSpectra:
+    lengths = np.asarray(input_handle.mzLengths[start:stop], dtype=np.int64)
+    offsets = np.zeros(lengths.size + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    mzs = np.empty(offsets[-1], dtype=np.dtype(input_handle.mzPrecision))
+    intensities = np.empty(offsets[-1],
+                           dtype=np.dtype(input_handle.intensityPrecision))
+    for row, idx in enumerate(range(start, stop)):
+        peaks = slice(offsets[row], offsets[row + 1])
+        mzs[peaks], intensities[peaks] = input_handle.getspectrum(idx)
+    return ty.SparseSpectra(mzs, intensities, offsets)
+
+
+def _read_ibd_rows(ibd_path: Path, offsets: np.ndarray, channels: np.ndarray,
+                   dtype, rows: np.ndarray) -> np.ndarray:
+    """Read selected channels of spectra, reading only the bytes spanning
+    them."""
+    data = np.empty((rows.size, channels.size), dtype=dtype)
+    if channels.size == 0:
+        return data
+    first = int(channels.min())
+    count = int(channels.max()) + 1 - first
+    with open(ibd_path, 'rb') as f:
+        for idx in np.argsort(rows, kind='mergesort'):
+            f.seek(offsets[rows[idx]] + first * data.itemsize)
+            window = np.frombuffer(f.read(data.itemsize * count), dtype=dtype)
+            data[idx] = window[channels - first]
+    return data
+
+
+def _lazy_intensities(input_handle: imzparse.ImzMLParser, selection=None,
+                      dtype=None) -> ty.LazySpectra:
+    offsets = np.asarray(input_handle.intensityOffsets, dtype=np.int64)
+    channels = np.arange(input_handle.intensityLengths[0])
+    if selection is not None:
+        channels = channels[selection]
+    stored = np.dtype(input_handle.intensityPrecision).newbyteorder('<')
+    read_rows = partial(_read_ibd_rows, input_handle.m.name, offsets,
+                        channels, stored)
+    return ty.LazySpectra((offsets.size, channels.size),
+                          stored if dtype is None else dtype, read_rows)
+
+
+@loader('.imzml')
+def load_imzml(file_path: Path, lazy: bool=False, workers: int=None,
+               mz_range: Tuple[float, float]=None, channels=None,
+               dtype=None) -> ty.Dataset:
+    """Load Dataset from imzml file.
+
+    Spectra of continuous data laid out uniformly in the .ibd file are not
+    read, but memory-mapped read-only, so only touched pages are loaded.
+    Processed data is loaded as SparseSpectra.
+
+    Args:
+        file_path: Path to imzml file.
+        lazy: If True, spectra of continuous data are read from the .ibd file
+        on access. Processed data is always read at once.
+        workers: Ignored, as there is no parsing involved.
+        mz_range: Lowest and highest m/z of loaded channels, inclusive. For
+        processed data, peaks outside of the range are dropped.
+        channels: Indices of loaded channels. Not supported for processed
+        data.
+        dtype: Type of intensities, as stored in the .ibd file by default.
+        Mapped spectra of other type are read and converted.
+
+    Returns:
+        The dataset itself.
+    """
+    with imzparse.ImzMLParser(file_path) as input_handle:
+        coordinates = ty.Coordinates(*zip(*input_handle.coordinates))
+        if _is_processed(input_handle):
+            if channels is not None:
+                raise ValueError("Processed data has no channels to select.")
+            with instrument.stage('imzml.read', path=file_path) as read:
+                spectra = _read_sparse(input_handle, 0, len(coordinates))
+                read.count(spectra=len(coordinates), bytes=spectra.nbytes)
+            if mz_range is not None:
+                spectra = spectra.select_range(*mz_range)
+            return ty.Dataset(spectra, coordinates, None, dtype=dtype)
+        mzs, first = input_handle.getspectrum(0)
+        selection = _channel_selection(np.asarray(mzs), mz_range, channels)
+        spectra = _map_intensities(input_handle)
+        if spectra is not None and selection is not None:
+            spectra = spectra[:, selection]
+        elif spectra is None and lazy:
+            spectra = _lazy_intensities(input_handle, selection, dtype)
+        elif spectra is None and selection is not None:
+            # only the bytes spanning selected channels are read
+            with instrument.stage('imzml.read', path=file_path) as read:
+                spectra = _lazy_intensities(input_handle, selection,
+                                            dtype).load()
+                read.count(spectra=len(coordinates), bytes=spectra.nbytes)
+        elif spectra is None:
+            with instrument.stage('imzml.read', path=file_path) as read:
+                spectra = _read_intensities(
+                    input_handle, 0, len(coordinates),
+                    np.asarray(first).dtype if dtype is None else dtype,
+                    selection)
+                read.count(spectra=len(coordinates), bytes=spectra.nbytes)
+        if selection is not None:
+            mzs = np.asarray(mzs)[selection]
+        return ty.Dataset(spectra, coordinates, mzs, copy=False, dtype=dtype)
+
+
+@streamer('.imzml')
+def iter_imzml(file_path: Path, batch_size: int) -> Iterator[ty.Dataset]:
+    """Stream Dataset from imzml file in batches of spectra.
+
+    Args:
+        file_path: Path to imzml file.
+        batch_size: Maximal number of spectra in a single batch.
+
+    Yields:
+        The dataset with consecutive spectra of the file.
+    """
+    with imzparse.ImzMLParser(file_path) as input_handle:
+        coordinates = np.array(input_handle.coordinates)
+        if _is_processed(input_handle):
+            for start in range(0, coordinates.shape[0], batch_size):
+                stop = min(start + batch_size, coordinates.shape[0])
+                spectra = _read_sparse(input_handle, start, stop)
+                batch_coordinates = ty.Coordinates(*coordinates[start:stop].T)
+                yield ty.Dataset(spectra, batch_coordinates, None)
+            return
+        mzs, first = input_handle.getspectrum(0)
+        dtype = np.asarray(first).dtype
+        mapped = _map_intensities(input_handle)
+        for start in range(0, coordinates.shape[0], batch_size):
+            stop = min(start + batch_size, coordinates.shape[0])
+            if mapped is None:
+                spectra = _read_intensities(input_handle, start, stop, dtype)
+            else:
+                spectra = np.array(mapped[start:stop])
+            batch_coordinates = ty.Coordinates(*coordinates[start:stop].T)
+            yield ty.Dataset(spectra, batch_coordinates, mzs, copy=False)
@@ -0,0 +1,186 @@
+"""Instrumentation of data access: timed stages, counters and progress
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import threading
+import time
+
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+
+# Finished stage, with its duration in seconds and counters, e.g. bytes
+# and spectra processed in the stage
+StageEvent = namedtuple('StageEvent', ['stage', 'seconds', 'counters',
+                                       'details'])
+
+Listener = Callable[[StageEvent], None]
+
+_listeners = []  # type: List[Listener]
+_lock = threading.Lock()
+# Progress bars are shown when enabled, or when SPDATA_PROGRESS is set
+_progress_enabled = bool(os.environ.get('SPDATA_PROGRESS'))
+
+
+def add_listener(listener: Listener):
+    """Register function called with StageEvent after each stage."""
+    global _listeners
+    with _lock:
+        _listeners = _listeners + [listener]
+
+
+def remove_listener(listener: Listener):
+    global _listeners
+    with _lock:
+        _listeners = [known for known in _listeners if known is not listener]
+
+
+@contextmanager
+def listening(listener: Listener):
+    """Register listener for the duration of the block."""
+    add_listener(listener)
+    try:
+        yield listener
+    finally:
+        remove_listener(listener)
+
+
+class _Stage:
+    """Counters of running stage"""
+    __slots__ = ('counters',)
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+
+    def count(self, **counters):
+        """Increase counters by given values."""
+        for name, value in counters.items():
+            self.counters[name] += value
+
+
+class _IgnoredStage:
+    """Stage with nobody listening, ignoring counters"""
+    __slots__ = ()
+
+    def count(self, **counters):
+        pass
+
+
+_IGNORED = _IgnoredStage()
+
+
+@contextmanager
+def stage(name: str, **details) -> Iterator[_Stage]:
+    """Time the block and report it to listeners as a stage.
+
+    Stages of loading and discovery report their duration and counters of
+    processed bytes and spectra. With no listeners registered, a stage costs
+    a single check.
+
+    Args:
+        name: Name of the stage, e.g. 'txt.parse'.
+        details: Description of the stage passed to listeners, e.g. path.
+
+    Yields:
+        Object with count method, increasing counters of the stage.
+    """
+    listeners = _listeners
+    if not listeners:
+        yield _IGNORED
+        return
+    running = _Stage()
+    start = time.perf_counter()
+    try:
+        yield running
+    finally:
+        event = StageEvent(name, time.perf_counter() - start,
+                           dict(running.counters), details)
+        for listener in listeners:
+            listener(event)
+
+
+class Timings:
+    """Listener summing durations and counters of stages by their names
+
+        timings = Timings()
+        with listening(timings):
+            load_dataset('dataset')
+        print(timings.seconds)
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = defaultdict(float)  # type: Dict[str, float]
+        self.calls = defaultdict(int)  # type: Dict[str, int]
+        self.counters = defaultdict(lambda: defaultdict(int))
+
+    def __call__(self, event: StageEvent):
+        with self._lock:
+            self.seconds[event.stage] += event.seconds
+            self.calls[event.stage] += 1
+            for name, value in event.counters.items():
+                self.counters[event.stage][name] += value
+
+
+def enable_progress(enabled: bool=True):
+    """Show progress bars of long loads, if tqdm is available."""
+    global _progress_enabled
+    _progress_enabled = enabled
+
+
+def _tqdm():
+    """Progress bar class, imported only once progress is shown."""
+    try:
+        from tqdm import tqdm
+    except ImportError:  # progress bars are optional
+        return None
+    return tqdm
+
+
+class _NoProgress:
+    __slots__ = ()
+
+    def update(self, count: int=1):
+        pass
+
+    def close(self):
+        pass
+
+
+_NO_PROGRESS = _NoProgress()
+
+
+@contextmanager
+def progress(total: int=None, description: str=None, unit: str='spectra'):
+    """Progress bar of a loop, shown only if enabled.
+
+    Args:
+        total: Expected number of units, unknown if None.
+        description: Label of the bar.
+        unit: Name of counted units.
+
+    Yields:
+        Object with update method, advancing the bar by given count.
+    """
+    tqdm = _tqdm() if _progress_enabled else None
+    if tqdm is None:
+        yield _NO_PROGRESS
+        return
+    bar = tqdm(total=total, desc=description, unit=unit, leave=False)
+    try:
+        yield bar
+    finally:
+        bar.close()
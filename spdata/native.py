@@ -0,0 +1,231 @@
+"""Native binary format of datasets, with spectra stored in chunks
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import struct
+import zlib
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+from . import types as ty
+from .common import Path
+
+EXTENSION = '.spd'
+MAGIC = b'SPDATA\x00\x01'
+_LENGTH = struct.Struct('<Q')
+DEFAULT_CHUNK_SHAPE = (256, 4096)
+
+_COMPRESSORS = {
+    None: (lambda data, level: data, lambda data: data),
+    'zlib': (lambda data, level: zlib.compress(
+        data, 6 if level is None else level), zlib.decompress),
+    'lzma': (lambda data, level: _lzma().compress(data, preset=level),
+             lambda data: _lzma().decompress(data)),
+}
+
+
+def _lzma():
+    import lzma  # imported only for files compressed with it
+    return lzma
+
+
+def _little_endian(array: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(
+        array, dtype=array.dtype.newbyteorder('<'))
+
+
+def write(dataset: ty.Dataset, path: Path,
+          chunk_shape: Tuple[int, int]=DEFAULT_CHUNK_SHAPE,
+          compression: str=None, level: int=None):
+    """Write dataset in native format.
+
+    Args:
+        dataset: The dataset to write. Sparse datasets have to be binned
+        first.
+        path: Path of the created file.
+        chunk_shape: Number of spectra and mass channels in single chunk.
+        compression: None, 'zlib' or 'lzma'.
+        level: Level of compression, default of the compressor if None.
+
+    Raises:
+        ValueError
+    """
+    if dataset.is_sparse:
+        raise ValueError("Sparse datasets should be binned before saving.")
+    if compression not in _COMPRESSORS:
+        raise ValueError("Unsupported compression: %s" % compression)
+    if min(chunk_shape) < 1:
+        raise ValueError("Chunks should be non-empty. Were: %s"
+                         % str(chunk_shape))
+    compress, _ = _COMPRESSORS[compression]
+    rows, columns = dataset.spectra.shape
+    chunk_rows, chunk_columns = chunk_shape
+    chunks = []
+    arrays = {}
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        for start in range(0, rows, chunk_rows):
+            block = dataset.spectra[start:start + chunk_rows]
+            for column in range(0, columns, chunk_columns):
+                chunk = _little_endian(
+                    np.asarray(block[:, column:column + chunk_columns]))
+                data = compress(chunk.tobytes(), level)
+                chunks.append([f.tell(), len(data)])
+                f.write(data)
+        named = [('mz', dataset.mz), ('x', dataset.coordinates.x),
+                 ('y', dataset.coordinates.y), ('z', dataset.coordinates.z),
+                 ('labels', dataset.labels)]
+        for name, array in named:
+            if array is None:
+                continue
+            array = _little_endian(np.asarray(array))
+            arrays[name] = [f.tell(), array.dtype.str, list(array.shape)]
+            f.write(array.tobytes())
+        index = {
+            'shape': [rows, columns],
+            'dtype': np.dtype(dataset.spectra.dtype).newbyteorder('<').str,
+            'chunk_shape': [chunk_rows, chunk_columns],
+            'compression': compression,
+            'chunks': chunks,
+            'arrays': arrays,
+        }
+        header = json.dumps(index).encode()
+        f.write(header)
+        f.write(_LENGTH.pack(len(header)))
+        f.write(MAGIC)
+
+
+def _indices(key, size: int) -> np.ndarray:
+    if key is None:
+        return np.arange(size)
+    return np.arange(size)[key]
+
+
+class NativeFile:
+    """Dataset file in native format, opened for reading
+
+    File starts with a magic number and is followed by chunks of spectra,
+    each covering a block of rows (spectra) and columns (mass channels),
+    optionally compressed. Then m/z-s, coordinates and labels are stored,
+    followed by JSON index describing where everything is, its length and
+    the magic number again. Reading subset of spectra or m/z window touches
+    only the relevant chunks.
+    """
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: Path to the file.
+
+        Raises:
+            IOError, if the file is not in native format
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise IOError("Not a native dataset file: " + path)
+            f.seek(-(len(MAGIC) + _LENGTH.size), 2)
+            length, = _LENGTH.unpack(f.read(_LENGTH.size))
+            if f.read(len(MAGIC)) != MAGIC:
+                raise IOError("Truncated native dataset file: " + path)
+            f.seek(-(len(MAGIC) + _LENGTH.size + length), 2)
+            index = json.loads(f.read(length).decode())
+            self.arrays = {
+                name: self._read_array(f, offset, dtype, shape)
+                for name, (offset, dtype, shape) in index['arrays'].items()
+            }  # type: Dict[str, np.ndarray]
+        self.shape = tuple(index['shape'])
+        self.dtype = np.dtype(index['dtype'])
+        self.chunk_shape = tuple(index['chunk_shape'])
+        self._decompress = _COMPRESSORS[index['compression']][1]
+        self._chunks = index['chunks']
+        self._chunks_per_row = -(-self.shape[1] // self.chunk_shape[1])
+
+    @staticmethod
+    def _read_array(f, offset: int, dtype: str, shape) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        f.seek(offset)
+        count = int(np.prod(shape))
+        return np.frombuffer(f.read(count * dtype.itemsize),
+                             dtype=dtype).reshape(shape)
+
+    @property
+    def mz(self) -> np.ndarray:
+        return self.arrays['mz']
+
+    @property
+    def coordinates(self) -> ty.Coordinates:
+        return ty.Coordinates(self.arrays['x'], self.arrays['y'],
+                              self.arrays['z'])
+
+    @property
+    def labels(self) -> np.ndarray:
+        return self.arrays.get('labels')
+
+    def read(self, rows=None, columns=None, dtype=None) -> np.ndarray:
+        """Read spectra, decompressing only chunks covering them.
+
+        Args:
+            rows: Index of spectra, all by default.
+            columns: Index of mass channels, all by default.
+            dtype: Type of the result, as stored by default. Chunks are
+            converted one by one.
+
+        Returns:
+            Matrix with selected spectra in rows and channels in columns.
+        """
+        rows = _indices(rows, self.shape[0])
+        columns = _indices(columns, self.shape[1])
+        result = np.empty((rows.size, columns.size),
+                          dtype=self.dtype if dtype is None else dtype)
+        if result.size == 0:
+            return result
+        chunk_rows, chunk_columns = self.chunk_shape
+        row_chunks, columns_chunks = rows // chunk_rows, \
+            columns // chunk_columns
+        with open(self.path, 'rb') as f:
+            for row_chunk in np.unique(row_chunks):
+                in_rows = np.flatnonzero(row_chunks == row_chunk)
+                for column_chunk in np.unique(columns_chunks):
+                    in_columns = np.flatnonzero(columns_chunks == column_chunk)
+                    chunk = self._read_chunk(f, row_chunk, column_chunk)
+                    result[np.ix_(in_rows, in_columns)] = chunk[np.ix_(
+                        rows[in_rows] - row_chunk * chunk_rows,
+                        columns[in_columns] - column_chunk * chunk_columns)]
+        return result
+
+    def _read_chunk(self, f, row_chunk: int, column_chunk: int) -> np.ndarray:
+        offset, size = self._chunks[row_chunk * self._chunks_per_row
+                                    + column_chunk]
+        f.seek(offset)
+        data = np.frombuffer(self._decompress(f.read(size)), dtype=self.dtype)
+        chunk_rows, chunk_columns = self.chunk_shape
+        width = min(chunk_columns,
+                    self.shape[1] - column_chunk * chunk_columns)
+        return data.reshape(-1, width)
+
+    def dataset(self, rows=None, columns=None, dtype=None) -> ty.Dataset:
+        """Read selected spectra along with their metadata."""
+        rows = _indices(rows, self.shape[0])
+        columns = _indices(columns, self.shape[1])
+        labels = self.labels[rows] if self.labels is not None else None
+        coordinates = ty.Coordinates(self.arrays['x'][rows],
+                                     self.arrays['y'][rows],
+                                     self.arrays['z'][rows], copy=False)
+        return ty.Dataset(self.read(rows, columns, dtype), coordinates,
+                          self.mz[columns], labels, copy=False)
@@ -0,0 +1,196 @@
+"""Registries of handlers of file formats, imported on first use
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import importlib
+import threading
+import warnings
+
+from collections import namedtuple
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from . import instrument
+
+# Priority of formats provided by this package
+DEFAULT_PRIORITY = 0
+# Priority of formats declared by entry points of installed packages, which
+# take precedence over the built-in ones
+PLUGIN_PRIORITY = 10
+
+# Declared handler, with reference to it and the handler itself, once
+# imported
+_Declaration = namedtuple('_Declaration', ['priority', 'target', 'handler'])
+
+
+def _target_of(handler: Callable) -> str:
+    return '%s:%s' % (handler.__module__,
+                      getattr(handler, '__qualname__', handler.__name__))
+
+
+def _import(target: str):
+    module_name, _, attribute = target.partition(':')
+    found = importlib.import_module(module_name)
+    for name in filter(None, attribute.split('.')):
+        found = getattr(found, name)
+    return found
+
+
+def _entry_points(group: str) -> List[Tuple[str, str]]:
+    """Names and references 'module:attribute' of entry points in group."""
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python older than 3.8
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return [(point.name, '%s:%s' % (point.module_name,
+                                        '.'.join(point.attrs)))
+                for point in pkg_resources.iter_entry_points(group)]
+    found = entry_points()
+    if hasattr(found, 'select'):
+        found = found.select(group=group)
+    else:
+        found = found.get(group, [])
+    return [(point.name, point.value) for point in found]
+
+
+class Registry(Mapping):
+    """Handlers of file formats by lowercase extension
+
+    Formats are declared by extension, either with a handler or with a
+    reference 'module:attribute' to it. Handlers declared by reference are
+    imported on first lookup, so processes reading a single format do not
+    pay for importing the others. Checking whether extension is registered,
+    or iterating extensions, imports nothing.
+
+    Installed packages declare formats with entry points named by
+    extension, e.g. in setup.py:
+
+        entry_points={'spdata.loaders': ['.mzml = my_package.mzml:load']}
+
+    Each extension is handled by the declaration of the highest priority.
+    Declaring an extension again with the same priority is an error, unless
+    override is requested.
+    """
+    def __init__(self, group: str=None):
+        """
+        Args:
+            group: Group of entry points declaring further formats, read on
+            first use of the registry. None to skip entry points.
+        """
+        self._group = group
+        self._declarations = {}  # type: Dict[str, _Declaration]
+        self._lock = threading.RLock()
+        self._plugins_read = group is None
+
+    def register(self, ext: str, handler: Callable,
+                 priority: int=DEFAULT_PRIORITY, override: bool=False):
+        """Register handler of files with extension.
+
+        Args:
+            ext: Extension, with leading dot, e.g. '.txt.gz'.
+            handler: Function handling the files.
+            priority: Declarations of lower priority are ignored.
+            override: If True, the handler replaces previous declaration
+            regardless of its priority.
+
+        Raises:
+            ValueError, if extension is already declared with the same
+            priority for a different handler, and override is not requested.
+        """
+        self._declare(ext, _Declaration(priority, _target_of(handler),
+                                        handler), override)
+
+    def declare(self, ext: str, target: str, priority: int=DEFAULT_PRIORITY,
+                override: bool=False):
+        """Declare handler of files with extension, imported on first use.
+
+        Args:
+            ext: Extension, with leading dot, e.g. '.imzml'.
+            target: Reference 'module:attribute' to the handler.
+            priority: Declarations of lower priority are ignored.
+            override: If True, the declaration replaces previous one
+            regardless of its priority.
+
+        Raises:
+            ValueError, if extension is already declared with the same
+            priority for a different handler, and override is not requested.
+        """
+        if ':' not in target:
+            raise ValueError("Expected reference 'module:attribute'. Was: "
+                             + target)
+        self._declare(ext, _Declaration(priority, target, None), override)
+
+    def _declare(self, ext: str, declaration: _Declaration, override: bool):
+        ext = ext.lower()
+        with self._lock:
+            current = self._declarations.get(ext)
+            if current is None or override \
+                    or declaration.priority > current.priority:
+                self._declarations[ext] = declaration
+            elif declaration.priority < current.priority:
+                return
+            elif declaration.target == current.target:
+                # module declared by reference registers its handler
+                if declaration.handler is not None:
+                    self._declarations[ext] = declaration
+            else:
+                raise ValueError(
+                    "Extension %s is already handled by %s with priority %i."
+                    % (ext, current.target, current.priority))
+
+    def _read_plugins(self):
+        with self._lock:
+            if self._plugins_read:
+                return
+            self._plugins_read = True
+            for ext, target in _entry_points(self._group):
+                try:
+                    self.declare(ext, target, PLUGIN_PRIORITY)
+                except ValueError as ex:
+                    warnings.warn("Ignored format plugin: %s" % ex)
+
+    def _all(self) -> Dict[str, _Declaration]:
+        if not self._plugins_read:
+            self._read_plugins()
+        return self._declarations
+
+    def __getitem__(self, ext: str) -> Callable:
+        declaration = self._all()[ext]
+        if declaration.handler is not None:
+            return declaration.handler
+        with instrument.stage('plugin.import', target=declaration.target):
+            handler = _import(declaration.target)
+        with self._lock:
+            current = self._declarations.get(ext)
+            if current is declaration:
+                self._declarations[ext] = declaration._replace(
+                    handler=handler)
+            elif current is not None and current.handler is not None \
+                    and current.target == declaration.target:
+                handler = current.handler
+        return handler
+
+    def __contains__(self, ext) -> bool:
+        return ext in self._all()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._all()))
+
+    def __len__(self) -> int:
+        return len(self._all())
@@ -16,16 +16,27 @@ limitations under the License.
 """
 
 import os
+import shutil
+import tempfile
+import warnings
 
-from typing import List, Tuple, Callable
-from functools import wraps
+from collections import deque, namedtuple
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterator, List, TextIO, Tuple
+from functools import partial, wraps
 
 import numpy as np
-import pyimzml.ImzMLParser as imzparse
 
 from . import types as ty
+from . import compressed
+from . import instrument
 from . import discover as disc
-from .common import Name, Path
+from . import native
+from . import plugins
+from . import sidecar as sc
+from .cache import DatasetCache
+from .common import Name, Path, SHARED_ROOT, registered_extension
 
 def _parse_metadata(line: str) -> (int, int, int, int):
     x, y, z, label, *_ = line.split()
@@ -34,91 +45,677 @@ def _parse_metadata(line: str) -> (int, int, int, int):
 def _parse_data(line: str) -> List[float]:
     return [float(value) for value in line.split()]
 
-def _load_entry(metadata_line: str, data_line: str) -> Tuple[
-        Tuple[int, int, int], int, List[float]]:
-    x, y, z, label = _parse_metadata(metadata_line)
-    data = _parse_data(data_line)
-    return (x, y, z), label, data
+# Number of spectra converted at once by the text parser
+_CHUNK_SPECTRA = 1024
+# Number of characters read at once while counting lines
+_BLOCK_SIZE = 2 ** 20
+# Maximal number of bytes of the file parsed by single parallel task
+_RANGE_SIZE = 2 ** 26
 
-# Definition of loaders
-loaders = {}
+def _count_lines(handle: TextIO) -> int:
+    """Count lines remaining in the handle and rewind it back."""
+    start = handle.tell()
+    count, last = 0, '\n'
+    for block in iter(partial(handle.read, _BLOCK_SIZE), ''):
+        count += block.count('\n')
+        last = block[-1]
+    if last != '\n':
+        count += 1
+    handle.seek(start)
+    return count
 
-def loader(ext: str):
-    def register_loader(f : Callable[[Path], ty.Dataset]):
-        loaders.setdefault(ext, f)
+def _parse_metadata_block(lines: List[str]) -> np.ndarray:
+    return np.array([line.split(None, 4)[:4] for line in lines], dtype=int)
+
+def _channel_selection(mzs: np.ndarray, mz_range: Tuple[float, float]=None,
+                       channels=None):
+    """Resolve selection of mass channels.
+
+    Args:
+        mzs: Sorted m/z-s of all channels.
+        mz_range: Lowest and highest m/z of selected channels, inclusive.
+        channels: Indices of selected channels.
+
+    Returns:
+        Slice or indices of selected channels, None if nothing is selected.
+
+    Raises:
+        ValueError, IndexError
+    """
+    if mz_range is not None and channels is not None:
+        raise ValueError("Channels should be selected by either m/z range or "
+                         "indices, not both.")
+    if mz_range is not None:
+        low, high = mz_range
+        return slice(int(np.searchsorted(mzs, low, side='left')),
+                     int(np.searchsorted(mzs, high, side='right')))
+    if channels is not None:
+        return np.arange(mzs.size)[np.asarray(channels, dtype=np.int64)]
+    return None
+
+def _parse_selected(lines: List[str], channels: int,
+                    selection) -> np.ndarray:
+    """Convert only selected values of each line."""
+    indices = np.arange(channels)[selection]
+    data = np.empty((len(lines), indices.size))
+    if indices.size == 0:
+        return data
+    start, stop = int(indices[0]), int(indices.max()) + 1
+    if indices.size == stop - start and np.all(np.diff(indices) == 1):
+        pick = lambda tokens: tokens[start:stop]
+    else:
+        getter = itemgetter(*indices.tolist())
+        pick = lambda tokens: np.atleast_1d(getter(tokens))
+    for row, line in enumerate(lines):
+        tokens = line.split()
+        if len(tokens) != channels:
+            raise ValueError("Malformed spectra: expected %i values per "
+                             "line." % channels)
+        data[row] = pick(tokens)
+    return data
+
+def _parse_data_block(lines: List[str], channels: int,
+                      selection=None) -> np.ndarray:
+    if selection is not None:
+        return _parse_selected(lines, channels, selection)
+    data = np.empty((len(lines), channels))
+    with warnings.catch_warnings():
+        # numpy warns instead of failing on malformed input; size check below
+        warnings.simplefilter('ignore', DeprecationWarning)
+        for row, line in enumerate(lines):
+            values = np.fromstring(line, sep=' ')
+            if values.size != channels:
+                raise ValueError("Malformed spectra: expected %i values per "
+                                 "line." % channels)
+            data[row] = values
+    return data
+
+# Definition of loaders, imported on first use if declared by reference
+loaders = plugins.Registry('spdata.loaders')
+
+def loader(ext: str, priority: int=plugins.DEFAULT_PRIORITY,
+           override: bool=False):
+    def register_loader(f : Callable[..., ty.Dataset]):
+        loaders.register(ext, f, priority, override)
         @wraps(f)
-        def loader_wrapper(file_path: Path):
-            return f(file_path)
+        def loader_wrapper(file_path: Path, **options):
+            return f(file_path, **options)
         return loader_wrapper
     return register_loader
 
+# Definition of streaming counterparts of loaders
+streamers = plugins.Registry('spdata.streamers')
+
+DEFAULT_BATCH_SIZE = 1024
+
+def streamer(ext: str, priority: int=plugins.DEFAULT_PRIORITY,
+             override: bool=False):
+    def register_streamer(f : Callable[[Path, int], Iterator[ty.Dataset]]):
+        streamers.register(ext, f, priority, override)
+        @wraps(f)
+        def streamer_wrapper(file_path: Path,
+                             batch_size: int=DEFAULT_BATCH_SIZE):
+            if batch_size < 1:
+                raise ValueError("Batch size should be positive. Was: %i"
+                                 % batch_size)
+            return f(file_path, batch_size)
+        return streamer_wrapper
+    return register_streamer
+
+# Formats with heavy dependencies, imported when first opened
+loaders.declare('.imzml', 'spdata.imzml:load_imzml')
+streamers.declare('.imzml', 'spdata.imzml:iter_imzml')
+
+def load_imzml(file_path: Path, **options) -> ty.Dataset:
+    """Load Dataset from imzml file, as in spdata.imzml.load_imzml."""
+    from . import imzml
+    return imzml.load_imzml(file_path, **options)
+
+def iter_imzml(file_path: Path, batch_size: int=DEFAULT_BATCH_SIZE
+               ) -> Iterator[ty.Dataset]:
+    """Stream Dataset from imzml file, as in spdata.imzml.iter_imzml."""
+    from . import imzml
+    return imzml.iter_imzml(file_path, batch_size)
+
+def _as_batch(metadata: np.ndarray, data: np.ndarray, mzs) -> ty.Dataset:
+    with instrument.stage('assemble') as assembled:
+        x, y, z, labels = metadata.T
+        coordinates = ty.Coordinates(x, y, z, copy=False)
+        assembled.count(spectra=len(coordinates))
+        return ty.Dataset(data, coordinates, mzs, labels, copy=False)
+
+def _index_txt(file_path: Path) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find m/z-s, metadata of spectra and byte offsets of their data lines.
+
+    Args:
+        file_path : Data file path.
+
+    Returns:
+        m/z-s, metadata with coordinates and label of each spectrum in rows
+        and offsets of data lines
+    """
+    with open(file_path, 'rb') as f:
+        offset = len(f.readline())  # unsupported global metadata
+        mzs_line = f.readline()
+        offset += len(mzs_line)
+        mzs = np.array(_parse_data(mzs_line.decode()))
+        metadata, offsets = [], []
+        while True:
+            metadata_line, data_line = f.readline(), f.readline()
+            if not data_line:
+                break
+            metadata.append(metadata_line.split(None, 4)[:4])
+            offsets.append(offset + len(metadata_line))
+            offset += len(metadata_line) + len(data_line)
+    metadata = np.array(metadata, dtype=int).reshape(-1, 4)
+    return mzs, metadata, np.array(offsets, dtype=np.int64)
+
+# m/z-s, byte offsets of data lines, coordinates and labels of spectra
+TxtIndex = namedtuple('TxtIndex', ['mz', 'offsets', 'coordinates', 'labels'])
+
+_TXT_INDEX_SUFFIX = '.index.npz'
+_txt_indices = {}  # type: Dict[Path, Tuple[Dict, TxtIndex]]
+
+def index_txt(file_path: Path, cache_dir: Path=None) -> TxtIndex:
+    """Index of spectra of text file, for reading them one by one.
+
+    Index is stored in a binary file next to the binary copy of the dataset
+    and kept in memory, both reused as long as the file is not modified.
+
+    Args:
+        file_path: Data file path.
+        cache_dir: Directory for stored indices, as in sidecar.sidecar_path.
+
+    Returns:
+        The index.
+    """
+    identity = sc.source_identity(file_path)
+    key = os.path.abspath(file_path), cache_dir
+    known = _txt_indices.get(key)
+    if known is not None and known[0] == identity:
+        return known[1]
+    path = sc.sidecar_path(file_path, cache_dir) + _TXT_INDEX_SUFFIX
+    arrays = sc.load_arrays(path, identity)
+    if arrays is None:
+        mzs, metadata, offsets = _index_txt(file_path)
+        arrays = {'mz': mzs, 'offsets': offsets, 'metadata': metadata}
+        try:
+            sc.dump_arrays(path, arrays, identity)
+        except OSError as ex:
+            warnings.warn("Index of %s could not be written: %s"
+                          % (file_path, ex))
+    x, y, z, labels = arrays['metadata'].T
+    index = TxtIndex(arrays['mz'], arrays['offsets'],
+                     ty.Coordinates(x, y, z, copy=False), labels)
+    _txt_indices[key] = identity, index
+    return index
+
+def _read_txt_rows(file_path: Path, offsets: np.ndarray, channels: int,
+                   selection, dtype, rows: np.ndarray) -> np.ndarray:
+    width = np.arange(channels)[selection].size if selection is not None \
+        else channels
+    data = np.empty((rows.size, width), dtype=dtype)
+    with open(file_path, 'rb') as f:
+        for idx in np.argsort(rows, kind='mergesort'):
+            f.seek(offsets[rows[idx]])
+            data[idx] = _parse_data_block([f.readline().decode()], channels,
+                                          selection)
+    return data
+
+def _load_txt_lazy(file_path: Path, mz_range: Tuple[float, float]=None,
+                   channels=None, dtype=float) -> ty.Dataset:
+    mzs, metadata, offsets = _index_txt(file_path)
+    selection = _channel_selection(mzs, mz_range, channels)
+    read_rows = partial(_read_txt_rows, file_path, offsets, mzs.size,
+                        selection, dtype)
+    if selection is not None:
+        mzs = mzs[selection]
+    spectra = ty.LazySpectra((offsets.size, mzs.size), dtype, read_rows)
+    return _as_batch(metadata, spectra, mzs)
+
+def _line_starts(file_path: Path) -> np.ndarray:
+    """Byte offsets of beginnings of all lines of the file, and of its end."""
+    starts, base, last = [np.zeros(1, dtype=np.int64)], 0, b'\n'
+    with open(file_path, 'rb') as f:
+        for block in iter(partial(f.read, _BLOCK_SIZE), b''):
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8)
+                                      == ord('\n'))
+            starts.append(newlines.astype(np.int64) + base + 1)
+            base += len(block)
+            last = block[-1:]
+    if last != b'\n':
+        starts.append(np.array([base], dtype=np.int64))
+    return np.concatenate(starts)
+
+def _parse_txt_range(file_path: Path, start: int, stop: int, channels: int,
+                     selection, dtype) -> Tuple[np.ndarray, np.ndarray]:
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(stop - start).decode().splitlines()
+    # converted before sending back, so smaller types are cheaper to transfer
+    return _parse_metadata_block(lines[0::2]), \
+           _parse_data_block(lines[1::2], channels, selection).astype(
+               dtype, copy=False)
+
+def _load_txt_parallel(file_path: Path, workers: int,
+                       mz_range: Tuple[float, float]=None,
+                       channels=None, dtype=float) -> ty.Dataset:
+    """Parse ranges of the file aligned to spectra in a pool of processes."""
+    starts = _line_starts(file_path)
+    with open(file_path) as f:
+        _ = f.readline()  # unsupported global metadata
+        mzs = np.array(_parse_data(f.readline()))
+    selection = _channel_selection(mzs, mz_range, channels)
+    selected = mzs[selection] if selection is not None else mzs
+    # metadata line of each spectrum, followed by the end of the last one
+    bounds = starts[2::2][:(starts.size - 3) // 2 + 1]
+    spectra_number = bounds.size - 1
+    tasks = max(workers * 4, (bounds[-1] - bounds[0]) // _RANGE_SIZE + 1)
+    splits = np.unique(np.linspace(0, spectra_number, tasks + 1).astype(int))
+
+    # imported on use, as the process pool is slow to import
+    from concurrent.futures import ProcessPoolExecutor
+    data = np.empty((spectra_number, selected.size), dtype=dtype)
+    metadata = np.empty((spectra_number, 4), dtype=int)
+    with instrument.stage('txt.parse', path=file_path) as parsed, \
+            instrument.progress(spectra_number, 'Parsing') as bar, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for first, last in zip(splits[:-1], splits[1:]):
+            # at most two ranges per worker are kept in memory at once
+            if len(pending) >= 2 * workers:
+                bar.update(_collect(pending.popleft(), metadata, data))
+            future = pool.submit(_parse_txt_range, file_path,
+                                 int(bounds[first]), int(bounds[last]),
+                                 mzs.size, selection, dtype)
+            pending.append((first, last, future))
+        while pending:
+            bar.update(_collect(pending.popleft(), metadata, data))
+        parsed.count(spectra=spectra_number, bytes=int(bounds[-1]))
+    return _as_batch(metadata, data, selected)
+
+def _collect(task, metadata: np.ndarray, data: np.ndarray) -> int:
+    """Store parsed range, returning the number of its spectra."""
+    first, last, future = task
+    metadata[first:last], data[first:last] = future.result()
+    return last - first
+
+def _load_compressed_txt(file_path: Path, mz_range: Tuple[float, float],
+                         channels, dtype) -> ty.Dataset:
+    """Parse chunks of spectra as they are decompressed.
+
+    Number of spectra is not known up front, so parsed chunks are
+    concatenated at the end.
+    """
+    with compressed.open_text(file_path) as f:
+        _ = f.readline()  # unsupported global metadata
+        mzs = np.array(_parse_data(f.readline()))
+        selection = _channel_selection(mzs, mz_range, channels)
+        selected = mzs[selection] if selection is not None else mzs
+        metadata, data = [], []
+        with instrument.stage('txt.parse', path=file_path) as parsed, \
+                instrument.progress(description='Parsing') as bar:
+            for lines in iter(lambda: list(islice(f, 2 * _CHUNK_SPECTRA)),
+                              []):
+                metadata.append(_parse_metadata_block(lines[0::2]))
+                data.append(_parse_data_block(lines[1::2], mzs.size,
+                                              selection).astype(dtype,
+                                                                copy=False))
+                parsed.count(spectra=len(lines) // 2)
+                bar.update(len(lines) // 2)
+            parsed.count(compressed_bytes=os.path.getsize(file_path))
+    if not data:
+        return _as_batch(np.empty((0, 4), dtype=int),
+                         np.empty((0, selected.size), dtype=dtype), selected)
+    return _as_batch(np.concatenate(metadata), np.concatenate(data),
+                     selected)
+
 @loader('.txt')
-def load_txt(file_path: Path) -> ty.Dataset:
+@loader('.txt.gz')
+@loader('.txt.xz')
+@loader('.txt.bz2')
+def load_txt(file_path: Path, lazy: bool=False, workers: int=None,
+             mz_range: Tuple[float, float]=None, channels=None,
+             dtype=None) -> ty.Dataset:
     """Load Dataset from file.
 
     Args:
         file_path : Data file path.
+        lazy : If True, the file is only scanned for m/z-s, coordinates and
+        labels, while spectra are read on access. Compressed files are
+        always read at once.
+        workers : Number of processes parsing the file in parallel. By
+        default the file is parsed in the calling process. Compressed files
+        are parsed in the calling process, while being decompressed in a
+        background thread.
+        mz_range : Lowest and highest m/z of loaded channels, inclusive.
+        channels : Indices of loaded channels. Only values of selected
+        channels are converted.
+        dtype : Type of intensities, float64 by default. Spectra are stored
+        in that type as they are parsed.
 
     Returns:
         spdata.types.Dataset
     """
+    dtype = np.dtype(float if dtype is None else dtype)
+    if compressed.is_compressed(file_path):
+        return _load_compressed_txt(file_path, mz_range, channels, dtype)
+    if lazy:
+        return _load_txt_lazy(file_path, mz_range, channels, dtype)
+    if workers is not None and workers > 1:
+        return _load_txt_parallel(file_path, workers, mz_range, channels,
+                                  dtype)
     with open(file_path) as f:
-        iterator = iter(f)
-        _ = next(iterator)  # unsupported global metadata
-        mzs_line = next(iterator)
+        _ = f.readline()  # unsupported global metadata
+        mzs = np.array(_parse_data(f.readline()))
+        selection = _channel_selection(mzs, mz_range, channels)
+        selected = mzs[selection] if selection is not None else mzs
+        with instrument.stage('txt.scan', path=file_path):
+            spectra_number = _count_lines(f) // 2
 
-        mzs = [float(mz) for mz in mzs_line.split()]
+        data = np.empty((spectra_number, selected.size), dtype=dtype)
+        metadata = np.empty((spectra_number, 4), dtype=int)
+        with instrument.stage('txt.parse', path=file_path) as parsed, \
+                instrument.progress(spectra_number, 'Parsing') as bar:
+            for start in range(0, spectra_number, _CHUNK_SPECTRA):
+                stop = min(start + _CHUNK_SPECTRA, spectra_number)
+                lines = list(islice(f, 2 * (stop - start)))
+                metadata[start:stop] = _parse_metadata_block(lines[0::2])
+                data[start:stop] = _parse_data_block(lines[1::2], mzs.size,
+                                                     selection)
+                parsed.count(spectra=stop - start,
+                             bytes=sum(map(len, lines)))
+                bar.update(stop - start)
 
-        entries = map(_load_entry, iterator, iterator)
+    return _as_batch(metadata, data, selected)
 
-        coordinates, labels, data = zip(*entries)
+@streamer('.txt')
+@streamer('.txt.gz')
+@streamer('.txt.xz')
+@streamer('.txt.bz2')
+def iter_txt(file_path: Path, batch_size: int) -> Iterator[ty.Dataset]:
+    """Stream Dataset from file in batches of spectra.
 
-        data = np.vstack(data)
-        coordinates = ty.Coordinates(*zip(*coordinates))
+    Args:
+        file_path : Data file path.
+        batch_size : Maximal number of spectra in a single batch.
 
-    return ty.Dataset(data, coordinates, mzs, labels)
+    Yields:
+        spdata.types.Dataset with consecutive spectra of the file
+    """
+    with compressed.open_text(file_path) as f:
+        _ = f.readline()  # unsupported global metadata
+        mzs = np.array(_parse_data(f.readline()))
+        while True:
+            lines = list(islice(f, 2 * batch_size))
+            if len(lines) < 2:
+                return
+            metadata = _parse_metadata_block(lines[0::2])
+            data = _parse_data_block(lines[1::2], mzs.size)
+            yield _as_batch(metadata, data, mzs)
 
-@loader('.imzml')
-def load_imzml(file_path: Path) -> ty.Dataset:
-    """Load Dataset from imzml file.
+@loader(native.EXTENSION)
+def load_native(file_path: Path, lazy: bool=False, workers: int=None,
+                mz_range: Tuple[float, float]=None, channels=None,
+                dtype=None) -> ty.Dataset:
+    """Load Dataset from file in native format.
 
     Args:
-        file_path: Path to imzml file.
+        file_path: Path to the file.
+        lazy: If True, spectra are read on access, decompressing only the
+        chunks covering accessed spectra.
+        workers: Ignored, as there is no parsing involved.
+        mz_range: Lowest and highest m/z of loaded channels, inclusive.
+        channels: Indices of loaded channels.
+        dtype: Type of intensities, as stored in the file by default.
+        Chunks are converted as they are decompressed.
 
     Returns:
         The dataset itself.
     """
-    with imzparse.ImzMLParser(file_path) as input_handle:
-        if np.min(input_handle.mzLengths) != np.max(input_handle.mzLengths):
-            raise ValueError("Can't read processed data.")
-        mzs = input_handle.getspectrum(0)[0]
-        coordinates = [
-            (x, y, z)
-            for idx, (x, y, z) in enumerate(input_handle.coordinates)
-        ]
-        spectra = [
-            input_handle.getspectrum(i)[1]
-            for i in range(len(coordinates))
-        ]
-        coordinates = ty.Coordinates(*zip(*coordinates))
-        return ty.Dataset(spectra, coordinates, mzs)
-
-
-def load_dataset(name: Name) -> ty.Dataset:
+    handle = native.NativeFile(file_path)
+    selection = _channel_selection(handle.mz, mz_range, channels)
+    if not lazy:
+        with instrument.stage('native.read', path=file_path) as read:
+            dataset = handle.dataset(columns=selection, dtype=dtype)
+            read.count(spectra=len(dataset.coordinates),
+                       bytes=dataset.spectra.nbytes)
+        return dataset
+    mzs = handle.mz[selection] if selection is not None else handle.mz
+    read_rows = partial(handle.read, columns=selection, dtype=dtype)
+    spectra = ty.LazySpectra((handle.shape[0], mzs.size),
+                             handle.dtype if dtype is None else dtype,
+                             read_rows)
+    return ty.Dataset(spectra, handle.coordinates, mzs, handle.labels,
+                      copy=False)
+
+@streamer(native.EXTENSION)
+def iter_native(file_path: Path, batch_size: int) -> Iterator[ty.Dataset]:
+    """Stream Dataset from file in native format in batches of spectra.
+
+    Args:
+        file_path: Path to the file.
+        batch_size: Maximal number of spectra in a single batch.
+
+    Yields:
+        The dataset with consecutive spectra of the file.
+    """
+    handle = native.NativeFile(file_path)
+    for start in range(0, handle.shape[0], batch_size):
+        yield handle.dataset(slice(start, start + batch_size))
+
+def _find_handler(name: Name, handlers: Dict[str, Callable]) -> Tuple[
+        Callable, Path]:
+    if not disc.dataset_exists(name):
+        raise IOError('Dataset ' + name + ' could not be found.')
+    path = disc.dataset_path(name)
+    extension = registered_extension(path, handlers)
+    if extension is None:
+        raise IOError('Unsupported type: ' + os.path.splitext(path)[1] + ".")
+    return handlers[extension], path
+
+def _narrow(dataset: ty.Dataset, mz_range: Tuple[float, float]=None,
+            channels=None, dtype=None) -> ty.Dataset:
+    """Select channels of already loaded dataset and convert it, as loaders
+    do."""
+    if dataset.is_sparse:
+        if channels is not None:
+            raise ValueError("Processed data has no channels to select.")
+        spectra = dataset.spectra
+        if mz_range is not None:
+            spectra = spectra.select_range(*mz_range)
+        return ty.Dataset(spectra, dataset.coordinates, None, dataset.labels,
+                          copy=False, dtype=dtype)
+    selection = _channel_selection(dataset.mz, mz_range, channels)
+    if selection is None:
+        return ty.Dataset(dataset.spectra, dataset.coordinates, dataset.mz,
+                          dataset.labels, copy=False, dtype=dtype)
+    return ty.Dataset(dataset.spectra[:, selection], dataset.coordinates,
+                      dataset.mz[selection], dataset.labels, copy=False,
+                      dtype=dtype)
+
+def load_dataset(name: Name, lazy: bool=False, cache: DatasetCache=None,
+                 sidecar: bool=False, sidecar_dir: Path=None,
+                 workers: int=None, mz_range: Tuple[float, float]=None,
+                 channels=None, dtype=None,
+                 sidecar_verify_hash: bool=False) -> ty.Dataset:
     """Generic, universal method for loading single dataset of arbitrary registered format.
 
     Args:
         name: Name of desired dataset.
+        lazy: If True, m/z-s, coordinates and labels are loaded immediately,
+        while spectra are read when accessed.
+        cache: Optional cache of datasets. Datasets are identified there by
+        the path, size and modification time of their files, and are
+        read-only.
+        sidecar: If True, binary copy of the dataset is written on first
+        load and memory-mapped on further loads, as long as the data file
+        is not modified.
+        sidecar_dir: Directory for binary copies of datasets, next to the
+        data files by default. Implies sidecar.
+        workers: Number of processes parsing single dataset in parallel.
+        mz_range: Lowest and highest m/z of loaded channels, inclusive. The
+        channels are found by binary search over sorted m/z-s.
+        channels: Indices of loaded channels, exclusive with mz_range.
+        dtype: Type of intensities, e.g. np.float32 to halve the memory
+        used. Loaders store spectra in that type as they read them. Binary
+        copies keep the type of the format and are converted after mapping.
+        sidecar_verify_hash: If True, binary copy is used only if the hash of
+        the data file did not change as well, which reads the whole file.
+        Implies sidecar.
 
     Returns:
         The dataset itself.
     
     """
-    if not disc.dataset_exists(name):
-        raise IOError('Dataset ' + name + ' could not be found.')
-    path = disc.dataset_path(name)
-    _, extension = os.path.splitext(path)
-    if extension not in loaders.keys():
-        raise IOError('Unsupported type: ' + extension + ".")
-    return loaders[extension](path)
-    
\ No newline at end of file
+    with instrument.stage('load', dataset=name) as loading:
+        dataset = _load_dataset(name, lazy, cache, sidecar, sidecar_dir,
+                                workers, mz_range, channels, dtype,
+                                sidecar_verify_hash)
+        loading.count(spectra=len(dataset.coordinates))
+    return dataset
+
+def _load_dataset(name: Name, lazy: bool, cache: DatasetCache,
+                  sidecar: bool, sidecar_dir: Path, workers: int,
+                  mz_range: Tuple[float, float], channels,
+                  dtype, sidecar_verify_hash: bool) -> ty.Dataset:
+    with instrument.stage('discover', dataset=name):
+        load, path = _find_handler(name, loaders)
+    if sidecar or sidecar_dir is not None or sidecar_verify_hash:
+        load_source = partial(load, workers=workers)
+        read = lambda source: _narrow(
+            sc.load_cached(source, load_source, sidecar_dir,
+                           sidecar_verify_hash), mz_range, channels, dtype)
+    else:
+        read = partial(load, lazy=lazy, workers=workers, mz_range=mz_range,
+                       channels=channels, dtype=dtype)
+    if cache is None:
+        return read(path)
+    entry = disc.catalog.entry(name)
+    selected = tuple(np.ravel(channels)) if channels is not None else None
+    key = entry.name, entry.path, entry.size, entry.mtime, lazy, \
+        tuple(mz_range) if mz_range is not None else None, selected, \
+        np.dtype(dtype).str if dtype is not None else None
+    dataset = cache.get(key)
+    if dataset is None:
+        dataset = cache.put(key, read(path))
+    return dataset
+
+def _load_into(name: Name, directory: Path) -> Path:
+    sc.dump(load_dataset(name), directory)
+    return directory
+
+def load_datasets(names: List[Name], workers: int=None,
+                  temp_dir: Path=None, shared_memory: bool=False) -> Tuple[
+                      Dict[Name, ty.Dataset], Dict[Name, Exception]]:
+    """Load many datasets concurrently in a pool of processes.
+
+    Datasets are not pickled back from the workers, but written to temporary
+    files and memory-mapped. Files of each dataset are removed right after
+    mapping it, so their space is freed along with the dataset. On Windows,
+    where mapped files cannot be removed, datasets are read into memory
+    instead.
+
+    Args:
+        names: Names of desired datasets.
+        workers: Number of processes, number of CPUs by default.
+        temp_dir: Directory for temporary files, the system temporary
+        directory by default.
+        shared_memory: If True and temp_dir is not given, temporary files
+        are placed in RAM-backed /dev/shm, where available. It is often
+        small, e.g. 64 MB in Docker containers by default.
+
+    Returns:
+        Datasets loaded successfully and errors of the other ones, by names.
+    """
+    # imported on use, as the process pool is slow to import
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    if temp_dir is None:
+        temp_dir = SHARED_ROOT if shared_memory else tempfile.gettempdir()
+    mmap_mode = None if os.name == 'nt' else 'r'
+    datasets, errors = {}, {}
+    root = tempfile.mkdtemp(prefix='spdata-', dir=temp_dir)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_load_into, name, os.path.join(root, str(idx))):
+                    name
+                for idx, name in enumerate(names)
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    directory = future.result()
+                    datasets[name] = sc.load(directory, mmap_mode)
+                    shutil.rmtree(directory, ignore_errors=True)
+                except Exception as ex:
+                    errors[name] = ex
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return datasets, errors
+
+def iter_dataset(name: Name, batch_size: int=DEFAULT_BATCH_SIZE) -> Iterator[
+        ty.Dataset]:
+    """Generic method for streaming single dataset of arbitrary registered
+    format in batches, keeping memory usage constant.
+
+    Args:
+        name: Name of desired dataset.
+        batch_size: Maximal number of spectra in a single batch.
+
+    Yields:
+        Consecutive parts of the dataset, with their own coordinates, labels
+        and spectra.
+    """
+    stream, path = _find_handler(name, streamers)
+    return stream(path, batch_size)
+
+def _read_txt_spectrum(file_path: Path, index: int) -> ty.Dataset:
+    txt_index = index_txt(file_path)
+    rows = np.arange(txt_index.offsets.size)[[index]]
+    spectra = _read_txt_rows(file_path, txt_index.offsets, txt_index.mz.size,
+                             None, float, rows)
+    return ty.Dataset(spectra, txt_index.coordinates.subset(rows),
+                      txt_index.mz, txt_index.labels[rows], copy=False)
+
+def _random_access(name: Name) -> Tuple[Callable, Path]:
+    load, path = _find_handler(name, loaders)
+    if compressed.is_compressed(path):
+        raise IOError('Compressed file cannot be read at random, it has to '
+                      'be decompressed first: ' + path)
+    return load, path
+
+def get_spectrum(name: Name, index: int) -> ty.Dataset:
+    """Single spectrum of dataset of arbitrary registered format.
+
+    Text files are indexed once with index_txt, so only the line of the
+    spectrum is read and parsed. Other formats are loaded lazily.
+
+    Args:
+        name: Name of desired dataset.
+        index: Index of the spectrum.
+
+    Returns:
+        Dataset with the spectrum only.
+
+    Raises:
+        IOError, if the dataset is compressed text
+    """
+    load, path = _random_access(name)
+    if registered_extension(path, loaders) == '.txt':
+        return _read_txt_spectrum(path, index)
+    return load(path, lazy=True).subset([index])
+
+def get_spectrum_at(name: Name, x: int, y: int, z: int) -> ty.Dataset:
+    """Single spectrum of dataset at given position, as in get_spectrum.
+
+    Raises:
+        KeyError, if there is no spectrum at the position
+        IOError, if the dataset is compressed text
+    """
+    load, path = _random_access(name)
+    if registered_extension(path, loaders) == '.txt':
+        coordinates = index_txt(path).coordinates
+        return _read_txt_spectrum(path, coordinates.index_of(x, y, z))
+    dataset = load(path, lazy=True)
+    return dataset.subset([dataset.coordinates.index_of(x, y, z)])
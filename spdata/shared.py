@@ -0,0 +1,233 @@
+"""Datasets shared read-only between processes of the same host
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import shutil
+import uuid
+import weakref
+
+from contextlib import contextmanager
+from typing import List
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from . import sidecar as sc
+from . import types as ty
+from .common import Name, Path, SHARED_ROOT
+
+_DATA_DIR = 'data'
+_REFS_DIR = 'refs'
+
+
+def _segment(name: Name, root: Path=None) -> Path:
+    return os.path.join(root or os.path.join(SHARED_ROOT, 'spdata'), name)
+
+
+def _lock(handle):
+    if fcntl is not None:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock(handle):
+    if fcntl is not None:
+        fcntl.flock(handle, fcntl.LOCK_UN)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _is_current(handle, path: Path) -> bool:
+    """Whether the handle is of the file currently under the path."""
+    try:
+        return os.path.samestat(os.fstat(handle.fileno()), os.stat(path))
+    except OSError:
+        return False
+
+
+@contextmanager
+def _locked(segment: Path):
+    """Hold exclusive lock of the segment, across processes of the host.
+
+    Publishing, attaching and releasing hold the lock, so no process
+    attaches to the segment while the last reference removes it. The lock
+    file is removed along with the segment, so a lock taken on a file which
+    was removed meanwhile is taken again on the current one.
+    """
+    os.makedirs(os.path.dirname(segment), exist_ok=True)
+    path = segment + '.lock'
+    while True:
+        handle = open(path, 'a+b')
+        try:
+            _lock(handle)
+        except BaseException:
+            handle.close()
+            raise
+        if _is_current(handle, path):
+            break
+        _unlock(handle)
+        handle.close()
+    try:
+        yield
+    finally:
+        _unlock(handle)
+        handle.close()
+
+
+def _remove_lock(segment: Path):
+    """Remove lock file of removed segment. The lock must be held."""
+    try:
+        os.remove(segment + '.lock')
+    except OSError:
+        pass  # open files cannot be removed on Windows
+
+
+def _release(segment: Path, reference: Path):
+    """Drop reference and remove the segment if it was the last one."""
+    removed = '%s.%s.removed' % (segment, uuid.uuid4().hex)
+    with _locked(segment):
+        try:
+            os.remove(reference)
+            # fails while any other reference exists
+            os.rmdir(os.path.join(segment, _REFS_DIR))
+            os.rename(segment, removed)
+        except OSError:
+            return
+        _remove_lock(segment)
+    shutil.rmtree(removed, ignore_errors=True)
+
+
+def _add_reference(name: Name, segment: Path) -> Path:
+    """Add reference to the segment. Lock of the segment must be held."""
+    refs = os.path.join(segment, _REFS_DIR)
+    if not os.path.isdir(os.path.join(segment, _DATA_DIR)) \
+            or not os.path.isdir(refs):
+        if not os.path.exists(segment):
+            _remove_lock(segment)
+        raise IOError('Dataset ' + name + ' is not published.')
+    reference = os.path.join(refs, '%i-%s' % (os.getpid(), uuid.uuid4().hex))
+    open(reference, 'x').close()
+    return reference
+
+
+class SharedDataset:
+    """Reference to a dataset published in shared memory
+
+    The dataset is memory-mapped read-only, so its pages are shared by all
+    processes attached to it. The segment is removed when the last
+    reference is released. References are released on garbage collection
+    as well, but should be released explicitly, e.g. with a with-statement.
+    """
+    def __init__(self, name: Name, root: Path=None, _reference: Path=None):
+        """Attach to published dataset.
+
+        Args:
+            name: Name under which the dataset was published.
+            root: Directory of shared segments, in SHARED_ROOT by default.
+
+        Raises:
+            IOError, if the dataset is not published.
+        """
+        self.name = name
+        segment = _segment(name, root)
+        reference = _reference
+        if reference is None:
+            with _locked(segment):
+                reference = _add_reference(name, segment)
+        self._finalizer = weakref.finalize(self, _release, segment, reference)
+        try:
+            self.dataset = sc.load(os.path.join(segment, _DATA_DIR))
+        except OSError:
+            self.release()
+            raise IOError('Dataset ' + name + ' is not published.')
+
+    def release(self):
+        """Drop the reference. The dataset should not be used afterwards."""
+        self._finalizer()
+
+    @property
+    def released(self) -> bool:
+        return not self._finalizer.alive
+
+    def __enter__(self) -> ty.Dataset:
+        return self.dataset
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def publish(dataset: ty.Dataset, name: Name, root: Path=None) -> SharedDataset:
+    """Publish dataset in shared memory, unless already published.
+
+    Args:
+        dataset: The dataset to share.
+        name: Name under which other processes attach to the dataset.
+        root: Directory of shared segments, in SHARED_ROOT by default.
+
+    Returns:
+        Reference to the shared dataset, held by the publisher.
+    """
+    segment = _segment(name, root)
+    with _locked(segment):
+        os.makedirs(os.path.join(segment, _REFS_DIR), exist_ok=True)
+        target = os.path.join(segment, _DATA_DIR)
+        if not os.path.isdir(target):
+            temporary = '%s.%s' % (target, uuid.uuid4().hex)
+            sc.dump(dataset, temporary)
+            os.rename(temporary, target)
+        reference = _add_reference(name, segment)
+    return SharedDataset(name, root, reference)
+
+
+def attach(name: Name, root: Path=None) -> SharedDataset:
+    """Attach to dataset published by any process of the host.
+
+    Args:
+        name: Name under which the dataset was published.
+        root: Directory of shared segments, in SHARED_ROOT by default.
+
+    Returns:
+        Reference to the shared dataset.
+
+    Raises:
+        IOError, if the dataset is not published.
+    """
+    return SharedDataset(name, root)
+
+
+def published(root: Path=None) -> List[Name]:
+    """Names of datasets currently published."""
+    root = _segment('', root)
+    if not os.path.isdir(root):
+        return []
+    return [name for name in os.listdir(root)
+            if os.path.isdir(os.path.join(root, name, _REFS_DIR))]
+
+
+def unpublish(name: Name, root: Path=None):
+    """Remove the dataset regardless of references, e.g. left by processes
+    which were killed. Attached processes keep their mappings."""
+    segment = _segment(name, root)
+    with _locked(segment):
+        shutil.rmtree(segment, ignore_errors=True)
+        _remove_lock(segment)
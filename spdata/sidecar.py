@@ -0,0 +1,217 @@
+"""Binary copies of datasets, memory-mapped instead of parsed again
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import os
+import shutil
+import warnings
+
+from functools import partial
+from hashlib import sha256
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from . import instrument
+from . import types as ty
+from .common import Path
+
+# Hidden directory next to the source, skipped by dataset discovery
+SIDECAR_DIR = '.spdata'
+_META_FILE = 'meta.json'
+_BLOCK_SIZE = 2 ** 20
+
+
+def sidecar_path(source: Path, cache_dir: Path=None) -> Path:
+    """Directory of binary copy of the source.
+
+    Args:
+        source: Path to the data file.
+        cache_dir: Directory for copies of all sources. By default, the copy
+        is placed in hidden directory next to the source.
+
+    Returns:
+        Path to the directory with the copy.
+    """
+    source = os.path.abspath(source)
+    if cache_dir is None:
+        return os.path.join(os.path.dirname(source), SIDECAR_DIR,
+                            os.path.basename(source))
+    digest = sha256(source.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, digest + '_' + os.path.basename(source))
+
+
+def source_identity(source: Path, with_hash: bool=False) -> Dict:
+    """Size, modification time and optionally hash of the source."""
+    stat = os.stat(source)
+    identity = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    if with_hash:
+        digest = sha256()
+        with open(source, 'rb') as f:
+            for block in iter(partial(f.read, _BLOCK_SIZE), b''):
+                digest.update(block)
+        identity['sha256'] = digest.hexdigest()
+    return identity
+
+
+def _arrays(dataset: ty.Dataset) -> Dict[str, np.ndarray]:
+    coordinates = dataset.coordinates
+    arrays = {'x': coordinates.x, 'y': coordinates.y, 'z': coordinates.z}
+    if dataset.labels is not None:
+        arrays['labels'] = dataset.labels
+    if dataset.is_sparse:
+        arrays['peaks_mz'] = dataset.spectra.mz
+        arrays['peaks_intensities'] = dataset.spectra.intensities
+        arrays['peaks_offsets'] = dataset.spectra.offsets
+    else:
+        arrays['spectra'] = np.asarray(dataset.spectra)
+        arrays['mz'] = dataset.mz
+    return arrays
+
+
+def dump(dataset: ty.Dataset, directory: Path, identity: Dict=None):
+    """Write dataset as set of .npy files.
+
+    Files are written to temporary directory first and moved in place at
+    the end, so readers never see partially written copy.
+
+    Args:
+        dataset: The dataset to write.
+        directory: Target directory, replaced if exists.
+        identity: Description of the source, stored along the arrays.
+    """
+    temporary = '%s.%i.tmp' % (directory, os.getpid())
+    if os.path.exists(temporary):
+        shutil.rmtree(temporary)
+    os.makedirs(temporary)
+    try:
+        arrays = _arrays(dataset)
+        for name, array in arrays.items():
+            np.save(os.path.join(temporary, name + '.npy'), array)
+        with open(os.path.join(temporary, _META_FILE), 'w') as f:
+            json.dump({'source': identity, 'arrays': sorted(arrays)}, f)
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.rename(temporary, directory)
+    except BaseException:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+
+
+def read_identity(directory: Path) -> Optional[Dict]:
+    """Description of the source stored with the copy, None if missing."""
+    try:
+        with open(os.path.join(directory, _META_FILE)) as f:
+            return json.load(f)['source']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load(directory: Path, mmap_mode: Optional[str]='r') -> ty.Dataset:
+    """Read dataset written with dump.
+
+    Args:
+        directory: Directory of the copy.
+        mmap_mode: Mode of memory-mapping the arrays, None to read them.
+
+    Returns:
+        The dataset, backed by files of the copy if memory-mapped.
+    """
+    with open(os.path.join(directory, _META_FILE)) as f:
+        names = json.load(f)['arrays']
+    arrays = {name: np.load(os.path.join(directory, name + '.npy'),
+                            mmap_mode=mmap_mode)
+              for name in names}
+    coordinates = ty.Coordinates(arrays['x'], arrays['y'], arrays['z'],
+                                 copy=False)
+    labels = arrays.get('labels')
+    if 'spectra' in arrays:
+        return ty.Dataset(arrays['spectra'], coordinates, arrays['mz'], labels,
+                          copy=False)
+    spectra = ty.SparseSpectra(arrays['peaks_mz'], arrays['peaks_intensities'],
+                               arrays['peaks_offsets'])
+    return ty.Dataset(spectra, coordinates, None, labels, copy=False)
+
+
+def dump_arrays(path: Path, arrays: Dict[str, np.ndarray], identity: Dict):
+    """Write arrays derived from the source as single .npz file.
+
+    The file is written under temporary name and moved in place at the end.
+
+    Args:
+        path: Path of the file, ending with .npz.
+        arrays: Arrays to write, by names.
+        identity: Description of the source, stored along the arrays.
+    """
+    temporary = '%s.%i.tmp.npz' % (path[:-len('.npz')], os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(temporary, identity=np.array(json.dumps(identity,
+                                                         sort_keys=True)),
+                 **arrays)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def load_arrays(path: Path, identity: Dict) -> Optional[Dict[str, np.ndarray]]:
+    """Read arrays written with dump_arrays, None if missing or written for
+    source of different identity."""
+    try:
+        with np.load(path) as stored:
+            if json.loads(str(stored['identity'])) != identity:
+                return None
+            return {name: stored[name] for name in stored.files
+                    if name != 'identity'}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_cached(source: Path, load_source: Callable[[Path], ty.Dataset],
+                cache_dir: Path=None, verify_hash: bool=False) -> ty.Dataset:
+    """Load dataset from its binary copy, creating the copy on first load.
+
+    The copy is used only if size and modification time of the source (and
+    its hash, if verified) did not change since the copy was made. If the
+    copy cannot be written, the dataset is loaded from the source anyway.
+
+    Args:
+        source: Path to the data file.
+        load_source: Function loading the dataset from the data file.
+        cache_dir: Directory for copies of all sources, next to the source by
+        default.
+        verify_hash: If True, content of the source is hashed as well.
+
+    Returns:
+        The dataset, memory-mapped if loaded from the copy.
+    """
+    directory = sidecar_path(source, cache_dir)
+    identity = source_identity(source, with_hash=verify_hash)
+    if read_identity(directory) == identity:
+        with instrument.stage('sidecar.map', path=directory):
+            return load(directory)
+    dataset = load_source(source)
+    try:
+        with instrument.stage('sidecar.write', path=directory):
+            dump(dataset, directory, identity)
+    except OSError as ex:
+        warnings.warn("Binary copy of %s could not be written: %s"
+                      % (source, ex))
+        return dataset
+    with instrument.stage('sidecar.map', path=directory):
+        return load(directory)
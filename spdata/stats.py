@@ -0,0 +1,155 @@
+"""Summary statistics of datasets, computed in a single streaming pass
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import warnings
+
+from collections import namedtuple
+from hashlib import sha256
+from typing import Dict, Iterable
+
+import numpy as np
+
+from . import discover as disc
+from . import reader as rd
+from . import sidecar as sc
+from . import types as ty
+from .common import Name, Path
+
+# Total ion current of each spectrum, followed by mean, maximum and
+# population variance of each mass channel
+Summary = namedtuple('Summary', ['tic', 'mean', 'max', 'variance', 'mz'])
+
+_SUMMARY_SUFFIX = '.summary.npz'
+
+
+class _Accumulator:
+    """Channel statistics merged batch by batch
+
+    Mean and sum of squared deviations of each batch are computed exactly
+    and merged with the running ones as in Chan et al., which stays
+    numerically stable for any number of spectra.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.squares = None
+        self.max = None
+        self.tic = []
+
+    def update(self, spectra: np.ndarray):
+        spectra = np.asarray(spectra, dtype=float)
+        count = spectra.shape[0]
+        if count == 0:
+            return
+        self.tic.append(spectra.sum(axis=1))
+        mean = spectra.mean(axis=0)
+        squares = np.square(spectra - mean).sum(axis=0)
+        if self.count == 0:
+            self.count, self.mean, self.squares = count, mean, squares
+            self.max = spectra.max(axis=0)
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * (count / total)
+        self.squares += squares + np.square(delta) * (self.count * count
+                                                      / total)
+        np.maximum(self.max, spectra.max(axis=0), out=self.max)
+        self.count = total
+
+    def summary(self, mz: np.ndarray) -> Summary:
+        if self.count == 0:
+            raise ValueError("Dataset has no spectra.")
+        return Summary(np.concatenate(self.tic), self.mean, self.max,
+                       self.squares / self.count, mz)
+
+
+def summarize_batches(batches: Iterable[ty.Dataset], mz=None) -> Summary:
+    """Summary statistics of dataset streamed in batches.
+
+    Only one batch is held in memory at once.
+
+    Args:
+        batches: Consecutive parts of the dataset, e.g. from iter_dataset.
+        mz: Common m/z axis sparse spectra are binned onto. Required for
+        processed data, ignored otherwise.
+
+    Returns:
+        Summary of the dataset.
+
+    Raises:
+        ValueError
+    """
+    accumulator = _Accumulator()
+    for batch in batches:
+        if batch.is_sparse:
+            if mz is None:
+                raise ValueError("Sparse spectra require common m/z axis.")
+            batch = batch.to_dense(mz)
+        elif mz is None:
+            mz = batch.mz
+        accumulator.update(batch.spectra)
+    return accumulator.summary(np.asarray(mz))
+
+
+def summary_path(source: Path, cache_dir: Path=None) -> Path:
+    """Path of summary cached for the source, as in sidecar.sidecar_path."""
+    return sc.sidecar_path(source, cache_dir) + _SUMMARY_SUFFIX
+
+
+def _identity(source: Path, mz) -> Dict:
+    identity = sc.source_identity(source)
+    if mz is not None:
+        identity['mz'] = sha256(np.ascontiguousarray(
+            mz, dtype=float).tobytes()).hexdigest()
+    return identity
+
+
+def summarize(name: Name, batch_size: int=rd.DEFAULT_BATCH_SIZE, mz=None,
+              cache: bool=False, cache_dir: Path=None) -> Summary:
+    """Summary statistics of dataset of arbitrary registered format.
+
+    The dataset is read once, sequentially, in batches of spectra, so
+    besides one batch only the per-spectrum TIC and per-channel statistics
+    are kept in memory.
+
+    Args:
+        name: Name of desired dataset.
+        batch_size: Maximal number of spectra read at once.
+        mz: Common m/z axis for processed data, as in summarize_batches.
+        cache: If True, the summary is stored next to the dataset and
+        reused as long as the data file is not modified.
+        cache_dir: Directory for cached summaries, as in
+        sidecar.sidecar_path. Implies cache.
+
+    Returns:
+        Summary of the dataset.
+    """
+    if not (cache or cache_dir is not None):
+        return summarize_batches(rd.iter_dataset(name, batch_size), mz)
+    if not disc.dataset_exists(name):
+        raise IOError('Dataset ' + name + ' could not be found.')
+    source = disc.dataset_path(name)
+    path, identity = summary_path(source, cache_dir), _identity(source, mz)
+    stored = sc.load_arrays(path, identity)
+    if stored is not None:
+        return Summary(**stored)
+    summary = summarize_batches(rd.iter_dataset(name, batch_size), mz)
+    try:
+        sc.dump_arrays(path, summary._asdict(), identity)
+    except OSError as ex:
+        warnings.warn("Summary could not be cached at %s: %s" % (path, ex))
+    return summary
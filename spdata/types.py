@@ -16,29 +16,120 @@ limitations under the License.
 """
 
 
+from functools import partial
+from typing import Any, Callable, Dict, Tuple
+
 import numpy as np
 
 
 class Coordinates:
-    """X, Y, Z coordinates"""
-    def __init__(self, x, y, z):
+    """X, Y, Z coordinates
+
+    Spectra lie on integer grid. Index of spectra by their position on the
+    grid is built on first lookup and kept afterwards, so coordinates should
+    not be modified in place once queried.
+    """
+    def __init__(self, x, y, z, copy: bool=True):
         """
         Args:
             x: x-coordinates for each spectrum
             y: y-coordinates for each spectrum
             z: z-coordinates for each spectrum
+            copy: if False, coordinates already being arrays are not copied
 
         Raises:
             ValueError
         """
-        self.x = np.array(x)
-        self.y = np.array(y)
-        self.z = np.array(z)
+        as_array = np.array if copy else np.asarray
+        self.x = as_array(x)
+        self.y = as_array(y)
+        self.z = as_array(z)
         self._validate()
+        self._grid = None
 
     def __len__(self):
         return self.x.size
 
+    @property
+    def origin(self) -> Tuple[int, int, int]:
+        """Smallest x, y and z coordinates"""
+        return self._index().origin
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """Shape of ion images, with Z axis dropped for single slice"""
+        return self._index().image_shape
+
+    def index_of(self, x: int, y: int, z: int) -> int:
+        """Index of spectrum at given position.
+
+        Raises:
+            KeyError, if there is no spectrum at the position
+        """
+        index = int(self.indices_of([x], [y], [z])[0])
+        if index == MISSING:
+            raise KeyError((x, y, z))
+        return index
+
+    def indices_of(self, x, y, z) -> np.ndarray:
+        """Indices of spectra at given positions.
+
+        Args:
+            x: x-coordinates of queried positions
+            y: y-coordinates of queried positions
+            z: z-coordinates of queried positions
+
+        Returns:
+            Index of spectrum at each position, MISSING if there is none.
+        """
+        return self._index().lookup(np.asarray(x), np.asarray(y),
+                                    np.asarray(z))
+
+    def in_box(self, low, high) -> np.ndarray:
+        """Indices of spectra within bounding box, ascending.
+
+        Args:
+            low: smallest x, y and z coordinates of the box
+            high: largest x, y and z coordinates of the box, inclusive
+        """
+        return self._index().in_box(low, high)
+
+    def in_mask(self, mask) -> np.ndarray:
+        """Indices of spectra within region of interest, ascending.
+
+        Args:
+            mask: boolean image of the shape of Coordinates, True in the
+            region of interest
+        """
+        return self._index().in_mask(np.asarray(mask, dtype=bool))
+
+    def to_cube(self, values, fill=np.nan) -> np.ndarray:
+        """Scatter single value of each spectrum into image.
+
+        Args:
+            values: value for each spectrum, e.g. intensities of one channel
+            fill: value of positions without spectrum
+
+        Returns:
+            Image of the shape of Coordinates, indexed by coordinates
+            relative to origin: [x, y] or [x, y, z].
+        """
+        values = np.asarray(values)
+        if values.shape != (len(self),):
+            raise ValueError("Expected single value for each of %i spectra. "
+                             "Were: %s" % (len(self), str(values.shape)))
+        return self._index().scatter(values, fill)
+
+    def subset(self, rows) -> 'Coordinates':
+        """Coordinates of selected spectra, sliced without copy."""
+        return Coordinates(self.x[rows], self.y[rows], self.z[rows],
+                           copy=False)
+
+    def _index(self) -> '_GridIndex':
+        if self._grid is None:
+            self._grid = _GridIndex(self.x, self.y, self.z)
+        return self._grid
+
     def _validate(self):
         if self.x.size != self.y.size:
             raise ValueError("Number of X and Y coordinates should be equal. "
@@ -48,26 +139,460 @@ class Coordinates:
                              "Was: %i and %i" % (self.x.size, self.z.size))
 
 
+# Index of absent spectrum, returned by lookups
+MISSING = -1
+# Grid is kept dense until it has that many cells per spectrum
+_DENSE_GRID_FILL = 8
+
+
+class _GridIndex:
+    """Index of spectra by position on the grid
+
+    Positions are flattened into keys. When the bounding box is small
+    enough, dense lookup table of spectrum indices covers it, otherwise keys
+    are sorted and searched.
+    """
+    def __init__(self, x, y, z):
+        positions = np.stack([np.asarray(x, dtype=np.int64),
+                              np.asarray(y, dtype=np.int64),
+                              np.asarray(z, dtype=np.int64)])
+        if positions.shape[1] == 0:
+            positions = np.zeros((3, 0), dtype=np.int64)
+            self.origin = (0, 0, 0)
+            self.grid_shape = (0, 0, 1)
+        else:
+            low, high = positions.min(axis=1), positions.max(axis=1)
+            self.origin = tuple(int(value) for value in low)
+            self.grid_shape = tuple(int(size) for size in high - low + 1)
+        self.image_shape = self.grid_shape[:2] \
+            if self.grid_shape[2] == 1 else self.grid_shape
+        self._relative = positions - np.array(self.origin)[:, None]
+        keys = np.ravel_multi_index(self._relative, self.grid_shape)
+        count = keys.size
+        self._table = None
+        if np.prod(self.grid_shape) <= max(_DENSE_GRID_FILL * count, 1024):
+            # reversed, so that the first of duplicates wins
+            self._table = np.full(self.grid_shape, MISSING, dtype=np.int64)
+            self._table.ravel()[keys[::-1]] = np.arange(count)[::-1]
+        else:
+            self._order = np.argsort(keys, kind='mergesort')
+            self._keys = keys[self._order]
+
+    def lookup(self, x, y, z) -> np.ndarray:
+        x, y, z = np.broadcast_arrays(x, y, z)
+        relative = [np.asarray(axis, dtype=np.int64) - start
+                    for axis, start in zip((x, y, z), self.origin)]
+        inside = np.ones(x.shape, dtype=bool)
+        for axis, size in zip(relative, self.grid_shape):
+            inside &= (axis >= 0) & (axis < size)
+        result = np.full(x.shape, MISSING, dtype=np.int64)
+        relative = [axis[inside] for axis in relative]
+        if self._table is not None:
+            result[inside] = self._table[tuple(relative)]
+            return result
+        keys = np.ravel_multi_index(relative, self.grid_shape)
+        found = np.minimum(np.searchsorted(self._keys, keys),
+                           self._keys.size - 1)
+        hit = self._keys[found] == keys
+        result[np.flatnonzero(inside)[hit]] = self._order[found[hit]]
+        return result
+
+    def in_box(self, low, high) -> np.ndarray:
+        low = np.maximum(np.asarray(low, dtype=np.int64)
+                         - self.origin, 0)
+        high = np.minimum(np.asarray(high, dtype=np.int64)
+                          - self.origin + 1, self.grid_shape)
+        if np.any(high <= low):
+            return np.empty(0, dtype=np.int64)
+        if self._table is not None:
+            block = self._table[tuple(slice(start, stop)
+                                      for start, stop in zip(low, high))]
+            return np.sort(block[block != MISSING])
+        inside = np.all((self._relative >= low[:, None])
+                        & (self._relative < high[:, None]), axis=0)
+        return np.flatnonzero(inside)
+
+    def in_mask(self, mask: np.ndarray) -> np.ndarray:
+        if mask.shape != self.image_shape:
+            raise ValueError("Mask should be of shape %s. Was: %s"
+                             % (str(self.image_shape), str(mask.shape)))
+        mask = mask.reshape(self.grid_shape)
+        if self._table is not None:
+            selected = self._table[mask]
+            return np.sort(selected[selected != MISSING])
+        return np.flatnonzero(mask[tuple(self._relative)])
+
+    def scatter(self, values: np.ndarray, fill) -> np.ndarray:
+        cube = np.full(self.grid_shape, fill,
+                       dtype=np.result_type(values, fill))
+        cube[tuple(self._relative)] = values
+        return cube.reshape(self.image_shape)
+
+
+class SparseSpectra:
+    """Spectra of processed data, with peaks of all spectra concatenated"""
+    def __init__(self, mz, intensities, offsets):
+        """
+        Args:
+            mz: m/z values of peaks of all spectra, one after another
+            intensities: intensities of peaks of all spectra, one after another
+            offsets: index of first peak of each spectrum in mz and
+            intensities, followed by total number of peaks
+
+        Raises:
+            ValueError
+        """
+        self.mz = np.asarray(mz)
+        self.intensities = np.asarray(intensities)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self._validate()
+
+    def __len__(self):
+        return self.offsets.size - 1
+
+    def __getitem__(self, idx: int):
+        """m/z values and intensities of peaks of single spectrum"""
+        start, stop = self.offsets[idx], self.offsets[idx + 1]
+        return self.mz[start:stop], self.intensities[start:stop]
+
+    @property
+    def nbytes(self) -> int:
+        return self.mz.nbytes + self.intensities.nbytes + self.offsets.nbytes
+
+    def select_range(self, low: float, high: float) -> 'SparseSpectra':
+        """Peaks with m/z between low and high, inclusive."""
+        inside = (self.mz >= low) & (self.mz <= high)
+        kept = np.zeros(self.mz.size + 1, dtype=np.int64)
+        np.cumsum(inside, out=kept[1:])
+        return SparseSpectra(self.mz[inside], self.intensities[inside],
+                             kept[self.offsets])
+
+    def take(self, rows) -> 'SparseSpectra':
+        """Peaks of selected spectra, sharing arrays if they are consecutive.
+
+        Args:
+            rows: slice or indices of spectra
+        """
+        if isinstance(rows, slice):
+            start, stop, step = rows.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                offsets = self.offsets[start:stop + 1]
+                peaks = slice(offsets[0], offsets[-1])
+                return SparseSpectra(self.mz[peaks], self.intensities[peaks],
+                                     offsets - offsets[0])
+        rows = np.arange(len(self))[rows]
+        lengths = np.diff(self.offsets)[rows]
+        offsets = np.zeros(rows.size + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        peaks = np.repeat(self.offsets[rows] - offsets[:-1], lengths) \
+            + np.arange(offsets[-1])
+        return SparseSpectra(self.mz[peaks], self.intensities[peaks], offsets)
+
+    def astype(self, dtype) -> 'SparseSpectra':
+        """Spectra with intensities of given type, sharing m/z-s."""
+        return SparseSpectra(self.mz, self.intensities.astype(dtype,
+                                                              copy=False),
+                             self.offsets)
+
+    def to_dense(self, mz, out: np.ndarray=None) -> np.ndarray:
+        """Bin peaks onto common m/z axis.
+
+        Each peak is added to the closest channel of the axis. Peaks further
+        than half of the outermost spacing beyond the axis are dropped.
+
+        Args:
+            mz: sorted values of m/z of the common axis
+            out: optional matrix of spectra by channels to bin peaks into,
+            e.g. part of larger memory-mapped array
+
+        Returns:
+            Matrix with spectra in rows and channels of the axis in columns.
+        """
+        mz = np.asarray(mz)
+        if out is None:
+            dense = np.zeros((len(self), mz.size),
+                             dtype=self.intensities.dtype)
+        elif out.shape != (len(self), mz.size):
+            raise ValueError("Output should be of shape %s. Was: %s"
+                             % (str((len(self), mz.size)), str(out.shape)))
+        else:
+            dense = out
+            dense[...] = 0
+        if mz.size == 0 or self.mz.size == 0:
+            return dense
+        channels = np.searchsorted((mz[1:] + mz[:-1]) / 2, self.mz)
+        inside = np.ones(self.mz.shape, dtype=bool)
+        if mz.size > 1:
+            inside = (self.mz >= mz[0] - (mz[1] - mz[0]) / 2) \
+                     & (self.mz <= mz[-1] + (mz[-1] - mz[-2]) / 2)
+        rows = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        np.add.at(dense, (rows[inside], channels[inside]),
+                  self.intensities[inside])
+        return dense
+
+    def _validate(self):
+        if self.mz.size != self.intensities.size:
+            raise ValueError("Number of m/z-s and intensities should be "
+                             "equal. Was: %i and %i"
+                             % (self.mz.size, self.intensities.size))
+        if self.offsets.size == 0 or self.offsets[0] != 0 \
+                or self.offsets[-1] != self.mz.size \
+                or np.any(np.diff(self.offsets) < 0):
+            raise ValueError("Offsets should grow from 0 to number of "
+                             "peaks: %i" % self.mz.size)
+
+
+class LazySpectra:
+    """Spectra read from their source only when accessed
+
+    Indexing reads only the requested spectra. Conversion to array reads all
+    of them once and keeps them for further access.
+    """
+    ndim = 2
+
+    def __init__(self, shape, dtype, read_rows: Callable[[np.ndarray],
+                                                          np.ndarray]):
+        """
+        Args:
+            shape: number of spectra and number of mass channels
+            dtype: type of intensities
+            read_rows: function reading spectra of given indices, as matrix
+            with spectra in rows
+
+        Raises:
+            ValueError
+        """
+        self.shape = tuple(int(size) for size in shape)
+        self.dtype = np.dtype(dtype)
+        self._read_rows = read_rows
+        self._data = None
+        self._read_only = False
+        if len(self.shape) != self.ndim:
+            raise ValueError("Spectra should be two-dimensional. Were: %iD"
+                             % len(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def size(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.size * self.dtype.itemsize
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._data is not None
+
+    def load(self) -> np.ndarray:
+        """Read all spectra, if not read already."""
+        if self._data is None:
+            data = self._read(np.arange(self.shape[0]))
+            if self._read_only:
+                data.setflags(write=False)
+            self._data = data
+        return self._data
+
+    def freeze(self):
+        """Make spectra read-only, once they are loaded as well."""
+        self._read_only = True
+        if self._data is not None:
+            self._data.setflags(write=False)
+
+    def astype(self, dtype) -> 'LazySpectra':
+        """Spectra converted to given type when read."""
+        read_rows = self._read_rows if self._data is None \
+            else self._data.__getitem__
+        return LazySpectra(self.shape, dtype, read_rows)
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.load()
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def __getitem__(self, key):
+        if self._data is not None:
+            return self._data[key]
+        rows, columns = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(rows, (int, np.integer)):
+            return self._read(np.arange(self.shape[0])[[rows]])[0, columns]
+        return self._read(np.arange(self.shape[0])[rows])[:, columns]
+
+    def take(self, rows) -> 'LazySpectra':
+        """Selected spectra, read from these on access."""
+        rows = np.arange(self.shape[0])[rows]
+        source = self._data if self._data is not None else self
+        return LazySpectra((rows.size, self.shape[1]), self.dtype,
+                           partial(_take_rows, source, rows))
+
+    def _read(self, rows: np.ndarray) -> np.ndarray:
+        data = np.asarray(self._read_rows(rows), dtype=self.dtype)
+        if data.shape != (rows.size, self.shape[1]):
+            raise ValueError("Read spectra of unexpected shape. Was: %s"
+                             % str(data.shape))
+        return data
+
+
+def _take_rows(spectra, selected: np.ndarray, rows: np.ndarray):
+    return spectra[selected[rows]]
+
+
+def _as_slice(rows, size: int):
+    """Equivalent slice for consecutive indices, indices otherwise."""
+    if isinstance(rows, slice):
+        return rows
+    rows = np.arange(size)[rows]
+    if rows.size == 0:
+        return slice(0, 0)
+    if rows[-1] - rows[0] + 1 == rows.size and np.all(np.diff(rows) == 1):
+        return slice(int(rows[0]), int(rows[-1]) + 1)
+    return rows
+
+
+def _intensity_type(spectra) -> np.dtype:
+    if isinstance(spectra, SparseSpectra):
+        return spectra.intensities.dtype
+    return spectra.dtype
+
+
 class Dataset:
     """Simplistic common interface for MSI data"""
     # @gmrukwa: types purposefully left blank to preserve flexibility
-    def __init__(self, spectra, coordinates: Coordinates, mz, labels=None):
+    def __init__(self, spectra, coordinates: Coordinates, mz, labels=None,
+                 copy: bool=True, dtype=None):
         """
         Args:
             spectra: measured values of spectra with spectra in rows and mass
-            channels in columns
+            channels in columns, LazySpectra read on access, or
+            SparseSpectra of processed data
             coordinates (Coordinates): coordinates for each spectrum
-            mz: values of m/z for mass channels
+            mz: values of m/z for mass channels, None for SparseSpectra
             labels: optional labels for spectra
+            copy: if False, spectra, m/z-s and labels already being arrays
+            (including memory-mapped ones) are not copied
+            dtype: type of intensities, kept as given by default. Spectra
+            of other type are converted, even if copy is False.
 
         Raises:
             ValueError
         """
-        self.spectra = np.array(spectra)
+        if isinstance(spectra, (SparseSpectra, LazySpectra)):
+            self.spectra = spectra
+            if dtype is not None and np.dtype(dtype) != _intensity_type(
+                    spectra):
+                self.spectra = spectra.astype(dtype)
+        elif copy:
+            self.spectra = np.array(spectra, dtype=dtype)
+        else:
+            self.spectra = np.asanyarray(spectra, dtype=dtype)
+        as_array = np.array if copy else np.asarray
         self.coordinates = coordinates
-        self.mz = np.array(mz)
-        self.labels = np.array(labels) if labels is not None else None
+        self.mz = as_array(mz) if mz is not None else None
+        self.labels = as_array(labels) if labels is not None else None
         self._validate()
+        self._groups = None
+
+    @property
+    def is_sparse(self) -> bool:
+        return isinstance(self.spectra, SparseSpectra)
+
+    @property
+    def is_lazy(self) -> bool:
+        return isinstance(self.spectra, LazySpectra)
+
+    def to_dense(self, mz) -> 'Dataset':
+        """Bin sparse spectra onto common m/z axis.
+
+        Args:
+            mz: sorted values of m/z of the common axis
+
+        Returns:
+            Dataset with dense spectra, sharing coordinates and labels.
+        """
+        if not self.is_sparse:
+            raise ValueError("Dataset is already dense.")
+        return Dataset(self.spectra.to_dense(mz), self.coordinates, mz,
+                       self.labels, copy=False)
+
+    def subset(self, rows) -> 'Dataset':
+        """Selected spectra with their coordinates and labels.
+
+        Nothing is copied. Consecutive spectra of an array are sliced and
+        share memory with this dataset, while spectra scattered over it are
+        indexed on access, through LazySpectra. LazySpectra and SparseSpectra
+        are subset by their take.
+
+        Args:
+            rows: slice, indices or boolean mask of spectra
+
+        Returns:
+            Dataset of selected spectra.
+        """
+        rows = _as_slice(rows, len(self.coordinates))
+        if self.is_sparse or self.is_lazy:
+            spectra = self.spectra.take(rows)
+        elif isinstance(rows, slice):
+            spectra = self.spectra[rows]
+        else:
+            spectra = LazySpectra((rows.size, self.spectra.shape[1]),
+                                  self.spectra.dtype,
+                                  partial(_take_rows, self.spectra, rows))
+        labels = self.labels[rows] if self.labels is not None else None
+        return Dataset(spectra, self.coordinates.subset(rows), self.mz,
+                       labels, copy=False)
+
+    def label_rows(self) -> Dict[Any, np.ndarray]:
+        """Ascending indices of spectra of each label.
+
+        Computed on first call and kept, so labels should not be modified in
+        place afterwards.
+
+        Raises:
+            ValueError, if the dataset is not labeled
+        """
+        if self.labels is None:
+            raise ValueError("Dataset is not labeled.")
+        if self._groups is None:
+            order = np.argsort(self.labels, kind='mergesort')
+            ordered = self.labels[order]
+            starts = np.flatnonzero(np.concatenate(
+                ([True], ordered[1:] != ordered[:-1]))) \
+                if ordered.size else np.empty(0, dtype=np.int64)
+            stops = np.append(starts[1:], ordered.size)
+            self._groups = {
+                ordered[start].item(): order[start:stop]
+                for start, stop in zip(starts, stops)
+            }
+        return self._groups
+
+    def select_label(self, label) -> 'Dataset':
+        """Spectra of single label, as in subset.
+
+        Raises:
+            KeyError, if there is no spectrum of the label
+        """
+        return self.subset(self.label_rows()[label])
+
+    def group_by_label(self) -> Dict[Any, 'Dataset']:
+        """Spectra of each label, as in subset."""
+        return {label: self.subset(rows)
+                for label, rows in self.label_rows().items()}
+
+    def to_cube(self, channel: int, fill=np.nan) -> np.ndarray:
+        """Ion image of single mass channel.
+
+        Args:
+            channel: index of the mass channel
+            fill: value of positions without spectrum
+
+        Returns:
+            Image of the shape of coordinates, as in Coordinates.to_cube.
+        """
+        if self.is_sparse:
+            raise ValueError("Sparse spectra should be binned first.")
+        return self.coordinates.to_cube(self.spectra[:, channel], fill)
 
     def _validate(self):
         if self.labels is not None and self.labels.size != len(
@@ -75,10 +600,14 @@ class Dataset:
             raise ValueError("Number of labels and coordinates should be equal."
                              " Was: %i and %i"
                              % (self.labels.size, len(self.coordinates)))
-        if self.spectra.shape[0] != len(self.coordinates):
+        if len(self.spectra) != len(self.coordinates):
             raise ValueError("Number of spectra should be equal number of "
                              "coordinates. Were: %i and %i"
-                             % (self.spectra.shape[0], len(self.coordinates)))
+                             % (len(self.spectra), len(self.coordinates)))
+        if self.is_sparse:
+            if self.mz is not None:
+                raise ValueError("Sparse spectra carry their own m/z-s.")
+            return
         if self.spectra.shape[1] != self.mz.size:
             raise ValueError("Number of features spectra should be equal "
                              "number of m/z-s registered. Were: %i and %i"
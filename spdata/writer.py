@@ -0,0 +1,64 @@
+"""Various methods for writing data
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+
+from typing import Callable
+from functools import wraps
+
+from . import types as ty
+from . import native
+from . import plugins
+from .common import Path, registered_extension
+
+# Definition of writers, imported on first use if declared by reference
+writers = plugins.Registry('spdata.writers')
+
+def writer(ext: str, priority: int=plugins.DEFAULT_PRIORITY,
+           override: bool=False):
+    def register_writer(f : Callable[..., None]):
+        writers.register(ext, f, priority, override)
+        @wraps(f)
+        def writer_wrapper(dataset: ty.Dataset, file_path: Path, **options):
+            return f(dataset, file_path, **options)
+        return writer_wrapper
+    return register_writer
+
+@writer(native.EXTENSION)
+def save_native(dataset: ty.Dataset, file_path: Path, **options):
+    """Save Dataset in native format.
+
+    Args:
+        dataset: The dataset to save.
+        file_path: Path of the created file.
+        options: chunk_shape, compression and level, as in native.write.
+    """
+    native.write(dataset, file_path, **options)
+
+def save_dataset(dataset: ty.Dataset, path: Path, **options):
+    """Generic method for saving dataset in format of registered writer,
+    chosen by extension of the path.
+
+    Args:
+        dataset: The dataset to save.
+        path: Path of the created file.
+        options: Options specific to the format.
+    """
+    extension = registered_extension(path, writers)
+    if extension is None:
+        raise IOError('Unsupported type: ' + os.path.splitext(path)[1] + ".")
+    writers[extension](dataset, path, **options)
@@ -0,0 +1,136 @@
+"""Test for aio module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import numpy.testing as npt
+
+import spdata.aio as aio
+import spdata.reader as rd
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncLoading(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = os.path.join(self.root.name, 'dataset', 'dataset_data')
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'data.txt'), 'w') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n"
+                         "1 3 3 4\n1.0 2.0\n")
+
+    def test_loads_dataset(self):
+        dataset = run(aio.load_dataset('dataset', mz_range=(1.5, 2.)))
+        npt.assert_equal(dataset.spectra, [[6.], [2.]])
+
+    def test_shares_concurrent_loads_of_the_same_dataset(self):
+        release, calls = threading.Event(), []
+        load = rd.load_dataset
+
+        def slow_load(name, **options):
+            calls.append(name)
+            release.wait(5)
+            return load(name, **options)
+
+        async def load_twice():
+            first = asyncio.ensure_future(aio.load_dataset('dataset'))
+            second = asyncio.ensure_future(aio.load_dataset('dataset'))
+            await asyncio.sleep(0)
+            release.set()
+            return await asyncio.gather(first, second)
+
+        with patch('spdata.reader.load_dataset', slow_load):
+            first, second = run(load_twice())
+        self.assertIs(first, second)
+        self.assertEqual(calls, ['dataset'])
+
+    def test_keeps_shared_load_for_other_requests_on_cancel(self):
+        release = threading.Event()
+        load = rd.load_dataset
+
+        def slow_load(name, **options):
+            release.wait(5)
+            return load(name, **options)
+
+        async def cancel_one():
+            first = asyncio.ensure_future(aio.load_dataset('dataset'))
+            second = asyncio.ensure_future(aio.load_dataset('dataset'))
+            await asyncio.sleep(0)
+            first.cancel()
+            await asyncio.sleep(0)
+            release.set()
+            return await second, first.cancelled()
+
+        with patch('spdata.reader.load_dataset', slow_load):
+            dataset, cancelled = run(cancel_one())
+        self.assertTrue(cancelled)
+        npt.assert_equal(dataset.coordinates.y, [2, 3])
+
+    def test_lists_datasets(self):
+        datasets = run(aio.get_datasets())
+        self.assertEqual([d['value'] for d in datasets], ['dataset'])
+        self.assertTrue(run(aio.dataset_exists('dataset')))
+
+    def test_streams_batches(self):
+        async def collect():
+            async with aio.iter_dataset('dataset', batch_size=1) as batches:
+                return [batch async for batch in batches]
+
+        batches = run(collect())
+        self.assertEqual(len(batches), 2)
+        npt.assert_equal(batches[1].spectra, [[1., 2.]])
+
+    def test_resumes_batch_of_cancelled_wait(self):
+        release = threading.Event()
+        iter_dataset = rd.iter_dataset
+
+        def slow_batches(name, batch_size):
+            for batch in iter_dataset(name, batch_size):
+                release.wait(5)
+                yield batch
+
+        async def cancel_first_wait():
+            batches = aio.iter_dataset('dataset', batch_size=1,
+                                       prefetch=False)
+            waiting = asyncio.ensure_future(batches.__anext__())
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            release.set()
+            collected = [batch async for batch in batches]
+            await batches.aclose()
+            return collected
+
+        with patch('spdata.reader.iter_dataset', slow_batches):
+            batches = run(cancel_first_wait())
+        npt.assert_equal([batch.coordinates.y[0] for batch in batches],
+                         [2, 3])
@@ -0,0 +1,73 @@
+"""Test for synthetic datasets of benchmarks
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.testing as npt
+
+import benchmarks.run as run
+import benchmarks.synthetic as syn
+import spdata.imzml as imz
+import spdata.reader as rd
+
+
+class TestSynthetic(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_generates_the_same_spectra_for_the_same_seed(self):
+        first = np.vstack(list(syn.spectra_blocks(300, 16, seed=3)))
+        second = np.vstack(list(syn.spectra_blocks(300, 16, seed=3)))
+        npt.assert_equal(first, second)
+        self.assertEqual(first.shape, (300, 16))
+
+    def test_writes_datasets_readable_by_loaders(self):
+        txt = os.path.join(self.directory.name, 'data.txt')
+        imzml = os.path.join(self.directory.name, 'data.imzML')
+        syn.write_txt(txt, 5, channels=16)
+        syn.write_imzml(imzml, 5, channels=16)
+        from_txt, from_imzml = rd.load_txt(txt), imz.load_imzml(imzml)
+        npt.assert_allclose(from_txt.spectra, from_imzml.spectra, rtol=1e-4)
+        npt.assert_equal(from_txt.coordinates.x, from_imzml.coordinates.x)
+
+    def test_fills_store_with_datasets(self):
+        names = syn.make_store(self.directory.name, 3)
+        self.assertEqual(sorted(os.listdir(self.directory.name)), names)
+
+
+class TestPeakRss(unittest.TestCase):
+    @unittest.skipUnless(os.path.exists('/proc/self/status'),
+                         'requires procfs')
+    def test_measures_growth_over_resident_size_at_start(self):
+        start = run._reset_peak_rss()
+        allocated = np.ones(2 ** 22)
+        growth = run._peak_rss(start)
+        self.assertGreaterEqual(growth, 0.9 * allocated.nbytes)
+        self.assertLess(growth, start + allocated.nbytes)
+
+
+class TestInFreshProcess(unittest.TestCase):
+    def test_returns_result_of_spawned_process(self):
+        self.assertNotEqual(run._in_fresh_process(os.getpid), os.getpid())
+
+    def test_raises_error_of_spawned_process(self):
+        with self.assertRaises(FileNotFoundError):
+            run._in_fresh_process(os.stat, '/nonexistent/path')
@@ -0,0 +1,108 @@
+"""Test for cache module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import spdata.reader as rd
+import spdata.types as ty
+from spdata.cache import DatasetCache
+
+
+def make_dataset(spectra_number: int) -> ty.Dataset:
+    coordinates = ty.Coordinates(*np.zeros((3, spectra_number), dtype=int))
+    return ty.Dataset(np.zeros((spectra_number, 2)), coordinates, [1., 2.])
+
+
+class TestDatasetCache(unittest.TestCase):
+    def setUp(self):
+        # each spectrum takes 16 bytes
+        self.cache = DatasetCache(max_bytes=64)
+
+    def test_counts_hits_and_misses(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', make_dataset(1))
+        self.assertIsNotNone(self.cache.get('a'))
+        info = self.cache.info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_evicts_least_recently_used_datasets(self):
+        self.cache.put('a', make_dataset(2))
+        self.cache.put('b', make_dataset(1))
+        self.cache.get('a')
+        self.cache.put('c', make_dataset(2))
+        self.assertNotIn('b', self.cache)
+        self.assertIn('a', self.cache)
+        self.assertIn('c', self.cache)
+        self.assertEqual(self.cache.info().evictions, 1)
+        self.assertEqual(self.cache.nbytes, 64)
+
+    def test_skips_datasets_exceeding_budget(self):
+        self.cache.put('a', make_dataset(1))
+        self.cache.put('b', make_dataset(5))
+        self.assertNotIn('b', self.cache)
+        self.assertIn('a', self.cache)
+
+    def test_makes_datasets_read_only(self):
+        dataset = self.cache.put('a', make_dataset(1))
+        with self.assertRaises(ValueError):
+            dataset.spectra[0, 0] = 1.
+        with self.assertRaises(ValueError):
+            dataset.coordinates.x[0] = 1
+
+    def test_makes_lazy_spectra_read_only_once_loaded(self):
+        spectra = ty.LazySpectra((2, 2), float,
+                                 lambda rows: np.ones((rows.size, 2)))
+        coordinates = ty.Coordinates([1, 2], [1, 1], [1, 1])
+        dataset = self.cache.put('a', ty.Dataset(spectra, coordinates,
+                                                 [1., 2.]))
+        with self.assertRaises(ValueError):
+            dataset.spectra.load()[0, 0] = 999.
+        self.assertEqual(self.cache.get('a').spectra[0, 0], 1.)
+
+
+class TestCachedLoad(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        data_dir = os.path.join(self.root.name, 'dataset', 'dataset_data')
+        os.makedirs(data_dir)
+        self.path = os.path.join(data_dir, 'data.txt')
+        self.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n")
+        self.cache = DatasetCache(max_bytes=1024)
+
+    def write(self, content: str):
+        with open(self.path, 'w') as handle:
+            handle.write(content)
+
+    def test_reuses_loaded_dataset(self):
+        first = rd.load_dataset('dataset', cache=self.cache)
+        second = rd.load_dataset('dataset', cache=self.cache)
+        self.assertIs(first, second)
+
+    def test_loads_modified_dataset_again(self):
+        rd.load_dataset('dataset', cache=self.cache)
+        self.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n1 2 3 4\n7.0 8.0\n")
+        dataset = rd.load_dataset('dataset', cache=self.cache)
+        self.assertEqual(dataset.spectra.shape[0], 2)
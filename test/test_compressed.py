@@ -0,0 +1,60 @@
+"""Test for compressed module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import unittest
+
+import spdata.compressed as cmp
+
+
+class TestOpenText(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.content = ''.join('line %i\n' % idx for idx in range(10000))
+
+    def write(self, extension: str) -> str:
+        path = os.path.join(self.directory.name, 'data.txt' + extension)
+        with cmp.opener(extension)(path, 'wt') as handle:
+            handle.write(self.content)
+        return path
+
+    def test_decompresses_supported_formats(self):
+        for extension in ['.gz', '.xz', '.bz2']:
+            with cmp.open_text(self.write(extension)) as handle:
+                self.assertEqual(handle.read(), self.content)
+
+    def test_stops_decompressing_on_early_close(self):
+        with cmp.open_text(self.write('.gz')) as handle:
+            self.assertEqual(handle.readline(), 'line 0\n')
+        self.assertTrue(handle.closed)
+
+    def test_raises_decompression_errors_in_reader(self):
+        path = os.path.join(self.directory.name, 'data.txt.gz')
+        with open(path, 'wb') as handle:
+            handle.write(b'not really compressed')
+        with self.assertRaises(OSError):
+            with cmp.open_text(path) as handle:
+                handle.read()
+
+    def test_opens_plain_files_directly(self):
+        path = os.path.join(self.directory.name, 'data.txt')
+        with open(path, 'w') as handle:
+            handle.write(self.content)
+        with cmp.open_text(path) as handle:
+            self.assertEqual(handle.read(), self.content)
@@ -0,0 +1,168 @@
+"""Test for concat module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import numpy.testing as npt
+
+import spdata.concat as cc
+import spdata.types as ty
+
+
+def dataset(spectra, mz, x, labels=None):
+    coordinates = ty.Coordinates(x, np.ones(len(x)), np.ones(len(x)))
+    return ty.Dataset(spectra, coordinates, mz, labels)
+
+
+class TestCommonAxis(unittest.TestCase):
+    def setUp(self):
+        self.datasets = [dataset([[1., 2.]], [100., 102.], [1]),
+                         dataset([[3., 4.]], [101., 103.5], [1])]
+
+    def test_unites_axes(self):
+        npt.assert_equal(cc.common_axis(self.datasets),
+                         [100., 101., 102., 103.5])
+
+    def test_spans_axes_with_regular_grid(self):
+        npt.assert_equal(cc.common_axis(self.datasets, step=1.),
+                         [100., 101., 102., 103., 104.])
+
+    def test_spans_peaks_of_sparse_spectra(self):
+        sparse = ty.SparseSpectra([99., 101.], [1., 2.], [0, 1, 2])
+        datasets = [self.datasets[0], dataset(sparse, None, [1, 2])]
+        npt.assert_equal(cc.common_axis(datasets, step=1.),
+                         [99., 100., 101., 102.])
+
+    def test_requires_step_for_sparse_spectra(self):
+        sparse = ty.SparseSpectra([99., 101.], [1., 2.], [0, 1, 2])
+        datasets = [self.datasets[0], dataset(sparse, None, [1, 2])]
+        with self.assertRaises(ValueError):
+            cc.common_axis(datasets)
+        with self.assertRaises(ValueError):
+            cc.concatenate(datasets)
+
+    def test_rejects_non_positive_step(self):
+        with self.assertRaises(ValueError):
+            cc.common_axis(self.datasets, step=0.)
+
+
+class TestConcatenate(unittest.TestCase):
+    def setUp(self):
+        self.first = dataset([[0., 10., 20.], [1., 2., 3.]],
+                             [100., 101., 102.], [1, 2], labels=[1, 2])
+        self.second = dataset([[4., 8.]], [100.5, 101.5], [7], labels=[3])
+
+    def test_interpolates_spectra_onto_common_axis(self):
+        mz = [99., 100., 100.5, 101.5, 102., 103.]
+        concatenation = cc.concatenate([self.first, self.second], mz=mz)
+        expected = [[0., 0., 5., 15., 20., 0.],
+                    [0., 1., 1.5, 2.5, 3., 0.],
+                    [0., 0., 4., 8., 0., 0.]]
+        npt.assert_allclose(concatenation.dataset.spectra, expected)
+        npt.assert_equal(concatenation.dataset.mz, mz)
+
+    def test_matches_interpolation_of_each_spectrum(self):
+        concatenation = cc.concatenate([self.first, self.second],
+                                       batch_size=1)
+        mz = concatenation.dataset.mz
+        rows = [(self.first, 0), (self.first, 1), (self.second, 0)]
+        for idx, (source, row) in enumerate(rows):
+            expected = np.interp(mz, source.mz, source.spectra[row],
+                                 left=0., right=0.)
+            npt.assert_allclose(concatenation.dataset.spectra[idx],
+                                expected)
+
+    def test_carries_coordinates_labels_and_sources(self):
+        concatenation = cc.concatenate([self.first, self.second],
+                                       names=['a', 'b'])
+        npt.assert_equal(concatenation.dataset.coordinates.x, [1, 2, 7])
+        npt.assert_equal(concatenation.dataset.labels, [1, 2, 3])
+        npt.assert_equal(concatenation.source, [0, 0, 1])
+        self.assertEqual(concatenation.names, ['a', 'b'])
+
+    def test_drops_labels_missing_in_some_datasets(self):
+        self.second.labels = None
+        concatenation = cc.concatenate([self.first, self.second])
+        self.assertIsNone(concatenation.dataset.labels)
+
+    def test_copies_spectra_on_the_same_axis(self):
+        concatenation = cc.concatenate([self.first, self.first],
+                                       dtype=np.float64)
+        npt.assert_equal(concatenation.dataset.spectra,
+                         np.vstack([self.first.spectra] * 2))
+
+    def test_bins_sparse_spectra(self):
+        sparse = ty.SparseSpectra([100.1, 101.9, 101.], [1., 2., 3.],
+                                  [0, 2, 3])
+        concatenation = cc.concatenate([dataset(sparse, None, [1, 2])],
+                                       mz=[100., 101., 102.])
+        npt.assert_equal(concatenation.dataset.spectra,
+                         [[1., 0., 2.], [0., 3., 0.]])
+
+    def test_reads_lazy_spectra_in_batches(self):
+        spectra = np.arange(12.).reshape(4, 3)
+        read = []
+
+        def read_rows(rows):
+            read.append(rows.size)
+            return spectra[rows]
+        lazy = ty.LazySpectra(spectra.shape, float, read_rows)
+        concatenation = cc.concatenate(
+            [dataset(lazy, [1., 2., 3.], [1, 2, 3, 4])], batch_size=3)
+        npt.assert_equal(concatenation.dataset.spectra, spectra)
+        self.assertEqual(read, [3, 1])
+
+    def test_writes_memory_mapped_output(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'spectra.npy')
+            concatenation = cc.concatenate([self.first, self.second],
+                                           out=path)
+            self.assertIsInstance(concatenation.dataset.spectra, np.memmap)
+            concatenation.dataset.spectra.flush()
+            npt.assert_equal(np.load(path), concatenation.dataset.spectra)
+            del concatenation
+
+    def test_rejects_unsorted_axis(self):
+        with self.assertRaises(ValueError):
+            cc.concatenate([self.first], mz=[2., 1.])
+
+
+class TestLoadConcatenated(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name, content in [('first', "meta\n1.0 2.0\n1 1 1 4\n5 6\n"),
+                              ('second', "meta\n1.5 2.5\n2 1 1 5\n7 9\n")]:
+            directory = os.path.join(self.root.name, name, name + '_data')
+            os.makedirs(directory)
+            with open(os.path.join(directory, 'data.txt'), 'w') as handle:
+                handle.write(content)
+
+    def test_loads_datasets_onto_regular_grid(self):
+        concatenation = cc.load_concatenated(['first', 'second'], step=0.5)
+        npt.assert_equal(concatenation.dataset.mz, [1., 1.5, 2., 2.5])
+        npt.assert_allclose(concatenation.dataset.spectra,
+                            [[5., 5.5, 6., 0.], [0., 7., 8., 9.]])
+        npt.assert_equal(concatenation.dataset.labels, [4, 5])
+        self.assertEqual(concatenation.names, ['first', 'second'])
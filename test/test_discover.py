@@ -15,6 +15,8 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 from unittest.mock import MagicMock
@@ -64,25 +66,145 @@ class TestIdToName(unittest.TestCase):
         with self.assertRaises(discover.UnknownIdError):
             discover.id_to_name(123)
 
-class TestGetDatasets(unittest.TestCase):
-    @patch('os.listdir')
-    @patch('os.path.isdir')
-    def test_returns_correct_datasets_set(self, mock_isdir, mock_listdir):
-        mock_isdir.return_value = True
-        mock_listdir.return_value = test_listdir 
-        self.assertEqual(discover.get_datasets(), test_datasets)
-
-class TestDatasetExists(unittest.TestCase):
-    @patch('os.listdir')
-    @patch('os.path.isdir')
-    def test_returns_true_for_existing_dataset(self, mock_isdir, mock_listdir):
-        mock_isdir.return_value = True
-        mock_listdir.return_value = test_listdir 
+class TestIdIndex(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.root.cleanup)
+
+    @patch('spdata.discover.get_datasets')
+    def test_reuses_index_for_unchanged_store(self, mock):
+        mock.return_value = test_datasets
+        some_id = discover.name_to_id(test_datasets[0]['value'])
+        discover.id_to_name(some_id)
+        discover.id_to_name(some_id)
+        self.assertEqual(mock.call_count, 1)
+
+    @patch('spdata.discover.get_datasets')
+    def test_rebuilds_index_when_store_changes(self, mock):
+        mock.return_value = test_datasets[:1]
+        discover.id_to_name(discover.name_to_id(test_datasets[0]['value']))
+        os.mkdir(os.path.join(self.root.name, 'dataset_number_two'))
+        mock.return_value = test_datasets[:2]
+        some_name = test_datasets[1]['value']
+        self.assertEqual(discover.id_to_name(discover.name_to_id(some_name)),
+                         some_name)
+
+    @patch('spdata.discover.get_datasets')
+    def test_rebuilds_index_on_refresh(self, mock):
+        mock.return_value = test_datasets[:1]
+        discover.id_to_name(discover.name_to_id(test_datasets[0]['value']))
+        mock.return_value = test_datasets[:2]
+        some_name = test_datasets[1]['value']
+        # store modified within resolution of modification times
+        discover.refresh()
+        self.assertEqual(discover.id_to_name(discover.name_to_id(some_name)),
+                         some_name)
+
+class TestNamesToIds(unittest.TestCase):
+    @patch('spdata.discover.get_datasets')
+    def test_gives_the_same_ids_as_single_conversion(self, mock):
+        mock.return_value = test_datasets
+        names = [d['value'] for d in test_datasets] + ['unknown name']
+        self.assertEqual(discover.names_to_ids(names),
+                         [discover.name_to_id(name) for name in names])
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name in test_listdir:
+            os.makedirs(os.path.join(self.root.name, name, name + '_data'))
+        # plain files are not datasets
+        open(os.path.join(self.root.name, 'readme.txt'), 'w').close()
+
+    def add_file(self, name: Name, file_name: str) -> Path:
+        path = os.path.join(self.root.name, name, name + '_data', file_name)
+        with open(path, 'w') as handle:
+            handle.write('content')
+        return path
+
+class TestGetDatasets(StoreTestCase):
+    def test_returns_correct_datasets_set(self):
+        key = lambda d: d['value']
+        self.assertEqual(sorted(discover.get_datasets(), key=key),
+                         sorted(test_datasets, key=key))
+
+    def test_notices_new_dataset(self):
+        discover.get_datasets()
+        os.mkdir(os.path.join(self.root.name, 'dataset_number_four'))
+        self.assertIn({"name": "dataset number four",
+                       "value": "dataset_number_four"},
+                      discover.get_datasets())
+
+class TestDatasetExists(StoreTestCase):
+    def test_returns_true_for_existing_dataset(self):
         self.assertTrue(discover.dataset_exists("dataset number one"))
+        self.assertTrue(discover.dataset_exists("dataset_number_one"))
 
-    @patch('os.listdir')
-    @patch('os.path.isdir')
-    def test_returns_false_for_nonexisting_dataset(self, mock_isdir, mock_listdir):
-        mock_isdir.return_value = True
-        mock_listdir.return_value = test_listdir 
+    def test_returns_false_for_nonexisting_dataset(self):
         self.assertFalse(discover.dataset_exists("dataset number four"))
+
+    def test_returns_false_for_removed_dataset(self):
+        discover.dataset_exists("dataset_number_three")
+        os.rmdir(os.path.join(self.root.name, 'dataset_number_three',
+                              'dataset_number_three_data'))
+        os.rmdir(os.path.join(self.root.name, 'dataset_number_three'))
+        self.assertFalse(discover.dataset_exists("dataset_number_three"))
+
+class TestDatasetPath(StoreTestCase):
+    def test_finds_data_file(self):
+        path = self.add_file('dataset_number_one', 'data.txt')
+        self.assertEqual(discover.dataset_path('dataset_number_one'), path)
+
+    def test_skips_hidden_files(self):
+        self.add_file('dataset_number_one', '.hidden.txt')
+        path = self.add_file('dataset_number_one', 'data.txt')
+        self.assertEqual(discover.dataset_path('dataset_number_one'), path)
+
+    def test_skips_binary_part_of_imzml(self):
+        self.add_file('dataset_number_one', 'data.ibd')
+        path = self.add_file('dataset_number_one', 'data.imzML')
+        self.assertEqual(discover.dataset_path('dataset_number_one'), path)
+
+    def test_notices_new_data_file(self):
+        with self.assertRaises(IOError):
+            discover.dataset_path('dataset_number_two')
+        path = self.add_file('dataset_number_two', 'data.imzML')
+        self.assertEqual(discover.dataset_path('dataset_number_two'), path)
+
+    def test_throws_for_nonexistent_dataset(self):
+        with self.assertRaises(IOError):
+            discover.dataset_path('dataset_number_four')
+
+class TestCatalogEntry(StoreTestCase):
+    def test_describes_data_file(self):
+        path = self.add_file('dataset_number_one', 'data.txt')
+        entry = discover.catalog.entry('dataset number one')
+        self.assertEqual(entry.name, 'dataset_number_one')
+        self.assertEqual(entry.format, '.txt')
+        self.assertEqual(entry.size, os.path.getsize(path))
+
+    def test_describes_format_of_compressed_data_file(self):
+        self.add_file('dataset_number_one', 'data.TXT.GZ')
+        entry = discover.catalog.entry('dataset_number_one')
+        self.assertEqual(entry.format, '.txt.gz')
+
+    def test_does_not_list_store_again_if_unchanged(self):
+        discover.get_datasets()
+        with patch('os.scandir') as mock_scandir:
+            discover.get_datasets()
+            discover.dataset_exists('dataset_number_one')
+            mock_scandir.assert_not_called()
+
+    def test_lists_store_again_on_refresh(self):
+        discover.get_datasets()
+        with patch('os.scandir') as mock_scandir:
+            mock_scandir.return_value = iter([])
+            discover.refresh()
+            mock_scandir.assert_called_once_with(self.root.name)
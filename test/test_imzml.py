@@ -0,0 +1,208 @@
+"""Test for imzml module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import numpy.testing as npt
+import pyimzml.ImzMLParser as imzparse
+from pyimzml.ImzMLWriter import ImzMLWriter
+
+import spdata.imzml as imz
+import spdata.reader as rd
+
+
+class MockParser:
+    def __init__(self, _):
+        self.mzs = [[1, 2, 3], [1, 2, 3], [1, 2, 3]]
+        self.intensities = [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+        self.coordinates = [(1, 1, 1), (2, 2, 2), (3, 3, 3)]
+        self.mzLengths = map(len, self.mzs)
+        # continuous data shares a single m/z array
+        self.mzOffsets = [0, 0, 0]
+        self.intensityLengths = [3, 3, 3]
+        # non-uniform layout of the .ibd file, which cannot be mapped
+        self.intensityOffsets = [16, 64, 100]
+        self.intensityPrecision = 'f'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+    
+    def getspectrum(self, idx):
+        return (self.mzs[idx], self.intensities[idx])
+    
+class TestLoadImzML(unittest.TestCase):
+    def setUp(self):
+        this_dir = os.path.dirname(os.path.abspath(__file__))
+        file_name = "tests.imzML"
+        self.file_path = os.path.join(this_dir, file_name)
+    
+    # Test file will be provided during integration tests.
+    # Link to the file: https://drive.google.com/drive/folders/1o02-7MJxW1ZsnC2iuHNlOy6zHpg8-q_2")
+    def test_loads_file(self):
+        mock = MockParser('')
+        with patch.object(imzparse, 'ImzMLParser', new=MockParser):
+            dataset = imz.load_imzml(self.file_path)
+
+            npt.assert_equal(dataset.mz, np.array(mock.mzs[0])) 
+            npt.assert_equal(dataset.spectra, np.array(mock.intensities))
+
+            returnedCoords = list(zip(*mock.coordinates))
+            npt.assert_equal(dataset.coordinates.x, np.array(returnedCoords[0]))
+            npt.assert_equal(dataset.coordinates.y, np.array(returnedCoords[1]))
+            npt.assert_equal(dataset.coordinates.z, np.array(returnedCoords[2]))
+
+class TestMappedImzML(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'test.imzML')
+        self.mzs = np.linspace(100., 200., 5)
+        self.intensities = np.arange(20, dtype=np.float32).reshape(4, 5)
+        with ImzMLWriter(self.file_path, mode='continuous') as writer:
+            for idx, spectrum in enumerate(self.intensities):
+                writer.addSpectrum(self.mzs, spectrum, (idx + 1, 1, 1))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_maps_continuous_spectra(self):
+        dataset = imz.load_imzml(self.file_path)
+        self.assertIsInstance(dataset.spectra, np.memmap)
+        self.assertFalse(dataset.spectra.flags.writeable)
+        npt.assert_equal(dataset.spectra, self.intensities)
+        npt.assert_equal(dataset.mz, self.mzs)
+        npt.assert_equal(dataset.coordinates.x, [1, 2, 3, 4])
+
+    def test_reads_unmapped_spectra_lazily(self):
+        with patch('spdata.imzml._map_intensities', return_value=None):
+            dataset = imz.load_imzml(self.file_path, lazy=True)
+        self.assertTrue(dataset.is_lazy)
+        npt.assert_equal(dataset.spectra[[3, 1]], self.intensities[[3, 1]])
+
+    def test_maps_only_mz_window(self):
+        dataset = imz.load_imzml(self.file_path, mz_range=(120., 160.))
+        self.assertIsInstance(dataset.spectra, np.memmap)
+        npt.assert_equal(dataset.mz, self.mzs[1:3])
+        npt.assert_equal(dataset.spectra, self.intensities[:, 1:3])
+
+    def test_converts_mapped_spectra_to_requested_type(self):
+        dataset = imz.load_imzml(self.file_path, dtype=np.float64)
+        self.assertEqual(dataset.spectra.dtype, np.float64)
+        npt.assert_equal(dataset.spectra, self.intensities)
+
+    def test_reads_only_selected_channels_lazily(self):
+        with patch('spdata.imzml._map_intensities', return_value=None):
+            dataset = imz.load_imzml(self.file_path, lazy=True,
+                                     channels=[4, 2])
+        npt.assert_equal(dataset.spectra[[1, 0]],
+                         self.intensities[[1, 0]][:, [4, 2]])
+
+    def test_reads_only_selected_channels_of_unmapped_file(self):
+        with patch('spdata.imzml._map_intensities', return_value=None), \
+                patch.object(imzparse.ImzMLParser, 'getspectrum',
+                             autospec=True,
+                             side_effect=imzparse.ImzMLParser.getspectrum) \
+                as getspectrum:
+            dataset = imz.load_imzml(self.file_path, channels=[4, 2])
+        self.assertIsInstance(dataset.spectra, np.ndarray)
+        npt.assert_equal(dataset.spectra, self.intensities[:, [4, 2]])
+        npt.assert_equal(dataset.mz, self.mzs[[4, 2]])
+        self.assertEqual(getspectrum.call_count, 1)
+
+    def test_is_loaded_by_registered_loader(self):
+        dataset = rd.loaders['.imzml'](self.file_path)
+        npt.assert_equal(dataset.spectra, self.intensities)
+
+    def test_streams_mapped_spectra(self):
+        batches = list(imz.iter_imzml(self.file_path, batch_size=3))
+        npt.assert_equal(np.vstack([b.spectra for b in batches]),
+                         self.intensities)
+
+class TestProcessedImzML(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'test.imzML')
+        self.mzs = [[100., 150.], [120.], [110., 130., 190.]]
+        self.intensities = [[1., 2.], [3.], [4., 5., 6.]]
+        with ImzMLWriter(self.file_path, mode='processed') as writer:
+            for idx, (mz, spectrum) in enumerate(zip(self.mzs,
+                                                     self.intensities)):
+                writer.addSpectrum(mz, spectrum, (idx + 1, 1, 1))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_loads_sparse_spectra(self):
+        dataset = imz.load_imzml(self.file_path)
+        self.assertTrue(dataset.is_sparse)
+        self.assertIsNone(dataset.mz)
+        for idx in range(len(self.mzs)):
+            mz, intensities = dataset.spectra[idx]
+            npt.assert_equal(mz, self.mzs[idx])
+            npt.assert_equal(intensities, self.intensities[idx])
+
+    def test_drops_peaks_outside_of_mz_window(self):
+        dataset = imz.load_imzml(self.file_path, mz_range=(105., 140.))
+        npt.assert_equal(dataset.spectra.offsets, [0, 0, 1, 3])
+        npt.assert_equal(dataset.spectra.mz, [120., 110., 130.])
+
+    def test_streams_sparse_spectra(self):
+        batches = list(imz.iter_imzml(self.file_path, batch_size=2))
+        self.assertEqual([len(b.spectra) for b in batches], [2, 1])
+        npt.assert_equal(batches[1].spectra[0][0], self.mzs[2])
+
+class TestProcessedImzMLOfEqualLengths(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'test.imzML')
+        self.mzs = [[100., 200., 300.], [150., 250., 350.]]
+        self.intensities = [[1., 2., 3.], [4., 5., 6.]]
+        with ImzMLWriter(self.file_path, mode='processed') as writer:
+            for idx, (mz, spectrum) in enumerate(zip(self.mzs,
+                                                     self.intensities)):
+                writer.addSpectrum(mz, spectrum, (idx + 1, 1, 1))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_keeps_mz_of_each_spectrum(self):
+        dataset = imz.load_imzml(self.file_path)
+        self.assertTrue(dataset.is_sparse)
+        npt.assert_equal(dataset.spectra[1][0], self.mzs[1])
+
+    def test_streams_mz_of_each_spectrum(self):
+        batch, = imz.iter_imzml(self.file_path, batch_size=2)
+        self.assertTrue(batch.is_sparse)
+        npt.assert_equal(batch.spectra[1][0], self.mzs[1])
+
+class TestIterImzML(unittest.TestCase):
+    def test_streams_file(self):
+        mock = MockParser('')
+        with patch.object(imzparse, 'ImzMLParser', new=MockParser):
+            batches = list(imz.iter_imzml('some_path.imzML', batch_size=2))
+
+        self.assertEqual([len(b.coordinates) for b in batches], [2, 1])
+        npt.assert_equal(np.vstack([b.spectra for b in batches]),
+                         np.array(mock.intensities))
+        npt.assert_equal(np.hstack([b.coordinates.y for b in batches]),
+                         np.array(mock.coordinates)[:, 1])
@@ -0,0 +1,106 @@
+"""Test for instrument module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import spdata.instrument as ins
+import spdata.reader as rd
+
+
+class TestStage(unittest.TestCase):
+    def test_reports_stage_to_listeners(self):
+        listener = MagicMock()
+        with ins.listening(listener):
+            with ins.stage('parse', path='data.txt') as parsed:
+                parsed.count(spectra=2)
+                parsed.count(spectra=3, bytes=10)
+        event, = listener.call_args[0]
+        self.assertEqual(event.stage, 'parse')
+        self.assertEqual(event.counters, {'spectra': 5, 'bytes': 10})
+        self.assertEqual(event.details, {'path': 'data.txt'})
+        self.assertGreaterEqual(event.seconds, 0.)
+
+    def test_reports_failed_stage(self):
+        timings = ins.Timings()
+        with ins.listening(timings), self.assertRaises(ValueError):
+            with ins.stage('parse'):
+                raise ValueError()
+        self.assertEqual(timings.calls['parse'], 1)
+
+    def test_ignores_counters_without_listeners(self):
+        with ins.stage('parse') as parsed:
+            parsed.count(spectra=1)
+        self.assertIs(parsed, ins._IGNORED)
+
+    def test_stops_reporting_to_removed_listener(self):
+        listener = MagicMock()
+        with ins.listening(listener):
+            pass
+        with ins.stage('parse'):
+            pass
+        listener.assert_not_called()
+
+
+class TestProgress(unittest.TestCase):
+    def test_shows_nothing_when_disabled(self):
+        with patch('tqdm.tqdm') as tqdm:
+            with ins.progress(10) as bar:
+                bar.update(5)
+        tqdm.assert_not_called()
+
+    def test_shows_progress_bar_when_enabled(self):
+        self.addCleanup(ins.enable_progress, False)
+        ins.enable_progress()
+        with patch('tqdm.tqdm') as tqdm:
+            with ins.progress(10, 'Parsing') as bar:
+                bar.update(5)
+        tqdm.return_value.update.assert_called_once_with(5)
+        tqdm.return_value.close.assert_called_once_with()
+
+    def test_imports_tqdm_only_when_enabled(self):
+        code = "import sys, spdata.reader; print('tqdm' in sys.modules)"
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(output.strip(), b'False')
+
+
+class TestLoadInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = os.path.join(self.root.name, 'dataset', 'dataset_data')
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'data.txt'), 'w') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n"
+                         "1 3 3 4\n1.0 2.0\n")
+
+    def test_times_stages_of_load(self):
+        timings = ins.Timings()
+        with ins.listening(timings):
+            rd.load_dataset('dataset')
+        for stage in ['load', 'discover', 'discover.list', 'txt.parse',
+                      'assemble']:
+            self.assertIn(stage, timings.seconds)
+        self.assertEqual(timings.counters['txt.parse']['spectra'], 2)
+        self.assertEqual(timings.counters['load']['spectra'], 2)
@@ -0,0 +1,104 @@
+"""Test for native module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import numpy.testing as npt
+
+import spdata.native as native
+import spdata.reader as rd
+import spdata.types as ty
+
+
+class TestNativeFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'data.spd')
+        self.spectra = np.arange(7 * 5, dtype=np.float32).reshape(7, 5)
+        coordinates = ty.Coordinates(np.arange(7), np.arange(7) * 2,
+                                     np.zeros(7, dtype=int))
+        self.dataset = ty.Dataset(self.spectra, coordinates,
+                                  np.linspace(100., 200., 5), np.arange(7) % 2)
+
+    def test_restores_dataset(self):
+        for compression in [None, 'zlib', 'lzma']:
+            native.write(self.dataset, self.path, chunk_shape=(3, 2),
+                         compression=compression)
+            loaded = native.NativeFile(self.path).dataset()
+            npt.assert_equal(loaded.spectra, self.spectra)
+            self.assertEqual(loaded.spectra.dtype, np.float32)
+            npt.assert_equal(loaded.mz, self.dataset.mz)
+            npt.assert_equal(loaded.labels, self.dataset.labels)
+            npt.assert_equal(loaded.coordinates.y, self.dataset.coordinates.y)
+
+    def test_reads_only_chunks_covering_selection(self):
+        native.write(self.dataset, self.path, chunk_shape=(3, 2),
+                     compression='zlib')
+        handle = native.NativeFile(self.path)
+        with patch.object(handle, '_read_chunk',
+                          wraps=handle._read_chunk) as read_chunk:
+            npt.assert_equal(handle.read([4, 0], slice(2, 4)),
+                             self.spectra[[4, 0]][:, 2:4])
+        self.assertEqual(read_chunk.call_count, 2)
+
+    def test_selects_spectra_with_metadata(self):
+        native.write(self.dataset, self.path, chunk_shape=(3, 2))
+        subset = native.NativeFile(self.path).dataset(slice(5, None), [4])
+        npt.assert_equal(subset.spectra, self.spectra[5:, [4]])
+        npt.assert_equal(subset.mz, [200.])
+        npt.assert_equal(subset.coordinates.x, [5, 6])
+
+    def test_throws_on_sparse_dataset(self):
+        spectra = ty.SparseSpectra([1.], [1.], [0, 1])
+        dataset = ty.Dataset(spectra, ty.Coordinates([1], [1], [1]), None)
+        with self.assertRaises(ValueError):
+            native.write(dataset, self.path)
+
+    def test_throws_on_foreign_file(self):
+        with open(self.path, 'wb') as handle:
+            handle.write(b'global metadata\n1.0 2.0\n')
+        with self.assertRaises(IOError):
+            native.NativeFile(self.path)
+
+    def test_is_registered_for_loading(self):
+        native.write(self.dataset, self.path, chunk_shape=(3, 2))
+        lazy = rd.load_native(self.path, lazy=True)
+        npt.assert_equal(lazy.spectra[[6, 1]], self.spectra[[6, 1]])
+        batches = list(rd.iter_native(self.path, batch_size=4))
+        npt.assert_equal(np.vstack([b.spectra for b in batches]),
+                         self.spectra)
+
+    def test_loads_mz_window(self):
+        native.write(self.dataset, self.path, chunk_shape=(3, 2))
+        for lazy in [False, True]:
+            dataset = rd.load_native(self.path, lazy=lazy,
+                                     mz_range=(120., 160.))
+            npt.assert_equal(dataset.mz, [125., 150.])
+            npt.assert_equal(np.asarray(dataset.spectra),
+                             self.spectra[:, 1:3])
+
+    def test_converts_chunks_to_requested_type(self):
+        native.write(self.dataset, self.path, chunk_shape=(3, 2))
+        for lazy in [False, True]:
+            dataset = rd.load_native(self.path, lazy=lazy, dtype=np.float64)
+            self.assertEqual(dataset.spectra.dtype, np.float64)
+            npt.assert_equal(np.asarray(dataset.spectra), self.spectra)
@@ -0,0 +1,102 @@
+"""Test for plugins module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+import spdata.plugins as pl
+
+
+def handler(*args):
+    return 'handler'
+
+
+def other_handler(*args):
+    return 'other'
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = pl.Registry()
+
+    def test_registers_handler_by_lowercase_extension(self):
+        self.registry.register('.TXT', handler)
+        self.assertIs(self.registry['.txt'], handler)
+        self.assertEqual(list(self.registry), ['.txt'])
+
+    def test_imports_declared_handler_on_first_lookup(self):
+        self.registry.declare('.txt', 'test.test_plugins:handler')
+        with patch('importlib.import_module',
+                   wraps=pl.importlib.import_module) as imported:
+            self.assertIn('.txt', self.registry)
+            self.assertEqual(imported.call_count, 0)
+            self.assertIs(self.registry['.txt'], handler)
+            self.assertIs(self.registry['.txt'], handler)
+        self.assertEqual(imported.call_count, 1)
+
+    def test_rejects_reference_without_attribute(self):
+        with self.assertRaises(ValueError):
+            self.registry.declare('.txt', 'test.test_plugins')
+
+    def test_rejects_conflicting_handler_of_the_same_priority(self):
+        self.registry.register('.txt', handler)
+        with self.assertRaises(ValueError):
+            self.registry.register('.txt', other_handler)
+
+    def test_overrides_handler_when_requested(self):
+        self.registry.register('.txt', handler)
+        self.registry.register('.txt', other_handler, override=True)
+        self.assertIs(self.registry['.txt'], other_handler)
+
+    def test_keeps_handler_of_the_highest_priority(self):
+        self.registry.register('.txt', handler, priority=5)
+        self.registry.register('.txt', other_handler)
+        self.assertIs(self.registry['.txt'], handler)
+        self.registry.register('.txt', other_handler, priority=6)
+        self.assertIs(self.registry['.txt'], other_handler)
+
+    def test_accepts_registration_of_declared_handler(self):
+        self.registry.declare('.txt', 'test.test_plugins:handler')
+        self.registry.register('.txt', handler)
+        self.assertIs(self.registry['.txt'], handler)
+
+    def test_declares_entry_points_over_builtin_formats(self):
+        points = [('.txt', 'test.test_plugins:other_handler'),
+                  ('.csv', 'test.test_plugins:handler')]
+        registry = pl.Registry('spdata.loaders')
+        registry.register('.txt', handler)
+        with patch('spdata.plugins._entry_points', return_value=points):
+            self.assertEqual(sorted(registry), ['.csv', '.txt'])
+        self.assertIs(registry['.txt'], other_handler)
+
+    def test_warns_about_conflicting_entry_points(self):
+        points = [('.csv', 'test.test_plugins:handler'),
+                  ('.csv', 'test.test_plugins:other_handler')]
+        registry = pl.Registry('spdata.loaders')
+        with patch('spdata.plugins._entry_points', return_value=points), \
+                self.assertWarns(UserWarning):
+            self.assertIs(registry['.csv'], handler)
+
+
+class TestImportCost(unittest.TestCase):
+    def test_reader_does_not_import_imzml_dependencies(self):
+        code = ("import sys, spdata.reader; "
+                "print('pyimzml' in sys.modules)")
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(output.strip(), b'False')
@@ -16,9 +16,10 @@ limitations under the License.
 """
 
 import unittest
+import gzip
 import io
 import os
-import pyimzml.ImzMLParser as imzparse
+import tempfile
 import numpy.testing as npt
 import numpy as np
 import spdata.reader as rd
@@ -51,6 +52,16 @@ class TestParseData(unittest.TestCase):
         for value in intensities:
             self.assertIsInstance(value, float)
 
+    def test_parses_block_of_lines(self):
+        npt.assert_equal(rd._parse_data_block(['1 2 3', '4 5 6'], 3),
+                         [[1., 2., 3.], [4., 5., 6.]])
+
+    def test_throws_on_lines_of_wrong_length(self):
+        with self.assertRaises(ValueError):
+            rd._parse_data_block(['1 2 3 4', '5 6'], 3)
+        with self.assertRaises(ValueError):
+            rd._parse_data_block(['1 2 3 4', '5 6'], 3, slice(0, 2))
+
 
 class TestLoadTxt(unittest.TestCase):
     def setUp(self):
@@ -93,53 +104,374 @@ class TestLoadTxt(unittest.TestCase):
         npt.assert_equal(data.coordinates.y, self.expected_ys)
         npt.assert_equal(data.coordinates.z, self.expected_zs)
 
-class MockParser:
-    def __init__(self, _):
-        self.mzs = [[1, 2, 3], [1, 2, 3], [1, 2, 3]]
-        self.intensities = [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
-        self.coordinates = [(1, 1, 1), (2, 2, 2), (3, 3, 3)]
-        self.mzLengths = map(len, self.mzs)
+    @patch('builtins.open')
+    def test_loads_all_labels(self, mock_open):
+        mock_open.return_value = self.test_file
+        data = rd.load_txt('some_path.txt')
+        npt.assert_equal(data.labels, [78, 12])
 
-    def __enter__(self):
-        return self
+    @patch('builtins.open')
+    @patch('spdata.reader._CHUNK_SPECTRA', 1)
+    def test_loads_spectra_across_chunks(self, mock_open):
+        mock_open.return_value = self.test_file
+        data = rd.load_txt('some_path.txt')
+        npt.assert_equal(data.spectra, self.expected_spectra)
+
+    @patch('builtins.open')
+    def test_throws_on_malformed_spectrum(self, mock_open):
+        mock_open.return_value = io.StringIO("""global metadata to throw out
+1.2 3.4 5.6
+12 34 56 78
+12.3 45.6
+""")
+        with self.assertRaises(ValueError):
+            rd.load_txt('some_path.txt')
+
+class TestChannelSelection(unittest.TestCase):
+    def setUp(self):
+        self.mzs = np.array([100., 200., 300., 400.])
+
+    def test_finds_channels_of_range_inclusively(self):
+        self.assertEqual(rd._channel_selection(self.mzs, (200., 350.)),
+                         slice(1, 3))
+        self.assertEqual(rd._channel_selection(self.mzs, (150., 400.)),
+                         slice(1, 4))
+
+    def test_accepts_channel_indices(self):
+        npt.assert_equal(rd._channel_selection(self.mzs, channels=[3, -4]),
+                         [3, 0])
+
+    def test_throws_on_both_selections(self):
+        with self.assertRaises(ValueError):
+            rd._channel_selection(self.mzs, (1., 2.), [0])
+
+    def test_throws_on_channels_out_of_range(self):
+        with self.assertRaises(IndexError):
+            rd._channel_selection(self.mzs, channels=[4])
+
+class TestLoadTxtChannels(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.file_path = os.path.join(self.directory.name, 'data.txt')
+        with open(self.file_path, 'w') as handle:
+            handle.write("""global metadata to throw out
+1.0 2.0 3.0 4.0
+1 2 3 4
+11.0 12.0 13.0 14.0
+5 6 7 8
+21.0 22.0 23.0 24.0
+""")
+
+    def test_loads_mz_window(self):
+        for options in [{}, {'lazy': True}, {'workers': 2}]:
+            data = rd.load_txt(self.file_path, mz_range=(1.5, 3.), **options)
+            npt.assert_equal(data.mz, [2., 3.])
+            npt.assert_equal(np.asarray(data.spectra),
+                             [[12., 13.], [22., 23.]])
+
+    def test_loads_selected_channels(self):
+        for options in [{}, {'lazy': True}, {'workers': 2}]:
+            data = rd.load_txt(self.file_path, channels=[3, 0], **options)
+            npt.assert_equal(data.mz, [4., 1.])
+            npt.assert_equal(np.asarray(data.spectra),
+                             [[14., 11.], [24., 21.]])
+
+    def test_stores_spectra_in_requested_type(self):
+        for options in [{}, {'lazy': True}, {'workers': 2}]:
+            data = rd.load_txt(self.file_path, dtype=np.float32, **options)
+            self.assertEqual(data.spectra.dtype, np.float32)
+            npt.assert_equal(np.asarray(data.spectra)[1], [21., 22., 23., 24.])
+
+    def test_loads_single_channel(self):
+        data = rd.load_txt(self.file_path, channels=[2])
+        npt.assert_equal(data.spectra, [[13.], [23.]])
+
+class TestIterTxt(unittest.TestCase):
+    def setUp(self):
+        self.test_file = io.StringIO("""global metadata to throw out
+1.2 3.4
+1 2 3 4
+1.0 2.0
+5 6 7 8
+3.0 4.0
+9 10 11 12
+5.0 6.0
+""")
+
+    @patch('builtins.open')
+    def test_yields_batches_of_requested_size(self, mock_open):
+        mock_open.return_value = self.test_file
+        batches = list(rd.iter_txt('some_path.txt', batch_size=2))
+        self.assertEqual([len(b.coordinates) for b in batches], [2, 1])
+
+    @patch('builtins.open')
+    def test_batches_preserve_order_of_spectra(self, mock_open):
+        mock_open.return_value = self.test_file
+        batches = list(rd.iter_txt('some_path.txt', batch_size=2))
+        npt.assert_equal(np.vstack([b.spectra for b in batches]),
+                         [[1., 2.], [3., 4.], [5., 6.]])
+        npt.assert_equal(np.hstack([b.labels for b in batches]), [4, 8, 12])
+        npt.assert_equal(np.hstack([b.coordinates.x for b in batches]),
+                         [1, 5, 9])
+        for batch in batches:
+            npt.assert_equal(batch.mz, [1.2, 3.4])
+
+    def test_throws_on_nonpositive_batch_size(self):
+        with self.assertRaises(ValueError):
+            rd.iter_txt('some_path.txt', batch_size=0)
+
+class TestLoadTxtLazily(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.file_path = os.path.join(self.directory.name, 'data.txt')
+        with open(self.file_path, 'w') as handle:
+            handle.write("""global metadata to throw out
+1.2 3.4
+1 2 3 4 garbage
+1.0 2.0
+5 6 7 8
+3.0 4.0
+9 10 11 12
+5.0 6.0
+""")
+
+    def test_loads_metadata_without_spectra(self):
+        data = rd.load_txt(self.file_path, lazy=True)
+        self.assertTrue(data.is_lazy)
+        self.assertFalse(data.spectra.is_loaded)
+        npt.assert_equal(data.mz, [1.2, 3.4])
+        npt.assert_equal(data.coordinates.z, [3, 7, 11])
+        npt.assert_equal(data.labels, [4, 8, 12])
+
+    def test_reads_indexed_spectra(self):
+        data = rd.load_txt(self.file_path, lazy=True)
+        npt.assert_equal(data.spectra[[2, 0]], [[5., 6.], [1., 2.]])
+        npt.assert_equal(np.asarray(data.spectra), rd.load_txt(
+            self.file_path).spectra)
+
+class TestLoadTxtInParallel(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.file_path = os.path.join(self.directory.name, 'data.txt')
+        rows = np.arange(50 * 3).reshape(50, 3) / 7.
+        with open(self.file_path, 'w') as handle:
+            handle.write("global metadata to throw out\n1.2 3.4 5.6\n")
+            for idx, row in enumerate(rows):
+                handle.write("%i %i 0 %i garbage\n" % (idx, -idx, idx % 3))
+                handle.write(" ".join(str(float(v)) for v in row) + "\n")
+
+    def test_gives_the_same_dataset_as_serial_parsing(self):
+        serial = rd.load_txt(self.file_path)
+        parallel = rd.load_txt(self.file_path, workers=3)
+        npt.assert_equal(parallel.spectra, serial.spectra)
+        npt.assert_equal(parallel.mz, serial.mz)
+        npt.assert_equal(parallel.labels, serial.labels)
+        npt.assert_equal(parallel.coordinates.x, serial.coordinates.x)
+        npt.assert_equal(parallel.coordinates.y, serial.coordinates.y)
+
+    def test_finds_beginnings_of_lines(self):
+        with open(self.file_path, 'w') as handle:
+            handle.write("ab\nc\n\ndef")
+        npt.assert_equal(rd._line_starts(self.file_path), [0, 3, 5, 6, 9])
 
-    def __exit__(self, *args):
-        pass
-    
-    def getspectrum(self, idx):
-        return (self.mzs[idx], self.intensities[idx])
-    
 class TestLoadImzML(unittest.TestCase):
     def setUp(self):
-        this_dir = os.path.dirname(os.path.abspath(__file__))
-        file_name = "tests.imzML"
-        self.file_path = os.path.join(this_dir, file_name)
-    
-    # Test file will be provided during integration tests.
-    # Link to the file: https://drive.google.com/drive/folders/1o02-7MJxW1ZsnC2iuHNlOy6zHpg8-q_2")
-    def test_loads_file(self):
-        mock = MockParser('')
-        with patch.object(imzparse, 'ImzMLParser', new=MockParser):
-            dataset = rd.load_imzml(self.file_path)
+        from pyimzml.ImzMLWriter import ImzMLWriter
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.file_path = os.path.join(self.directory.name, 'test.imzML')
+        self.mzs = np.array([100., 150., 200.])
+        self.intensities = np.arange(6, dtype=np.float32).reshape(2, 3)
+        with ImzMLWriter(self.file_path, mode='continuous') as writer:
+            for idx, spectrum in enumerate(self.intensities):
+                writer.addSpectrum(self.mzs, spectrum, (idx + 1, 1, 1))
 
-            npt.assert_equal(dataset.mz, np.array(mock.mzs[0])) 
-            npt.assert_equal(dataset.spectra, np.array(mock.intensities))
+    def test_loads_file(self):
+        dataset = rd.load_imzml(self.file_path, channels=[2])
+        npt.assert_equal(dataset.mz, self.mzs[[2]])
+        npt.assert_equal(dataset.spectra, self.intensities[:, [2]])
+        npt.assert_equal(dataset.coordinates.x, [1, 2])
 
-            returnedCoords = list(zip(*mock.coordinates))
-            npt.assert_equal(dataset.coordinates.x, np.array(returnedCoords[0]))
-            npt.assert_equal(dataset.coordinates.y, np.array(returnedCoords[1]))
-            npt.assert_equal(dataset.coordinates.z, np.array(returnedCoords[2]))
+    def test_streams_file(self):
+        batches = list(rd.iter_imzml(self.file_path, batch_size=1))
+        npt.assert_equal(np.vstack([b.spectra for b in batches]),
+                         self.intensities)
 
 class TestGenericLoad(unittest.TestCase):
     def setUp(self):
-        self.test_datasets = [
-            { "name": "dataset number one", "value": "dataset_number_one"},
-            { "name": "dataset number two", "value": "dataset_number_two"},
-            { "name": "dataset number three", "value": "dataset_number_three"}
-        ]
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name in ["dataset_number_one", "dataset_number_two",
+                     "dataset_number_three"]:
+            os.makedirs(os.path.join(self.root.name, name, name + '_data'))
 
-    @patch("spdata.discover.get_datasets")
-    def test_throws_on_nonexistent_dataset(self, mock_get):
-        mock_get.return_value = self.test_datasets
+    def test_throws_on_nonexistent_dataset(self):
         with self.assertRaises(IOError):
             rd.load_dataset("dataset number four")
+
+    def test_stream_throws_on_nonexistent_dataset(self):
+        with self.assertRaises(IOError):
+            rd.iter_dataset("dataset number four")
+
+    def test_loads_dataset_from_the_store(self):
+        path = os.path.join(self.root.name, 'dataset_number_one',
+                            'dataset_number_one_data', 'data.txt')
+        with open(path, 'w') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n")
+        dataset = rd.load_dataset("dataset_number_one")
+        npt.assert_equal(dataset.spectra, [[5., 6.]])
+
+    def test_loads_compressed_dataset(self):
+        directory = os.path.join(self.root.name, 'dataset_number_one',
+                                 'dataset_number_one_data')
+        with gzip.open(os.path.join(directory, 'data.TXT.GZ'), 'wt') as f:
+            f.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n")
+        dataset = rd.load_dataset("dataset_number_one", dtype=np.float32,
+                                  channels=[1])
+        npt.assert_equal(dataset.spectra, [[6.]])
+        self.assertEqual(dataset.spectra.dtype, np.float32)
+        batches = list(rd.iter_dataset("dataset_number_one"))
+        npt.assert_equal(batches[0].coordinates.z, [3])
+
+    def test_narrows_binary_copy_to_mz_window(self):
+        path = os.path.join(self.root.name, 'dataset_number_one',
+                            'dataset_number_one_data', 'data.txt')
+        with open(path, 'w') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n")
+        for _ in range(2):
+            dataset = rd.load_dataset("dataset_number_one", sidecar=True,
+                                      mz_range=(1.5, 2.5))
+            npt.assert_equal(dataset.spectra, [[6.]])
+            npt.assert_equal(dataset.mz, [2.])
+
+    def test_verifies_hash_of_data_file_for_binary_copy(self):
+        path = os.path.join(self.root.name, 'dataset_number_one',
+                            'dataset_number_one_data', 'data.txt')
+        with open(path, 'w') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n")
+        rd.load_dataset("dataset_number_one", sidecar_verify_hash=True)
+        stat = os.stat(path)
+        # content changed, with the same size and modification time
+        with open(path, 'w') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n7.0 8.0\n")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        dataset = rd.load_dataset("dataset_number_one",
+                                  sidecar_verify_hash=True)
+        npt.assert_equal(dataset.spectra, [[7., 8.]])
+
+    def test_loads_dataset_in_requested_type(self):
+        path = os.path.join(self.root.name, 'dataset_number_one',
+                            'dataset_number_one_data', 'data.txt')
+        with open(path, 'w') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n")
+        for sidecar in [False, True]:
+            dataset = rd.load_dataset("dataset_number_one", sidecar=sidecar,
+                                      dtype=np.float32)
+            self.assertEqual(dataset.spectra.dtype, np.float32)
+
+class TestGetSpectrum(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = os.path.join(self.root.name, 'dataset', 'dataset_data')
+        os.makedirs(directory)
+        self.path = os.path.join(directory, 'data.txt')
+        with open(self.path, 'w') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n"
+                         "7 8 9 10\n11.0 12.0\n")
+
+    def test_reads_single_spectrum(self):
+        spectrum = rd.get_spectrum('dataset', 1)
+        npt.assert_equal(spectrum.spectra, [[11., 12.]])
+        npt.assert_equal(spectrum.mz, [1., 2.])
+        npt.assert_equal(spectrum.coordinates.x, [7])
+        npt.assert_equal(spectrum.labels, [10])
+
+    def test_throws_for_compressed_text(self):
+        os.remove(self.path)
+        with gzip.open(self.path + '.gz', 'wt') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n")
+        with self.assertRaises(IOError):
+            rd.get_spectrum('dataset', 0)
+        with self.assertRaises(IOError):
+            rd.get_spectrum_at('dataset', 1, 2, 3)
+
+    def test_reads_spectrum_at_position(self):
+        spectrum = rd.get_spectrum_at('dataset', 1, 2, 3)
+        npt.assert_equal(spectrum.spectra, [[5., 6.]])
+        with self.assertRaises(KeyError):
+            rd.get_spectrum_at('dataset', 1, 1, 1)
+
+    def test_reuses_stored_index(self):
+        rd.index_txt(self.path)
+        rd._txt_indices.clear()
+        with patch('spdata.reader._index_txt') as index:
+            stored = rd.index_txt(self.path)
+        index.assert_not_called()
+        npt.assert_equal(stored.coordinates.z, [3, 9])
+
+    def test_reindexes_modified_file(self):
+        rd.index_txt(self.path)
+        with open(self.path, 'a') as handle:
+            handle.write("1 1 1 1\n0.0 0.0\n")
+        self.assertEqual(rd.index_txt(self.path).offsets.size, 3)
+
+class TestLoadDatasets(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for idx, name in enumerate(['first', 'second', 'broken']):
+            data_dir = os.path.join(self.root.name, name, name + '_data')
+            os.makedirs(data_dir)
+            with open(os.path.join(data_dir, 'data.txt'), 'w') as handle:
+                handle.write("metadata\n1.0 2.0\n1 2 3 4\n")
+                handle.write("%i.0 6.0\n" % idx if name != 'broken' else "x\n")
+
+    def test_loads_all_datasets(self):
+        temp_dir = os.path.join(self.root.name, 'temp')
+        os.mkdir(temp_dir)
+        datasets, _ = rd.load_datasets(['first', 'second'], workers=2,
+                                       temp_dir=temp_dir)
+        npt.assert_equal(datasets['first'].spectra, [[0., 6.]])
+        npt.assert_equal(datasets['second'].spectra, [[1., 6.]])
+        self.assertEqual(os.listdir(temp_dir), [])
+
+    def test_removes_files_of_each_dataset_right_after_mapping(self):
+        temp_dir = os.path.join(self.root.name, 'temp')
+        os.mkdir(temp_dir)
+        load = rd.sc.load
+        loaded, left = [], []
+
+        def load_and_check(directory, mmap_mode):
+            left.extend(path for path in loaded if os.path.exists(path))
+            loaded.append(directory)
+            return load(directory, mmap_mode)
+        with patch('spdata.sidecar.load', load_and_check):
+            rd.load_datasets(['first', 'second'], workers=1,
+                             temp_dir=temp_dir)
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(left, [])
+
+    def test_places_temporary_files_in_system_directory(self):
+        with patch('tempfile.mkdtemp', wraps=tempfile.mkdtemp) as mkdtemp:
+            rd.load_datasets(['first'], workers=1)
+        self.assertEqual(mkdtemp.call_args[1]['dir'], tempfile.gettempdir())
+
+    def test_reports_failures_without_aborting(self):
+        datasets, errors = rd.load_datasets(['first', 'broken', 'missing'],
+                                            workers=2)
+        self.assertEqual(set(datasets), {'first'})
+        self.assertIsInstance(errors['broken'], ValueError)
+        self.assertIsInstance(errors['missing'], IOError)
@@ -0,0 +1,136 @@
+"""Test for shared module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import numpy.testing as npt
+
+import spdata.shared as sh
+import spdata.types as ty
+
+
+def sum_in_other_process(name: str, root: str) -> float:
+    with sh.attach(name, root) as dataset:
+        return float(np.sum(dataset.spectra))
+
+
+class TestSharedDataset(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        coordinates = ty.Coordinates([1, 2], [3, 4], [5, 6])
+        self.dataset = ty.Dataset([[1., 2.], [3., 4.]], coordinates,
+                                  [10., 20.], [7, 8])
+
+    def test_attaches_to_published_dataset(self):
+        publisher = sh.publish(self.dataset, 'dataset', self.root.name)
+        with sh.attach('dataset', self.root.name) as dataset:
+            npt.assert_equal(dataset.spectra, self.dataset.spectra)
+            npt.assert_equal(dataset.labels, self.dataset.labels)
+            self.assertFalse(dataset.spectra.flags.writeable)
+        publisher.release()
+
+    def test_shares_dataset_with_other_processes(self):
+        with sh.publish(self.dataset, 'dataset', self.root.name):
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                total = pool.submit(sum_in_other_process, 'dataset',
+                                    self.root.name).result()
+        self.assertEqual(total, 10.)
+
+    def test_removes_dataset_after_last_release(self):
+        publisher = sh.publish(self.dataset, 'dataset', self.root.name)
+        reader = sh.attach('dataset', self.root.name)
+        publisher.release()
+        self.assertEqual(sh.published(self.root.name), ['dataset'])
+        reader.release()
+        self.assertEqual(sh.published(self.root.name), [])
+        with self.assertRaises(IOError):
+            sh.attach('dataset', self.root.name)
+
+    def test_keeps_first_published_dataset(self):
+        first = sh.publish(self.dataset, 'dataset', self.root.name)
+        other = ty.Dataset([[0., 0.], [0., 0.]], self.dataset.coordinates,
+                           [10., 20.])
+        with sh.publish(other, 'dataset', self.root.name) as dataset:
+            npt.assert_equal(dataset.spectra, self.dataset.spectra)
+        first.release()
+
+    def test_throws_for_unpublished_dataset(self):
+        with self.assertRaises(IOError):
+            sh.attach('dataset', self.root.name)
+
+    def test_republishes_after_last_release(self):
+        sh.publish(self.dataset, 'dataset', self.root.name).release()
+        with sh.publish(self.dataset, 'dataset', self.root.name) as dataset:
+            self.assertEqual(sh.published(self.root.name), ['dataset'])
+            npt.assert_equal(dataset.spectra, self.dataset.spectra)
+
+    def test_removes_segment_only_while_nobody_attaches(self):
+        publisher = sh.publish(self.dataset, 'dataset', self.root.name)
+        segment = sh._segment('dataset', self.root.name)
+        with sh._locked(segment):
+            releasing = threading.Thread(target=publisher.release)
+            releasing.start()
+            releasing.join(0.2)
+            self.assertTrue(releasing.is_alive())
+            reader = sh.SharedDataset('dataset', self.root.name,
+                                      sh._add_reference('dataset', segment))
+        releasing.join()
+        self.assertFalse(reader.released)
+        self.assertEqual(sh.published(self.root.name), ['dataset'])
+        reader.release()
+        self.assertEqual(sh.published(self.root.name), [])
+
+    def test_unpublishes_regardless_of_references(self):
+        sh.publish(self.dataset, 'dataset', self.root.name)
+        sh.unpublish('dataset', self.root.name)
+        self.assertEqual(sh.published(self.root.name), [])
+
+    def test_removes_lock_along_with_segment(self):
+        publisher = sh.publish(self.dataset, 'dataset', self.root.name)
+        sh.attach('dataset', self.root.name).release()
+        publisher.release()
+        sh.publish(self.dataset, 'other', self.root.name)
+        sh.unpublish('other', self.root.name)
+        with self.assertRaises(IOError):
+            sh.attach('missing', self.root.name)
+        self.assertEqual(os.listdir(self.root.name), [])
+
+    def test_locks_again_file_removed_while_waiting(self):
+        segment = sh._segment('dataset', self.root.name)
+        entered = threading.Event()
+
+        def lock():
+            with sh._locked(segment):
+                entered.set()
+        removed = sh._locked(segment)
+        removed.__enter__()
+        locking = threading.Thread(target=lock)
+        locking.start()
+        locking.join(0.2)
+        sh._remove_lock(segment)
+        with sh._locked(segment):
+            removed.__exit__(None, None, None)
+            locking.join(0.2)
+            self.assertFalse(entered.is_set())
+        locking.join()
+        self.assertTrue(entered.is_set())
@@ -0,0 +1,122 @@
+"""Test for sidecar module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import numpy.testing as npt
+
+import spdata.discover as disc
+import spdata.reader as rd
+import spdata.sidecar as sc
+import spdata.types as ty
+
+
+class TestDumpAndLoad(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.target = os.path.join(self.directory.name, 'copy')
+        self.coordinates = ty.Coordinates([1, 2], [3, 4], [5, 6])
+
+    def test_restores_dense_dataset_memory_mapped(self):
+        dataset = ty.Dataset([[1., 2.], [3., 4.]], self.coordinates,
+                             [10., 20.], [7, 8])
+        sc.dump(dataset, self.target)
+        loaded = sc.load(self.target)
+        self.assertIsInstance(loaded.spectra, np.memmap)
+        npt.assert_equal(loaded.spectra, dataset.spectra)
+        npt.assert_equal(loaded.mz, dataset.mz)
+        npt.assert_equal(loaded.labels, dataset.labels)
+        npt.assert_equal(loaded.coordinates.y, [3, 4])
+
+    def test_restores_sparse_dataset(self):
+        spectra = ty.SparseSpectra([1., 2., 3.], [4., 5., 6.], [0, 1, 3])
+        sc.dump(ty.Dataset(spectra, self.coordinates, None), self.target)
+        loaded = sc.load(self.target)
+        self.assertTrue(loaded.is_sparse)
+        npt.assert_equal(loaded.spectra[1][1], [5., 6.])
+
+    def test_keeps_identity_of_source(self):
+        dataset = ty.Dataset([[1.], [2.]], self.coordinates, [1.])
+        sc.dump(dataset, self.target, {'size': 3})
+        self.assertEqual(sc.read_identity(self.target), {'size': 3})
+
+
+class TestLoadCached(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.source = os.path.join(self.directory.name, 'data.txt')
+        self.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n")
+
+    def write(self, content: str):
+        with open(self.source, 'w') as handle:
+            handle.write(content)
+
+    def test_parses_source_only_once(self):
+        load_source = MagicMock(side_effect=rd.load_txt)
+        sc.load_cached(self.source, load_source)
+        dataset = sc.load_cached(self.source, load_source)
+        self.assertEqual(load_source.call_count, 1)
+        npt.assert_equal(dataset.spectra, [[5., 6.]])
+
+    def test_places_copy_next_to_source(self):
+        sc.load_cached(self.source, rd.load_txt)
+        self.assertTrue(os.path.isdir(os.path.join(
+            self.directory.name, sc.SIDECAR_DIR, 'data.txt')))
+
+    def test_places_copy_in_cache_directory(self):
+        cache_dir = os.path.join(self.directory.name, 'cache')
+        sc.load_cached(self.source, rd.load_txt, cache_dir=cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    def test_parses_modified_source_again(self):
+        sc.load_cached(self.source, rd.load_txt)
+        self.write("metadata\n1.0 2.0\n1 2 3 4\n7.0 8.0\n")
+        os.utime(self.source, ns=(0, 0))
+        dataset = sc.load_cached(self.source, rd.load_txt, verify_hash=True)
+        npt.assert_equal(dataset.spectra, [[7., 8.]])
+
+    def test_falls_back_to_source_when_copy_cannot_be_written(self):
+        with patch('spdata.sidecar.dump', side_effect=PermissionError):
+            with self.assertWarns(UserWarning):
+                dataset = sc.load_cached(self.source, rd.load_txt)
+        npt.assert_equal(dataset.spectra, [[5., 6.]])
+
+
+class TestLoadDatasetWithSidecar(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        data_dir = os.path.join(self.root.name, 'dataset', 'dataset_data')
+        os.makedirs(data_dir)
+        self.path = os.path.join(data_dir, 'data.txt')
+        with open(self.path, 'w') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n")
+
+    def test_discovery_ignores_copy(self):
+        rd.load_dataset('dataset', sidecar=True)
+        self.assertEqual(disc.dataset_path('dataset'), self.path)
+        dataset = rd.load_dataset('dataset', sidecar=True)
+        self.assertIsInstance(dataset.spectra, np.memmap)
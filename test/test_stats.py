@@ -0,0 +1,89 @@
+"""Test for stats module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import numpy.testing as npt
+
+import spdata.stats as st
+import spdata.types as ty
+
+
+def batches_of(spectra: np.ndarray, batch_size: int):
+    for start in range(0, spectra.shape[0], batch_size):
+        batch = spectra[start:start + batch_size]
+        coordinates = ty.Coordinates(*np.zeros((3, batch.shape[0])))
+        yield ty.Dataset(batch, coordinates, np.arange(spectra.shape[1]))
+
+
+class TestSummarizeBatches(unittest.TestCase):
+    def setUp(self):
+        self.spectra = np.random.RandomState(0).rand(11, 4) * 100 + 1e6
+
+    def test_matches_statistics_of_whole_matrix(self):
+        summary = st.summarize_batches(batches_of(self.spectra, 3))
+        npt.assert_allclose(summary.tic, self.spectra.sum(axis=1))
+        npt.assert_allclose(summary.mean, self.spectra.mean(axis=0))
+        npt.assert_equal(summary.max, self.spectra.max(axis=0))
+        npt.assert_allclose(summary.variance, self.spectra.var(axis=0))
+        npt.assert_equal(summary.mz, np.arange(4))
+
+    def test_bins_sparse_spectra_onto_axis(self):
+        spectra = ty.SparseSpectra([1., 2., 2.], [1., 2., 4.], [0, 2, 3])
+        dataset = ty.Dataset(spectra, ty.Coordinates([1, 2], [1, 2], [1, 2]),
+                             None)
+        summary = st.summarize_batches([dataset], mz=[1., 2.])
+        npt.assert_equal(summary.tic, [3., 4.])
+        npt.assert_equal(summary.mean, [.5, 3.])
+        with self.assertRaises(ValueError):
+            st.summarize_batches([dataset])
+
+    def test_throws_on_empty_dataset(self):
+        with self.assertRaises(ValueError):
+            st.summarize_batches([])
+
+
+class TestSummarize(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        patcher = patch('spdata.discover.DATA_ROOT', self.root.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = os.path.join(self.root.name, 'dataset', 'dataset_data')
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'data.txt'), 'w') as handle:
+            handle.write("metadata\n1.0 2.0\n1 2 3 4\n5.0 6.0\n"
+                         "1 3 3 4\n1.0 2.0\n")
+
+    def test_streams_dataset_from_the_store(self):
+        summary = st.summarize('dataset', batch_size=1)
+        npt.assert_equal(summary.tic, [11., 3.])
+        npt.assert_equal(summary.max, [5., 6.])
+        npt.assert_equal(summary.variance, [4., 4.])
+
+    def test_reuses_cached_summary(self):
+        first = st.summarize('dataset', cache=True)
+        with patch('spdata.stats.summarize_batches') as summarize_batches:
+            second = st.summarize('dataset', cache=True)
+        summarize_batches.assert_not_called()
+        npt.assert_equal(second.mean, first.mean)
+        npt.assert_equal(second.tic, first.tic)
@@ -17,6 +17,9 @@ limitations under the License.
 
 import unittest
 
+import numpy as np
+import numpy.testing as npt
+
 import spdata.types as ty
 
 
@@ -30,6 +33,130 @@ class TestCoordinates(unittest.TestCase):
             ty.Coordinates(x=[1], y=[2, 3], z=[4, 5])
 
 
+class TestCoordinatesIndex(unittest.TestCase):
+    def setUp(self):
+        self.coordinates = ty.Coordinates(x=[1, 2, 3, 1, 3], y=[5, 5, 5, 6, 6],
+                                          z=[0, 0, 0, 0, 0])
+        # scattered far apart, indexed by sorted keys instead of dense grid
+        self.scattered = ty.Coordinates(x=[0, 100000, 5], y=[0, 100000, 7],
+                                        z=[0, 0, 0])
+
+    def test_finds_spectrum_at_position(self):
+        self.assertEqual(self.coordinates.index_of(1, 6, 0), 3)
+        self.assertEqual(self.scattered.index_of(100000, 100000, 0), 1)
+
+    def test_throws_on_empty_position(self):
+        for coordinates in [self.coordinates, self.scattered]:
+            with self.assertRaises(KeyError):
+                coordinates.index_of(2, 6, 0)
+
+    def test_finds_many_positions_at_once(self):
+        npt.assert_equal(self.coordinates.indices_of([3, 2, 9], [6, 6, 5], 0),
+                         [4, ty.MISSING, ty.MISSING])
+        npt.assert_equal(self.scattered.indices_of([5, 1, 0], [7, 1, 0], 0),
+                         [2, ty.MISSING, 0])
+
+    def test_finds_spectra_in_bounding_box(self):
+        npt.assert_equal(self.coordinates.in_box((2, 5, 0), (5, 9, 0)),
+                         [1, 2, 4])
+        npt.assert_equal(self.scattered.in_box((0, 0, 0), (10, 10, 0)),
+                         [0, 2])
+        self.assertEqual(self.coordinates.in_box((7, 7, 7), (9, 9, 9)).size,
+                         0)
+
+    def test_finds_spectra_in_mask(self):
+        mask = np.zeros(self.coordinates.shape, dtype=bool)
+        mask[:, 1] = True
+        npt.assert_equal(self.coordinates.in_mask(mask), [3, 4])
+        with self.assertRaises(ValueError):
+            self.coordinates.in_mask(mask.T)
+
+    def test_scatters_values_into_image(self):
+        self.assertEqual(self.coordinates.origin, (1, 5, 0))
+        npt.assert_equal(self.coordinates.to_cube([1., 2., 3., 4., 5.]),
+                         [[1., 4.], [2., np.nan], [3., 5.]])
+
+    def test_keeps_z_axis_of_volumes(self):
+        volume = ty.Coordinates(x=[0, 0], y=[0, 1], z=[0, 1])
+        self.assertEqual(volume.to_cube([1, 2], fill=0).shape, (1, 2, 2))
+
+
+class TestSparseSpectra(unittest.TestCase):
+    def setUp(self):
+        self.spectra = ty.SparseSpectra(mz=[1.0, 2.1, 2.9, 1.1],
+                                        intensities=[1., 2., 3., 4.],
+                                        offsets=[0, 3, 4])
+
+    def test_throws_on_mismatching_peaks(self):
+        with self.assertRaises(ValueError):
+            ty.SparseSpectra(mz=[1., 2.], intensities=[1.], offsets=[0, 1])
+
+    def test_throws_on_offsets_not_covering_peaks(self):
+        with self.assertRaises(ValueError):
+            ty.SparseSpectra(mz=[1., 2.], intensities=[1., 2.], offsets=[0, 1])
+
+    def test_gives_peaks_of_single_spectrum(self):
+        mz, intensities = self.spectra[1]
+        npt.assert_equal(mz, [1.1])
+        npt.assert_equal(intensities, [4.])
+
+    def test_selects_peaks_in_mz_range(self):
+        selected = self.spectra.select_range(2., 3.)
+        npt.assert_equal(selected.mz, [2.1, 2.9])
+        npt.assert_equal(selected.offsets, [0, 2, 2])
+
+    def test_takes_selected_spectra(self):
+        npt.assert_equal(self.spectra.take([1, 0]).mz, [1.1, 1.0, 2.1, 2.9])
+        npt.assert_equal(self.spectra.take([1, 0]).offsets, [0, 1, 4])
+        shared = self.spectra.take(slice(1, 2))
+        self.assertTrue(np.shares_memory(shared.mz, self.spectra.mz))
+        npt.assert_equal(shared.offsets, [0, 1])
+
+    def test_bins_peaks_to_closest_channels(self):
+        npt.assert_equal(self.spectra.to_dense([1., 2., 3.]),
+                         [[1., 2., 3.], [4., 0., 0.]])
+
+    def test_accumulates_peaks_of_the_same_channel(self):
+        npt.assert_equal(self.spectra.to_dense([1., 3.]),
+                         [[1., 5.], [4., 0.]])
+
+    def test_drops_peaks_outside_of_axis(self):
+        npt.assert_equal(self.spectra.to_dense([1., 1.5]),
+                         [[1., 0.], [4., 0.]])
+
+    def test_bins_peaks_into_given_output(self):
+        out = np.full((3, 2), -1.)
+        dense = self.spectra.to_dense([1., 3.], out[1:])
+        self.assertTrue(np.shares_memory(dense, out))
+        npt.assert_equal(out, [[-1., -1.], [1., 5.], [4., 0.]])
+
+
+class TestLazySpectra(unittest.TestCase):
+    def setUp(self):
+        self.data = np.arange(12.).reshape(4, 3)
+        self.requested = []
+        def read_rows(rows):
+            self.requested.append(list(rows))
+            return self.data[rows]
+        self.spectra = ty.LazySpectra((4, 3), float, read_rows)
+
+    def test_reads_only_indexed_spectra(self):
+        npt.assert_equal(self.spectra[1], self.data[1])
+        npt.assert_equal(self.spectra[2:, 1], self.data[2:, 1])
+        self.assertEqual(self.requested, [[1], [2, 3]])
+        self.assertFalse(self.spectra.is_loaded)
+
+    def test_reads_everything_once_when_converted(self):
+        npt.assert_equal(np.asarray(self.spectra), self.data)
+        npt.assert_equal(self.spectra[[3, 0]], self.data[[3, 0]])
+        self.assertEqual(self.requested, [[0, 1, 2, 3]])
+
+    def test_throws_on_spectra_of_wrong_shape(self):
+        spectra = ty.LazySpectra((4, 2), float, lambda rows: self.data[rows])
+        with self.assertRaises(ValueError):
+            spectra[0]
+
+
 class TestDataset(unittest.TestCase):
     def setUp(self):
         self.coordinates = ty.Coordinates(x=[1, 2], y=[3, 4], z=[5, 6])
@@ -50,3 +177,102 @@ class TestDataset(unittest.TestCase):
         with self.assertRaises(ValueError):
             ty.Dataset(spectra=[[1, 2], [3, 4]], coordinates=self.coordinates,
                        mz=[1.1, 2.2], labels=[9])
+
+    def test_carries_sparse_spectra(self):
+        spectra = ty.SparseSpectra(mz=[1., 2., 1.], intensities=[1., 2., 3.],
+                                   offsets=[0, 2, 3])
+        dataset = ty.Dataset(spectra, self.coordinates, None)
+        self.assertTrue(dataset.is_sparse)
+        dense = dataset.to_dense([1., 2.])
+        npt.assert_equal(dense.spectra, [[1., 2.], [3., 0.]])
+        npt.assert_equal(dense.mz, [1., 2.])
+
+    def test_throws_on_sparse_spectra_count_mismatch(self):
+        spectra = ty.SparseSpectra(mz=[1.], intensities=[1.], offsets=[0, 1])
+        with self.assertRaises(ValueError):
+            ty.Dataset(spectra, self.coordinates, None)
+
+    def test_gives_ion_image_of_channel(self):
+        coordinates = ty.Coordinates([0, 1], [0, 0], [0, 0])
+        dataset = ty.Dataset([[1., 2.], [3., 4.]], coordinates, [10., 20.])
+        npt.assert_equal(dataset.to_cube(1), [[2.], [4.]])
+
+    def test_keeps_arrays_without_copy(self):
+        spectra, mz = np.ones((2, 2), dtype=np.float32), np.array([1., 2.])
+        coordinates = ty.Coordinates(*np.zeros((3, 2), dtype=int), copy=False)
+        dataset = ty.Dataset(spectra, coordinates, mz, copy=False)
+        self.assertIs(dataset.spectra, spectra)
+        self.assertIs(dataset.mz, mz)
+
+    def test_converts_spectra_to_dtype(self):
+        coordinates = ty.Coordinates([1, 2], [1, 2], [1, 2])
+        dense = ty.Dataset([[1., 2.], [3., 4.]], coordinates, [1., 2.],
+                           copy=False, dtype=np.float32)
+        self.assertEqual(dense.spectra.dtype, np.float32)
+        sparse = ty.Dataset(ty.SparseSpectra([1.], [2.], [0, 1, 1]),
+                            coordinates, None, dtype=np.float32)
+        self.assertEqual(sparse.spectra.intensities.dtype, np.float32)
+        read_rows = lambda rows: np.ones((rows.size, 1))
+        lazy = ty.Dataset(ty.LazySpectra((2, 1), float, read_rows),
+                          coordinates, [1.], dtype=np.float32)
+        self.assertEqual(lazy.spectra[[0]].dtype, np.float32)
+
+    def test_validates_lazy_spectra_by_shape(self):
+        spectra = ty.LazySpectra((2, 3), float, lambda rows: None)
+        with self.assertRaises(ValueError):
+            ty.Dataset(spectra, self.coordinates, mz=[1.1, 2.2])
+
+
+class TestDatasetSubsets(unittest.TestCase):
+    def setUp(self):
+        self.spectra = np.arange(10.).reshape(5, 2)
+        coordinates = ty.Coordinates(np.arange(5), np.zeros(5, dtype=int),
+                                     np.zeros(5, dtype=int))
+        self.dataset = ty.Dataset(self.spectra, coordinates, [1., 2.],
+                                  [2, 1, 1, 2, 3], copy=False)
+
+    def test_slices_consecutive_spectra(self):
+        subset = self.dataset.subset([1, 2])
+        self.assertTrue(np.shares_memory(subset.spectra, self.spectra))
+        npt.assert_equal(subset.spectra, self.spectra[1:3])
+        npt.assert_equal(subset.coordinates.x, [1, 2])
+        npt.assert_equal(subset.labels, [1, 1])
+
+    def test_indexes_scattered_spectra_on_access(self):
+        subset = self.dataset.subset([4, 0, 3])
+        self.assertTrue(subset.is_lazy)
+        self.assertFalse(subset.spectra.is_loaded)
+        self.spectra[3] = -1.
+        npt.assert_equal(subset.spectra[[2, 0]], self.spectra[[3, 4]])
+        npt.assert_equal(subset.coordinates.x, [4, 0, 3])
+        npt.assert_equal(subset.labels, [3, 2, 2])
+
+    def test_selects_spectra_of_label(self):
+        selected = self.dataset.select_label(2)
+        npt.assert_equal(np.asarray(selected.spectra), self.spectra[[0, 3]])
+        with self.assertRaises(KeyError):
+            self.dataset.select_label(7)
+
+    def test_groups_spectra_by_label(self):
+        groups = self.dataset.group_by_label()
+        self.assertEqual(list(groups), [1, 2, 3])
+        npt.assert_equal(groups[1].coordinates.x, [1, 2])
+        npt.assert_equal(groups[3].spectra, self.spectra[4:])
+        self.assertIs(self.dataset.label_rows(), self.dataset.label_rows())
+        self.assertTrue(np.shares_memory(groups[1].spectra, self.spectra))
+        self.assertTrue(groups[2].is_lazy)
+
+    def test_throws_on_grouping_unlabeled_dataset(self):
+        dataset = ty.Dataset(self.spectra, self.dataset.coordinates, [1., 2.])
+        with self.assertRaises(ValueError):
+            dataset.group_by_label()
+
+    def test_subsets_sparse_and_lazy_spectra(self):
+        sparse = ty.Dataset(ty.SparseSpectra([1., 2., 3.], [4., 5., 6.],
+                                             [0, 1, 1, 3, 3, 3]),
+                            self.dataset.coordinates, None)
+        npt.assert_equal(sparse.subset([2, 0]).spectra.mz, [2., 3., 1.])
+        lazy = ty.Dataset(ty.LazySpectra((5, 2), float,
+                                         lambda rows: self.spectra[rows]),
+                          self.dataset.coordinates, [1., 2.])
+        npt.assert_equal(lazy.subset([4, 1]).spectra[[1]], self.spectra[[1]])
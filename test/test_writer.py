@@ -0,0 +1,47 @@
+"""Test for writer module
+
+Copyright 2018 Spectre Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy.testing as npt
+
+import spdata.reader as rd
+import spdata.types as ty
+import spdata.writer as wr
+
+
+class TestSaveDataset(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        coordinates = ty.Coordinates([1, 2], [3, 4], [5, 6])
+        self.dataset = ty.Dataset([[1., 2.], [3., 4.]], coordinates,
+                                  [10., 20.], [7, 8])
+
+    def test_saves_in_format_readable_by_loader(self):
+        path = os.path.join(self.directory.name, 'data.spd')
+        wr.save_dataset(self.dataset, path, compression='zlib')
+        loaded = rd.loaders['.spd'](path)
+        npt.assert_equal(loaded.spectra, self.dataset.spectra)
+        npt.assert_equal(loaded.labels, self.dataset.labels)
+
+    def test_throws_on_unsupported_format(self):
+        with self.assertRaises(IOError):
+            wr.save_dataset(self.dataset,
+                            os.path.join(self.directory.name, 'data.csv'))